@@ -0,0 +1,107 @@
+"""
+Runs Clippy's command line with timing probes around each phase of a sync, for run_benchmarks.py.
+
+Clippy runs as usual against the server in CLIP_DOMAIN, except that:
+    - its data (sync manifest, page cache, stored sessions) is kept in CLIPPY_BENCH_DATA instead of the user's data folder;
+    - the credentials come from the environment (the password from CLIPPY_BENCH_PASSWORD) and are never saved;
+    - the disclaimer and the GitHub update check are skipped.
+
+When Clippy exits, the timings and the peak memory use are written as JSON to CLIPPY_BENCH_REPORT.
+
+Usage:
+    CLIP_DOMAIN=http://127.0.0.1:8765 CLIPPY_BENCH_DATA=/tmp/data CLIPPY_BENCH_REPORT=/tmp/report.json \\
+        python benchmarks/instrumented_clippy.py batch -u bench -p /tmp/CLIP
+"""
+import time
+START = time.perf_counter()
+
+import functools
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import clippy.config as cfg
+import clippy.main as main
+
+IMPORTED = time.perf_counter()
+
+# Functions of clippy.main timed as each phase
+PHASES = {
+    "login": ("start_login",),
+    "years": ("parse_years",),
+    "courses": ("parse_courses",),
+    "index": ("search_cats_in_course",),
+    "category": ("search_files_in_category",),
+    "download": ("download_file",),
+    "commit": ("commit_cache", "commit_http_cache"),
+}
+
+lock = threading.Lock()
+timings = {} # phase -> {calls, busy, first, last}
+
+def record(phase: str, start: float, end: float):
+    with lock:
+        timing = timings.setdefault(phase, {"calls": 0, "busy": 0.0, "first": start - START, "last": end - START})
+        timing["calls"] += 1
+        timing["busy"] += end - start
+        timing["first"] = min(timing["first"], start - START)
+        timing["last"] = max(timing["last"], end - START)
+
+def probe(phase: str, function):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            record(phase, start, time.perf_counter())
+    return wrapper
+
+def setup():
+    data = Path(os.environ["CLIPPY_BENCH_DATA"])
+    cfg.cfgpath = data / "config.ini"
+    cfg.MANIFEST_PATH = data / "manifest.db"
+    cfg.HTTP_CACHE_PATH = data / "http_cache"
+    cfg.SESSION_PATH = data / "sessions.json"
+    cfg.show_disclaimer = lambda: None
+
+    # Credentials from the environment, like cron and Docker runs
+    os.environ["CLIP_USERNAME"] = "bench"
+    os.environ["CLIP_PASSWORD"] = os.environ.get("CLIPPY_BENCH_PASSWORD", "bench")
+    main.check_for_updates = lambda: None
+    main.check_for_save_credentials = lambda: None
+
+    for phase, names in PHASES.items():
+        for name in names:
+            setattr(main, name, probe(phase, getattr(main, name)))
+
+def max_rss() -> int:
+    """
+    Get the peak resident memory of this process, in bytes (None where it can't be measured).
+    """
+    try:
+        import resource
+    except ImportError: # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024 # kilobytes elsewhere
+
+def report(exit_code: int):
+    timings["import"] = {"calls": 1, "busy": IMPORTED - START, "first": 0.0, "last": IMPORTED - START}
+    with open(os.environ["CLIPPY_BENCH_REPORT"], "w") as json_file:
+        json.dump({"exit_code": exit_code, "total": time.perf_counter() - START, "max_rss": max_rss(), "phases": timings}, json_file)
+
+if __name__ == "__main__":
+    setup()
+    exit_code = 0
+    try:
+        main.app(prog_name="clippy")
+    except SystemExit as e:
+        exit_code = e.code or 0
+        raise
+    finally:
+        report(exit_code)
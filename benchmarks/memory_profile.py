@@ -0,0 +1,124 @@
+"""
+Memory profile of Clippy with a large synthetic archive (100 000 files by default).
+
+Two measurements:
+    records  the memory held by the parsed document tables (FilesList) and by the ClipFile
+             records built from them, measured with tracemalloc in this process;
+    sync     the peak resident memory of `clippy batch` against a mock CLIP serving the whole
+             archive (see mock_clip.py), on the first sync (cold) and on the next one (warm).
+
+Usage:
+    python benchmarks/memory_profile.py
+    python benchmarks/memory_profile.py --files 20000 --only records
+"""
+import argparse
+import json
+import math
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from mock_clip import MockCLIP
+from run_benchmarks import run_clippy
+
+def synthetic_rows(count: int) -> [[str]]:
+    """
+    Build the rows of a document table, as extracted from CLIP's pages.
+
+    Args:
+        count (int): Number of rows.
+    """
+    return [[f"documento_{i:06d}.pdf", f"/objecto?oid={i}&oin=Aula_{i}.pdf", f"2023-{1 + i % 12:02d}-{1 + i % 28:02d} 10:{i % 60:02d}",
+             f"{i % 5000} Kb", f"Docente {i % 7}"] for i in range(count)]
+
+def profile_records(count: int) -> dict:
+    """
+    Measure the memory held by a parsed table of files and by the records iterated from it.
+
+    Args:
+        count (int): Number of files.
+
+    Returns:
+        dict: The bytes held by the table and by the records, in total and per file.
+    """
+    from modules.FilesList import FilesList
+
+    tracemalloc.start()
+    table = FilesList(synthetic_rows(count))
+    table_bytes = tracemalloc.get_traced_memory()[0]
+    records = list(table)
+    records_bytes = tracemalloc.get_traced_memory()[0] - table_bytes
+    tracemalloc.stop()
+    del records
+    return {"files": count, "table": table_bytes, "records": records_bytes,
+            "table_per_file": table_bytes / count, "records_per_file": records_bytes / count}
+
+def profile_sync(files: int, categories: int, files_per_category: int, file_size: int, verbose: bool = False) -> [dict]:
+    """
+    Run a cold and a warm `clippy batch` against a mock CLIP with the given number of files.
+
+    Args:
+        files (int): Total number of files in the archive.
+        categories (int): Document categories of each course.
+        files_per_category (int): Files in each category.
+        file_size (int): Average file size in bytes.
+        verbose (bool): Show Clippy's output.
+
+    Returns:
+        [dict]: The wall time, peak memory and server requests of each run.
+    """
+    courses = math.ceil(files / (categories * files_per_category))
+    mock = MockCLIP(courses, files_per_category, categories, 1, file_size)
+    url = mock.start()
+    results = []
+    try:
+        with tempfile.TemporaryDirectory(prefix="clippy-memory-") as workdir:
+            data, path = Path(workdir) / "data", Path(workdir) / "CLIP"
+            data.mkdir()
+            path.mkdir()
+            for scenario in ("cold", "warm"):
+                mock.reset_stats()
+                result = run_clippy(url, ["batch", "-u", "bench", "-p", str(path)], data, verbose)
+                results.append({"scenario": scenario, "files": courses * categories * files_per_category,
+                                "wall": result["wall"], "max_rss": result["max_rss"], "server": mock.stats})
+    finally:
+        mock.stop()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile Clippy's memory use with a large synthetic archive.")
+    parser.add_argument("--files", type=int, default=100_000, help="files in the archive")
+    parser.add_argument("--categories", type=int, default=8, help="document categories of each course (up to 8)")
+    parser.add_argument("--files-per-category", type=int, default=250, help="files in each category")
+    parser.add_argument("--file-size", type=int, default=1024, help="average file size in bytes")
+    parser.add_argument("--only", choices=("records", "sync"), help="run only one of the measurements")
+    parser.add_argument("--json", type=Path, help="also write the results to this file")
+    parser.add_argument("--verbose", action="store_true", help="show Clippy's output")
+    args = parser.parse_args()
+
+    results = {}
+    if args.only in (None, "records"):
+        records = results["records"] = profile_records(args.files)
+        print(f"\nregistos: {records['files']} ficheiros")
+        print(f"  tabela (colunas)  {records['table'] / 1024**2:8.1f} MB  {records['table_per_file']:6.0f} B/ficheiro")
+        print(f"  objectos ClipFile {records['records'] / 1024**2:8.1f} MB  {records['records_per_file']:6.0f} B/ficheiro")
+
+    if args.only in (None, "sync"):
+        start = time.perf_counter()
+        results["sync"] = profile_sync(args.files, args.categories, args.files_per_category, args.file_size, args.verbose)
+        print(f"\nsincronização ({time.perf_counter() - start:.0f}s no total)")
+        for run in results["sync"]:
+            requests = sum(route["requests"] for route in run["server"].values())
+            rss = f"{run['max_rss'] / 1024**2:.1f} MB" if run["max_rss"] else "n/d"
+            print(f"  {run['scenario']:<6}{run['files']:>8} ficheiros {run['wall']:8.1f}s  {requests:>8} pedidos  memória máxima {rss}")
+
+    if args.json is not None:
+        with open(args.json, "w") as json_file:
+            json.dump({"settings": dict(vars(args), json=str(args.json)), "results": results}, json_file, indent=2)
+
+if __name__ == "__main__":
+    main()
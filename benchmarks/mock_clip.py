@@ -0,0 +1,378 @@
+"""
+A local stand-in for clip.fct.unl.pt, used by the benchmarks.
+
+It serves the login, year list, course list, course index and document table pages, built from the
+page templates in fixtures/, and the files themselves (with Range support). The number of years,
+courses, categories and files is synthetic and configurable, as are the latency of each request,
+the bandwidth of each download and the rate of server errors.
+
+Usage:
+    python benchmarks/mock_clip.py --courses 20 --files 15 --latency 0.05
+    CLIP_DOMAIN=http://127.0.0.1:8765 clippy -p /tmp/CLIP
+"""
+import argparse
+import hashlib
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from string import Template
+from urllib.parse import urlsplit, unquote_to_bytes
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+# The document categories of a course, in the order CLIP lists them
+CATEGORIES = [
+    ("Material Multimédia", "0ac"),
+    ("Problemas", "1e"),
+    ("Protocolos", "2tr"),
+    ("Seminários", "3sm"),
+    ("Exames", "ex"),
+    ("Testes", "t"),
+    ("Textos de Apoio", "ta"),
+    ("Outros", "xot"),
+]
+
+FIRST_COURSE = 1000
+LAST_YEAR = 2024
+CHUNK_SIZE = 64 * 1024
+
+def load_fixture(name: str) -> Template:
+    """
+    Load a page template from fixtures/.
+
+    Args:
+        name (str): The name of the template, without extension.
+    """
+    return Template((FIXTURES / f"{name}.html").read_text(encoding="utf-8"))
+
+def parse_query(url: str) -> dict:
+    """
+    Parse the query string of a CLIP URL, which is percent-encoded in latin-1.
+
+    Args:
+        url (str): The path and query of the request.
+    """
+    query = {}
+    for part in urlsplit(url).query.split("&"):
+        if "=" in part:
+            key, value = part.split("=", 1)
+            query[unquote_to_bytes(key).decode("latin-1")] = unquote_to_bytes(value.replace("+", " ")).decode("latin-1")
+    return query
+
+class MockCLIP:
+    """
+    A mock CLIP server running in a background thread.
+
+    Args:
+        courses (int): Number of courses in each academic year.
+        files (int): Number of files in each category of each course.
+        categories (int): Number of document categories of each course (up to 8).
+        years (int): Number of academic years of the user.
+        file_size (int): Average size of each file, in bytes.
+        latency (float): Time the server takes to answer each request, in seconds.
+        bandwidth (float): Speed of each download, in bytes per second (0 for unlimited).
+        error_rate (float): Fraction of requests answered with 503 Service Unavailable.
+        password (str): The password the login accepts (any username is accepted).
+        port (int): The port to listen on (0 picks a free one).
+        seed (int): Seed of the random error injection.
+        reposted (float): Fraction of the files of each category that are the same object in every course and year.
+
+    Methods:
+        start() -> str:
+            Start serving, returns the server's URL.
+        stop():
+            Stop serving.
+        add_files(count: int, course: int, category: int):
+            Publish new files, as if a teacher uploaded them.
+        expire_sessions():
+            Log out every client.
+        reset_stats():
+            Clear the request counters.
+
+    Usage:
+        server = MockCLIP(courses=20, files=15, latency=0.05)
+        url = server.start()
+        ...
+        print(server.stats)
+        server.stop()
+    """
+
+    def __init__(self, courses: int = 10, files: int = 10, categories: int = 3, years: int = 1, file_size: int = 64 * 1024,
+                 latency: float = 0.0, bandwidth: float = 0, error_rate: float = 0.0, password: str = "bench",
+                 port: int = 0, seed: int = 0, reposted: float = 0.0):
+        """
+        Initialize a MockCLIP instance.
+        """
+        self.courses = courses
+        self.files = files
+        self.categories = CATEGORIES[:max(1, min(categories, len(CATEGORIES)))]
+        self.years = [LAST_YEAR - i for i in reversed(range(years))]
+        self.file_size = file_size
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.reposted = reposted
+        self.password = password
+        self.user = 12345
+        self.port = port
+
+        self.lock = threading.Lock()
+        self.random = random.Random(seed)
+        self.sessions = set()
+        self.extra_files = {} # (course, category code) -> number of files added since the server started
+        self.stats = {}
+        self.server = None
+        self.templates = {name: load_fixture(name) for name in (
+            "login", "invalid_login", "home", "user", "year_link", "courses", "course_link",
+            "index", "category_link", "documents", "document_row")}
+
+    def start(self) -> str:
+        """
+        Start serving in a background thread.
+
+        Returns:
+            str: The URL of the server, to be used as CLIP_DOMAIN.
+        """
+        mock = self
+        class Handler(MockHandler):
+            server_mock = mock
+        self.server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def stop(self):
+        """
+        Stop serving.
+        """
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def add_files(self, count: int = 1, course: int = FIRST_COURSE, category: int = 0):
+        """
+        Publish new files in a course's category, as if a teacher uploaded them.
+
+        Args:
+            count (int): Number of new files.
+            course (int): The course ID.
+            category (int): The position of the category in the course's index.
+        """
+        with self.lock:
+            key = (course, self.categories[category][1])
+            self.extra_files[key] = self.extra_files.get(key, 0) + count
+
+    def expire_sessions(self):
+        """
+        Log out every client, so their next request gets the login page.
+        """
+        with self.lock:
+            self.sessions.clear()
+
+    def reset_stats(self):
+        """
+        Clear the request counters.
+        """
+        with self.lock:
+            self.stats = {}
+
+    def count(self, route: str, status: int, size: int):
+        """
+        Add a request to the counters of its route.
+        """
+        with self.lock:
+            stats = self.stats.setdefault(route, {"requests": 0, "bytes": 0, "not_modified": 0, "errors": 0})
+            stats["requests"] += 1
+            stats["bytes"] += size
+            stats["not_modified"] += status == 304
+            stats["errors"] += status >= 500
+
+    def fail(self) -> bool:
+        """
+        Decide whether the next request fails with a server error.
+        """
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+    # Pages
+
+    def course_list(self, year: int) -> [(int, int)]:
+        """
+        Get the ID and semester of each course of an academic year.
+        """
+        return [(FIRST_COURSE + i, 1 + i % 2) for i in range(self.courses)] if year in self.years else []
+
+    def file_count(self, course: int, category: str) -> int:
+        """
+        Get the number of files in a course's category.
+        """
+        with self.lock:
+            return self.files + self.extra_files.get((course, category), 0)
+
+    def file_body(self, oid: str) -> bytes:
+        """
+        Generate the content of a file, always the same for the same object ID.
+        """
+        digest = hashlib.sha256(oid.encode()).digest()
+        size = self.file_size // 2 + int.from_bytes(digest[:4], "big") % max(1, self.file_size)
+        return (digest * (size // len(digest) + 1))[:size]
+
+    def page_login(self) -> str:
+        return self.templates["login"].substitute()
+
+    def page_home(self, username: str = "bench") -> str:
+        return self.templates["home"].substitute(user=self.user, username=username)
+
+    def page_user(self) -> str:
+        years = "\n".join(self.templates["year_link"].substitute(user=self.user, year=year, label=f"{year - 1}/{year % 100:02d}")
+                          for year in self.years)
+        return self.templates["user"].substitute(years=years)
+
+    def page_courses(self, year: int) -> str:
+        courses = "\n".join(self.templates["course_link"].substitute(year=year, semester_type="s", semester=semester, user=self.user,
+                                                                     course=course, name=f"Unidade Curricular {course}")
+                            for course, semester in self.course_list(year))
+        return self.templates["courses"].substitute(courses=courses)
+
+    def page_index(self, course: int, year: int, semester_type: str, semester: int) -> str:
+        categories = "\n".join(self.templates["category_link"].substitute(semester_type=semester_type, category=code, year=year, semester=semester,
+                                                                          course=course, label=label, count=self.file_count(course, code))
+                               for label, code in self.categories)
+        return self.templates["index"].substitute(name=f"Unidade Curricular {course}", categories=categories)
+
+    def page_documents(self, course: int, year: int, category: str) -> str:
+        rows = []
+        for i in range(self.file_count(course, category)):
+            oid = f"{category}-{i}" if i < self.files * self.reposted else f"{course}-{year}-{category}-{i}"
+            size = len(self.file_body(oid))
+            day, minute = 1 + i % 28, i % 60
+            month = 1 + (i // 28) % 12
+            rows.append(self.templates["document_row"].substitute(
+                name=f"{category}_{i:04d}.pdf", oid=oid, date=f"{year - 1}-{month:02d}-{day:02d} 10:{minute:02d}",
+                size=f"{size // 1024} Kb", teacher=f"Docente {i % 3}"))
+        return self.templates["documents"].substitute(rows="\n".join(rows))
+
+class MockHandler(BaseHTTPRequestHandler):
+    """
+    Answers the requests of a MockCLIP server.
+    """
+    protocol_version = "HTTP/1.1"
+    server_mock = None
+
+    def log_message(self, *args):
+        pass
+
+    def send(self, route: str, body, status: int = 200, content_type: str = "text/html; charset=iso-8859-1", headers: dict = None):
+        if isinstance(body, str):
+            body = body.encode("latin-1")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.server_mock.count(route, status, len(body))
+
+    def send_page(self, route: str, html: str):
+        body = html.encode("latin-1")
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            return self.send(route, b"", 304, headers={"ETag": etag})
+        self.send(route, body, headers={"ETag": etag})
+
+    def send_file(self, oid: str):
+        mock = self.server_mock
+        body = mock.file_body(oid)
+        start = 0
+        if self.headers.get("Range", "").startswith("bytes="):
+            start = int(self.headers["Range"][6:].split("-")[0])
+            if start >= len(body):
+                return self.send("file", b"", 416, headers={"Content-Range": f"bytes */{len(body)}"})
+        self.send_response(206 if start else 200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(body) - start))
+        self.send_header("Accept-Ranges", "bytes")
+        if start:
+            self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+        self.end_headers()
+        for offset in range(start, len(body), CHUNK_SIZE):
+            chunk = body[offset:offset + CHUNK_SIZE]
+            self.wfile.write(chunk)
+            if mock.bandwidth:
+                time.sleep(len(chunk) / mock.bandwidth)
+        mock.count("file", 206 if start else 200, len(body) - start)
+
+    def logged_in(self) -> bool:
+        cookies = self.headers.get("Cookie", "")
+        with self.server_mock.lock:
+            return any(f"JSESSIONID={token}" in cookies for token in self.server_mock.sessions)
+
+    def do_POST(self):
+        mock = self.server_mock
+        time.sleep(mock.latency)
+        data = parse_query("?" + self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("latin-1"))
+        if mock.fail():
+            return self.send("login", "Service Unavailable", 503)
+        if data.get("senha") != mock.password:
+            return self.send("login", mock.templates["invalid_login"].substitute())
+        token = hashlib.sha1(f"{data.get('identificador')}{time.time()}{random.random()}".encode()).hexdigest()
+        with mock.lock:
+            mock.sessions.add(token)
+        self.send("login", mock.page_home(data.get("identificador", "")), headers={"Set-Cookie": f"JSESSIONID={token}; Path=/"})
+
+    def do_GET(self):
+        mock = self.server_mock
+        time.sleep(mock.latency)
+        path, query = urlsplit(self.path).path, parse_query(self.path)
+        if mock.fail():
+            return self.send("error", "Service Unavailable", 503)
+        if not self.logged_in():
+            return self.send("login", mock.page_login())
+
+        if path == "/utente/eu/aluno/ano_lectivo/unidades/unidade_curricular/actividade/documentos":
+            if "edição_de_unidade_curricular" in query:
+                course, _, year, semester_type, semester = query["edição_de_unidade_curricular"].split(",")
+                return self.send_page("index", mock.page_index(int(course), int(year), semester_type, int(semester)))
+            return self.send_page("documents", mock.page_documents(int(query["unidade_curricular"]), int(query["ano_lectivo"]),
+                                                                   query["tipo_de_documento_de_unidade"]))
+        if path == "/utente/eu/aluno/ano_lectivo/unidades":
+            return self.send_page("courses", mock.page_courses(int(query["ano_lectivo"])))
+        if path == "/utente/eu/aluno":
+            return self.send_page("years", mock.page_user())
+        if path in ("/", "/utente/eu"):
+            return self.send_page("login", mock.page_home())
+        if path == "/objecto":
+            return self.send_file(query["oid"])
+        self.send("error", "Not Found", 404)
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a mock CLIP for the benchmarks.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--courses", type=int, default=10, help="courses in each academic year")
+    parser.add_argument("--files", type=int, default=10, help="files in each category")
+    parser.add_argument("--categories", type=int, default=3, help="document categories of each course (up to 8)")
+    parser.add_argument("--years", type=int, default=1, help="academic years of the user")
+    parser.add_argument("--file-size", type=int, default=64 * 1024, help="average file size in bytes")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds to answer each request")
+    parser.add_argument("--bandwidth", type=float, default=0, help="bytes per second of each download (0 for unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--reposted", type=float, default=0.0, help="fraction of the files reposted in every course and year")
+    parser.add_argument("--password", default="bench", help="password accepted by the login")
+    args = parser.parse_args()
+
+    mock = MockCLIP(args.courses, args.files, args.categories, args.years, args.file_size,
+                    args.latency, args.bandwidth, args.error_rate, args.password, args.port, reposted=args.reposted)
+    url = mock.start()
+    print(f"Mock CLIP a servir em {url} (Ctrl+C para terminar)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        mock.stop()
+
+if __name__ == "__main__":
+    main()
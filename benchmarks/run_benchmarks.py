@@ -0,0 +1,193 @@
+"""
+End-to-end benchmarks of Clippy against a local mock CLIP (see mock_clip.py).
+
+Each command (batch, single) is run in a fresh process, with an empty data folder, in three scenarios:
+    cold    first sync, every file is downloaded;
+    warm    nothing changed in the server since the last sync;
+    update  a new file was published in one category since the last sync.
+
+For each run it reports the wall time (including interpreter startup), the time of each phase
+as measured inside Clippy (see instrumented_clippy.py), its peak memory and the requests the server answered.
+Phases overlap, so each phase shows its span (first start to last end), its busy time (summed
+over every worker) and its number of calls.
+
+Usage:
+    python benchmarks/run_benchmarks.py --courses 20 --files 15 --latency 0.05 --repeat 3
+    python benchmarks/run_benchmarks.py --commands single --bandwidth 2000000 --json results.json
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from mock_clip import MockCLIP, FIRST_COURSE, LAST_YEAR
+
+BENCHMARKS = Path(__file__).resolve().parent
+SCENARIOS = ("cold", "warm", "update")
+PHASES = ("import", "login", "years", "courses", "index", "category", "download", "commit")
+
+def command_args(command: str, path: Path, options: [str] = ()) -> [str]:
+    """
+    Get the command line arguments of a benchmarked command.
+
+    Args:
+        command (str): "batch" or "single".
+        path (Path): The folder Clippy syncs to.
+        options ([str]): Extra options for Clippy.
+    """
+    if command == "batch":
+        return ["batch", "-u", "bench", "-p", str(path), *options]
+    return ["single", str(FIRST_COURSE), str(LAST_YEAR), "1", "-u", "bench", "-p", str(path), *options]
+
+def run_clippy(url: str, args: [str], data: Path, verbose: bool = False) -> dict:
+    """
+    Run Clippy in a new process and collect its timings.
+
+    Args:
+        url (str): The URL of the mock CLIP.
+        args ([str]): The command line arguments.
+        data (Path): The folder for Clippy's data (sync manifest, page cache).
+        verbose (bool): Show Clippy's output.
+
+    Returns:
+        dict: The wall time, exit code, total time and phase timings of the run.
+    """
+    report = data / "report.json"
+    env = dict(os.environ, CLIP_DOMAIN=url, CLIPPY_BENCH_DATA=str(data), CLIPPY_BENCH_REPORT=str(report))
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, str(BENCHMARKS / "instrumented_clippy.py"), *args], env=env,
+                             stdout=None if verbose else subprocess.DEVNULL, stderr=None if verbose else subprocess.PIPE)
+    wall = time.perf_counter() - start
+    if process.returncode != 0 or not report.exists():
+        raise RuntimeError(f"Clippy terminou com código {process.returncode}:\n{process.stderr.decode(errors='replace') if process.stderr else ''}")
+    with open(report) as json_file:
+        result = json.load(json_file)
+    result["wall"] = wall
+    return result
+
+def run_scenarios(mock: MockCLIP, url: str, command: str, workdir: Path, options: [str] = (), verbose: bool = False) -> [dict]:
+    """
+    Run a command in every scenario, from an empty data folder.
+
+    Args:
+        mock (MockCLIP): The mock CLIP.
+        url (str): The URL of the mock CLIP.
+        command (str): "batch" or "single".
+        workdir (Path): A temporary folder for Clippy's data and synced files.
+        options ([str]): Extra options for Clippy.
+        verbose (bool): Show Clippy's output.
+
+    Returns:
+        [dict]: The result of each scenario.
+    """
+    data, path = workdir / command / "data", workdir / command / "CLIP"
+    shutil.rmtree(workdir / command, ignore_errors=True)
+    data.mkdir(parents=True)
+    path.mkdir(parents=True)
+
+    results = []
+    for scenario in SCENARIOS:
+        if scenario == "update":
+            mock.add_files(1, FIRST_COURSE, 0)
+        mock.reset_stats()
+        result = run_clippy(url, command_args(command, path, options), data, verbose)
+        result.update(command=command, scenario=scenario, server=mock.stats)
+        results.append(result)
+    return results
+
+def summarize(results: [dict]) -> [dict]:
+    """
+    Combine repeated runs of the same command and scenario, keeping the median of each time.
+
+    Args:
+        results ([dict]): The results of every run.
+
+    Returns:
+        [dict]: One result for each command and scenario.
+    """
+    groups = {}
+    for result in results:
+        groups.setdefault((result["command"], result["scenario"]), []).append(result)
+
+    summary = []
+    for (command, scenario), runs in groups.items():
+        phases = {}
+        for phase in PHASES:
+            timings = [run["phases"][phase] for run in runs if phase in run["phases"]]
+            if timings:
+                phases[phase] = {
+                    "calls": timings[0]["calls"],
+                    "span": statistics.median(t["last"] - t["first"] for t in timings),
+                    "busy": statistics.median(t["busy"] for t in timings),
+                }
+        summary.append({
+            "command": command,
+            "scenario": scenario,
+            "runs": len(runs),
+            "wall": statistics.median(run["wall"] for run in runs),
+            "total": statistics.median(run["total"] for run in runs),
+            "max_rss": max(run.get("max_rss") or 0 for run in runs),
+            "phases": phases,
+            "server": runs[-1]["server"],
+        })
+    return summary
+
+def print_summary(summary: [dict]):
+    for result in summary:
+        requests = sum(route["requests"] for route in result["server"].values())
+        not_modified = sum(route["not_modified"] for route in result["server"].values())
+        errors = sum(route["errors"] for route in result["server"].values())
+        downloaded = result["server"].get("file", {}).get("bytes", 0)
+        print(f"\n{result['command']} / {result['scenario']}: {result['wall']:.3f}s "
+              f"(Clippy {result['total']:.3f}s, mediana de {result['runs']} execuções)")
+        print(f"  pedidos: {requests} ({not_modified} 304, {errors} erros), transferidos {downloaded / 1024**2:.2f} MB, "
+              f"memória máxima {result['max_rss'] / 1024**2:.1f} MB")
+        print(f"  {'fase':<10}{'chamadas':>10}{'duração':>12}{'ocupação':>12}")
+        for phase, timing in result["phases"].items():
+            print(f"  {phase:<10}{timing['calls']:>10}{timing['span']:>11.3f}s{timing['busy']:>11.3f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Clippy against a local mock CLIP.")
+    parser.add_argument("--commands", nargs="+", choices=("batch", "single"), default=["batch", "single"])
+    parser.add_argument("--repeat", type=int, default=1, help="runs of each scenario (the median is reported)")
+    parser.add_argument("--courses", type=int, default=10, help="courses in each academic year")
+    parser.add_argument("--files", type=int, default=10, help="files in each category")
+    parser.add_argument("--categories", type=int, default=3, help="document categories of each course (up to 8)")
+    parser.add_argument("--years", type=int, default=1, help="academic years of the user")
+    parser.add_argument("--file-size", type=int, default=64 * 1024, help="average file size in bytes")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds to answer each request")
+    parser.add_argument("--bandwidth", type=float, default=0, help="bytes per second of each download (0 for unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--reposted", type=float, default=0.0, help="fraction of the files reposted in every course and year")
+    parser.add_argument("--dedup", action="store_true", help="run Clippy with --dedup")
+    parser.add_argument("--json", type=Path, help="also write the results to this file")
+    parser.add_argument("--verbose", action="store_true", help="show Clippy's output")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="clippy-bench-") as workdir:
+        for _ in range(args.repeat):
+            # A new server each time, so files published by the update scenario don't carry over
+            mock = MockCLIP(args.courses, args.files, args.categories, args.years, args.file_size,
+                            args.latency, args.bandwidth, args.error_rate, reposted=args.reposted)
+            url = mock.start()
+            try:
+                for command in args.commands:
+                    results += run_scenarios(mock, url, command, Path(workdir), ["--dedup"] if args.dedup else [], args.verbose)
+            finally:
+                mock.stop()
+
+    summary = summarize(results)
+    print_summary(summary)
+    if args.json is not None:
+        with open(args.json, "w") as json_file:
+            json.dump({"settings": dict(vars(args), json=str(args.json)), "summary": summary, "runs": results}, json_file, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,72 @@
-from requests.adapters import HTTPAdapter
-from urllib3.util import Retry
-from requests import Session
 import logging as log
+import os
+from contextvars import ContextVar
 from pathlib import Path
-from InquirerPy import inquirer
 from appdirs import user_data_dir
 
 # Multithreading
 MAX_THREADS = 8
 
-def session_mount():
-    global session
+# Concurrency limits for each phase of the sync pipeline
+MAX_INDEX_WORKERS = MAX_THREADS # course indexes
+MAX_CATEGORY_WORKERS = MAX_THREADS # category tables
+MAX_DOWNLOAD_WORKERS = 4 # file downloads
+
+# Files found but not yet downloading; category tables wait to be scanned while the queue is full
+DOWNLOAD_QUEUE_SIZE = 256 # files
+# Download workers that take the largest file waiting instead of the smallest, so big files aren't all left for the end
+LARGE_FILE_WORKERS = 1
+
+# Processes that parse the scraped pages, so parsing isn't limited to one core by the GIL (0 or 1 to parse in the threads)
+PARSE_WORKERS = min(os.cpu_count() or 1, MAX_THREADS)
+PARSE_POOL_THRESHOLD = 32 # pages parsed in the threads before the processes are started (few changed pages don't pay for them)
+
+# Progress display: redraws per second, active transfers shown, and seconds between JSON reports and of the speed average
+PROGRESS_FPS = 8
+PROGRESS_ACTIVE_LINES = 5
+PROGRESS_JSON_INTERVAL = 1.0
+PROGRESS_WINDOW = 5.0
+
+# Files read simultaneously by clippy verify
+VERIFY_WORKERS = 4
+
+# Size of each chunk read from the network while downloading a file
+DOWNLOAD_CHUNK_SIZE = 1024**2 # bytes
+
+# Shared session: the number of simultaneous requests adapts to the server's load between these limits
+MAX_CONNECTIONS = MAX_INDEX_WORKERS + MAX_CATEGORY_WORKERS + MAX_DOWNLOAD_WORKERS
+MIN_CONNECTIONS = 1
+POOL_SIZE = MAX_CONNECTIONS # open connections kept in the pool, at least one per worker
+LATENCY_TOLERANCE = 2.0 # how many times slower than usual a request can be before the server is considered overloaded
+RATE_LIMIT = None # maximum requests per second (None for unlimited)
+BANDWIDTH_LIMIT = None # maximum download speed of every download together, in bytes per second (None for unlimited)
+REQUEST_TIMEOUT = 30 # seconds
+
+session = None # built on first use, so commands that don't access CLIP don't load requests
+current_session = ContextVar("session", default=None)
+
+def session_mount(max_connections: int = None, rate_limit: float = None, pool_size: int = None, bandwidth_limit: float = None):
+    """
+    Builds the shared session, with automatic retries, adaptive concurrency and optional rate and bandwidth limits.
+
+    Args:
+        max_connections (int): Maximum number of simultaneous requests (keeps the current value if None).
+        rate_limit (float): Maximum number of requests per second (keeps the current value if None).
+        pool_size (int): Number of workers sharing the session (keeps the current value if None).
+        bandwidth_limit (float): Maximum download speed in bytes per second (keeps the current value if None).
+    """
+    from requests.adapters import HTTPAdapter
+    from urllib3.util import Retry
+    from modules.AdaptiveLimiter import AdaptiveLimiter
+    from modules.ThrottledSession import ThrottledSession
+    from modules.TokenBucket import TokenBucket
+
+    global session, MAX_CONNECTIONS, RATE_LIMIT, POOL_SIZE, BANDWIDTH_LIMIT
+    if max_connections is not None: MAX_CONNECTIONS = max_connections
+    if rate_limit is not None: RATE_LIMIT = rate_limit
+    if pool_size is not None: POOL_SIZE = pool_size
+    if bandwidth_limit is not None: BANDWIDTH_LIMIT = bandwidth_limit
+
     #Implement auto retry
     retry_strategy = Retry(
         total=3,  # Number of total retries (including the initial request)
@@ -18,14 +74,58 @@ def session_mount():
         status_forcelist=[500, 502, 503, 504],  # HTTP status codes to retry
     )
 
-    # Create a custom HTTP adapter with the retry strategy
-    adapter = HTTPAdapter(max_retries=retry_strategy)
-    session = Session()
+    # Create a custom HTTP adapter with the retry strategy and a connection pool large enough for every worker
+    adapter = HTTPAdapter(max_retries=retry_strategy, pool_maxsize=max(MAX_CONNECTIONS, POOL_SIZE))
+    limiter = AdaptiveLimiter(MAX_CONNECTIONS, MIN_CONNECTIONS, LATENCY_TOLERANCE)
+    bucket = TokenBucket(RATE_LIMIT) if RATE_LIMIT else None
+    bandwidth = TokenBucket(BANDWIDTH_LIMIT) if BANDWIDTH_LIMIT else None
+    session = ThrottledSession(limiter, bucket, REQUEST_TIMEOUT, bandwidth)
     session.mount("https://", adapter)
     session.mount("http://", adapter)
 
     log.debug("Sessão montada com sucesso.")
 
+def new_session() -> "ThrottledSession":
+    """
+    Builds a session with its own cookies (e.g. for another user), sharing the connection pool,
+    concurrency limiter, rate limit, bandwidth limit and response hooks of the default session.
+    """
+    from modules.ThrottledSession import ThrottledSession
+    if session is None: session_mount()
+    user_session = ThrottledSession(session.limiter, session.bucket, session.timeout, session.bandwidth)
+    user_session.hooks = {event: list(hooks) for event, hooks in session.hooks.items()}
+    user_session.mount("https://", session.get_adapter("https://"))
+    user_session.mount("http://", session.get_adapter("http://"))
+    return user_session
+
+def use_session(user_session: "ThrottledSession"):
+    """
+    Sets the session used by the current context (and every task and worker started from it).
+
+    Args:
+        user_session (ThrottledSession): A session built with new_session().
+    """
+    current_session.set(user_session)
+
+def get_session() -> "ThrottledSession":
+    """
+    Get the session of the current context, or the default session if none was set.
+    """
+    user_session = current_session.get()
+    if user_session is not None:
+        return user_session
+    if session is None: session_mount()
+    return session
+
+def reset_session():
+    """
+    Replaces the session of the current context with a fresh one.
+    """
+    if current_session.get() is None:
+        session_mount()
+    else:
+        use_session(new_session())
+
 def show_disclaimer():
     """Shows the disclaimer if it's the first time running the program."""
     discpath = cfgpath.parent / "disclaimer_shown"
@@ -44,11 +144,37 @@ bugs, erros de servidor ou uso indevido de funcionalidades não previstas inicia
 concordar, desinstale imediatamente o programa. Esta mensagem não aparecerá novamente.
 '''
 
-# Domain
-domain='https://clip.fct.unl.pt'
+# Domain (CLIP_DOMAIN points Clippy to another server, e.g. the benchmarks' mock CLIP)
+domain=os.environ.get("CLIP_DOMAIN", 'https://clip.fct.unl.pt')
 
 cfgpath = Path(user_data_dir("clippy")) / "config.ini"
 
-session_mount()
+# HTML parser ("selectolax", "lxml" or "html.parser"), None picks the fastest one installed
+PARSER_BACKEND = None
+
+# Sync manifest database
+MANIFEST_PATH = cfgpath.parent / "manifest.db"
+MANIFEST_BATCH = 2000 # file records and catalogue rows kept in memory before they are written
+
+# Cookies and user ID of the last login of each user, reused by the next runs
+SESSION_PATH = cfgpath.parent / "sessions.json"
+SESSION_MAX_AGE = 24 * 3600 # seconds
+
+# Glob patterns of files Clippy leaves alone, in the folder where the CLIP files are saved
+IGNORE_FILE = ".clippyignore"
+
+# Deduplication store (--dedup), relative to the folder where the CLIP files are saved
+DEDUP_STORE = Path(".clippy") / "store"
+
+# Cache of scraped pages
+HTTP_CACHE_PATH = cfgpath.parent / "http_cache"
+HTTP_CACHE_MAX_ENTRIES = 5000 # pages
+HTTP_CACHE_MAX_SIZE = 100 * 1024**2 # bytes
+LISTING_MAX_AGE = 24 * 3600 # seconds a user's years and courses are used without asking CLIP (checked in the background)
+
+# Watch mode
+WATCH_INTERVAL = 600 # seconds between checks
+WATCH_JITTER = 0.1 # each interval varies randomly by up to this fraction
+WATCH_COURSES_REFRESH = 24 * 3600 # seconds between checks of the user's years and courses
 
 log.info("Config.py carregado.")
\ No newline at end of file
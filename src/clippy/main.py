@@ -2,32 +2,42 @@
 from datetime import datetime
 from pathlib import Path
 import logging as log
-import concurrent.futures as cf
 import typer
-import time
+from functools import partial
+import contextvars
+import random
 import sys
+import time
 from typing_extensions import Annotated
-from typing import Optional
-from InquirerPy import inquirer
+from typing import List, Optional
 from rich import print
+from rich.markup import escape
 
 #Config
 import clippy.config as cfg
 
 # Local modules
 from modules.LoginError import LoginError
+from modules.EmptyHTMLException import EmptyHTMLException
+from modules.SessionExpiredError import SessionExpiredError
 from modules.CourseList import CourseList
 from modules.Course import Course
+from modules.DirSnapshot import DirSnapshot
+from modules.IgnoreRules import IgnoreRules
+from modules.TransferStats import TransferStats
 
 # Local functions
 from handlers.check_updates import get_latest_release
 from handlers.get_login import get_login, check_for_save_credentials
 from handlers.HTML_parser import parse_courses, parse_docs, parse_index, parse_years
-from handlers.file_handler import get_file, download_file, count_files_in_subfolders
+from handlers.file_handler import get_file, download_file, reconcile
 from handlers.cache_handler import commit_cache, parse_cache, stash_cache
+from handlers.http_cache import commit_http_cache
 from handlers.print_handler import print_progress, human_readable_size
-from handlers.creds_handler import load_username, load_password
+from handlers.creds_handler import load_username, reset_login
 from handlers.exit_handler import ExitHandler
+from handlers.sync_engine import run_pipeline
+from handlers import blob_store, manifest, parse_pool, plan_handler, progress_handler, tracer, verify_handler
 
 """
 NOVA Clippy
@@ -69,29 +79,65 @@ def version_callback(value: bool):
         print(f"Clippy version {__version__}")
         raise ExitHandler(0)
 
+def progress_callback(value: str):
+    if value not in progress_handler.MODES:
+        raise typer.BadParameter(f"Escolhe um de: {', '.join(progress_handler.MODES)}.")
+    return value
+
+# Options shared by several commands
+PathOption = Annotated[Path, typer.Option("-p", "--path", help="A pasta onde os ficheiros do CLIP serão guardados.", show_default=False)]
+UsernameOption = Annotated[str, typer.Option("-u","--username",help="O nome de utilizador no CLIP.", show_default=False)]
+ReloginOption = Annotated[bool, typer.Option("--relogin", help="Ignora as credenciais guardadas em sistema.")]
+RefreshOption = Annotated[bool, typer.Option("--refresh", help="Pede ao CLIP os anos lectivos e as cadeiras do utilizador, mesmo que tenham sido verificados há pouco.")]
+AutoOption = Annotated[bool, typer.Option(help="Escolhe automaticamente o ano lectivo mais recente.")]
+IndexWorkersOption = Annotated[int, typer.Option("--index-workers", help="Número máximo de cadeiras a verificar em simultâneo.")]
+CategoryWorkersOption = Annotated[int, typer.Option("--category-workers", help="Número máximo de categorias a verificar em simultâneo.")]
+ParseWorkersOption = Annotated[int, typer.Option("--parse-workers", help="Número de processos a analisar as páginas do CLIP em paralelo (0 para as analisar sem processos extra).")]
+DownloadWorkersOption = Annotated[int, typer.Option("--download-workers", help="Número máximo de ficheiros a transferir em simultâneo.")]
+MaxConnectionsOption = Annotated[int, typer.Option("--max-connections", help="Número máximo de pedidos simultâneos ao CLIP (ajustado automaticamente à carga do servidor).")]
+RateLimitOption = Annotated[float, typer.Option("--rate-limit", help="Número máximo de pedidos por segundo ao CLIP.", show_default=False)]
+BandwidthLimitOption = Annotated[float, typer.Option("--bandwidth-limit", help="Velocidade máxima de todas as transferências em conjunto, em KB/s.", show_default=False)]
+DownloadBudgetOption = Annotated[float, typer.Option("--download-budget", help="Número máximo de MB a transferir em cada execução; os restantes ficheiros ficam para a seguinte.", show_default=False)]
+DedupOption = Annotated[bool, typer.Option("--dedup", help="Guarda uma só cópia dos ficheiros repetidos em várias cadeiras ou anos, ligada a cada pasta onde aparecem.")]
+TraceOption = Annotated[Path, typer.Option("--trace", help="Regista cada pedido e fase neste ficheiro (JSON lines, ou Chrome trace se terminar em .json) e mostra um resumo no fim.", show_default=False)]
+ProgressOption = Annotated[str, typer.Option("--progress", callback=progress_callback, help="Como mostrar o progresso: bar (no terminal), quiet (só o resumo), json (uma linha JSON por segundo em stderr) ou auto (bar num terminal, senão quiet).")]
+DebugOption = Annotated[bool, typer.Option("-d","--debug",help="Cria um ficheiro log.log para efeitos de debug.", hidden = True)]
+
 @app.command()
 def single(
         id: Annotated[int, typer.Argument(help="O ID da cadeira a transferir.", show_default=False)],
         year: Annotated[int, typer.Argument(help="O ano lectivo a transferir.", show_default=False)],
         semester: Annotated[int, typer.Argument(help="O semestre a transferir.", show_default=False)],
-        path: Annotated[Path, typer.Option("-p", "--path", help="A pasta onde os ficheiros do CLIP serão guardados.", show_default=False)] = None,
+        path: PathOption = None,
         is_trimester: Annotated[bool, typer.Option("--is-trimester/--is-semester", "-t/-s", help="Se a cadeira é trimestral ou semestral", show_default=True)] = False,
-        username: Annotated[str, typer.Option("-u","--username",help="O nome de utilizador no CLIP.", show_default=False)] = None,
-        relogin: Annotated[bool, typer.Option("--relogin", help="Ignora as credenciais guardadas em sistema.")] = False,
-        debug: Annotated[bool, typer.Option("-d","--debug",help="Cria um ficheiro log.log para efeitos de debug.", hidden = True)] = False,
+        username: UsernameOption = None,
+        relogin: ReloginOption = False,
+        category_workers: CategoryWorkersOption = cfg.MAX_CATEGORY_WORKERS,
+        parse_workers: ParseWorkersOption = cfg.PARSE_WORKERS,
+        download_workers: DownloadWorkersOption = cfg.MAX_DOWNLOAD_WORKERS,
+        max_connections: MaxConnectionsOption = cfg.MAX_CONNECTIONS,
+        rate_limit: RateLimitOption = None,
+        bandwidth_limit: BandwidthLimitOption = None,
+        download_budget: DownloadBudgetOption = None,
+        dedup: DedupOption = False,
+        trace: TraceOption = None,
+        progress: ProgressOption = "auto",
+        debug: DebugOption = False,
     ):
     """Transfere uma cadeira em específico."""
 
+    progress_handler.set_mode(progress)
     start_routine(debug)
+    cfg.session_mount(max_connections, rate_limit, pool_size=category_workers + download_workers,
+                      bandwidth_limit=bandwidth_limit * 1024 if bandwidth_limit else None)
+    if trace is not None:
+        tracer.start(trace)
+    parse_pool.set_workers(parse_workers)
 
     name = str(id)
 
     # Check valid path
-    if path is None:
-        path = Path.cwd()
-        if path.name != "CLIP": path = path / "CLIP"
-    print(f"A iniciar o Clippy na directoria {path}...")
-    path = check_path(path)
+    path = open_path(path, dedup)
 
     #0) Start login
     userID = start_login(username, relogin)
@@ -101,7 +147,7 @@ def single(
 
     # 2) Load the unit's index and compare it to cached file if it exists
     print_progress(2, "A verificar se há ficheiros novos...")
-    subcats = search_cats_in_course(path, course)
+    subcats, files = search_cats_in_course(path, course)
 
     # Rename destination path to unit's name
     print(f"Encontrada cadeira {name}: {course.name}")
@@ -109,27 +155,23 @@ def single(
 
     log.debug(f"Lista de subcategorias a procurar: {subcats}")
 
-    # 3) (Multithreaded) Load each subcategory's table and compare it to the local folder
-    print_progress(3, "A obter URLs dos ficheiros a transferir...")
-    files = threadpool_execute(search_files_in_category, subcats)
-    log.debug(f"Lista de ficheiros a transferir: {files}")
-    
-    # 4) (Multithreaded) Download missing files
-    if len(files) != 0:
-        download_time, download_size = download_files(files, path)
-    else:
+    # 3-4) (Asynchronous) Load each subcategory's table, compare it to the local folder and download missing files
+    folders, stats = sync_files(subcats=subcats, files=files,
+                                category_workers=category_workers, download_workers=download_workers,
+                                byte_budget=download_budget)
+    log.debug(f"Ficheiros transferidos por pasta: {folders}")
+    if not folders:
         print_progress(4, "Não há ficheiros a transferir.")
 
     # 5) Update cache after successful download
     print_progress(5, "A actualizar cache...")
     commit_cache()
+    commit_http_cache()
 
     # 6) Exit with success
     print_progress(6, "Concluído :)")
-    if len(files) != 0:
-        unique_folders = sorted({str(file[0].parent) for file in files})
-        print(f"Transferidos {len(files)} ficheiros ({human_readable_size(download_size)} em [dim cyan bold]{download_time}[/dim cyan bold]s = {human_readable_size(download_size/download_time)}/s) para as pastas:",flush=True)
-        print("\n".join(f"'{folder}'" for folder in unique_folders))
+    if folders:
+        print_summary(folders, stats)
     else:
         print("Não foram encontrados ficheiros novos.")
     
@@ -137,15 +179,233 @@ def single(
 
     raise ExitHandler(0)
 
+@app.command()
+def changes(
+        since: Annotated[datetime, typer.Option("--since", help="Lista as alterações desde esta data, em vez de desde a última sincronização.", formats=["%Y-%m-%d", "%Y-%m-%d %H:%M"], show_default=False)] = None,
+        debug: DebugOption = False,
+    ):
+    """Lista os ficheiros transferidos na última sincronização com ficheiros novos, sem aceder ao CLIP."""
+
+    set_log_level(debug)
+
+    if since is None:
+        last_run = manifest.last_run()
+        if last_run is None:
+            print("Ainda não foi feita nenhuma sincronização.")
+            raise ExitHandler(0)
+        since = datetime.fromtimestamp(last_run[0])
+
+    files = manifest.changes_since(since.timestamp())
+    if len(files) != 0:
+        print(f"Transferidos {len(files)} ficheiros desde {since:%Y-%m-%d %H:%M}:")
+        print("\n".join(f"'{file}' ({human_readable_size(size or 0)})" for file, size, _, _ in files))
+    else:
+        print(f"Não foram transferidos ficheiros desde {since:%Y-%m-%d %H:%M}.")
+
+    raise ExitHandler(0)
+
+@app.command()
+def search(
+        query: Annotated[str, typer.Argument(help="As palavras a procurar no nome, docente, cadeira ou categoria dos ficheiros.", show_default=False)],
+        year: Annotated[int, typer.Option("-y","--year",help="Procura só neste ano lectivo.", show_default=False)] = None,
+        limit: Annotated[int, typer.Option("-n","--limit",help="Número máximo de resultados.")] = 50,
+        debug: DebugOption = False,
+    ):
+    """Procura ficheiros no catálogo das cadeiras já sincronizadas, sem aceder ao CLIP."""
+
+    set_log_level(debug)
+
+    start = time.perf_counter()
+    results = manifest.search(query, year, limit)
+    elapsed = time.perf_counter() - start
+    for file, file_year, course, category, name, teacher, size, mtime in results:
+        date = f"{datetime.fromtimestamp(mtime):%Y-%m-%d}" if mtime else "          "
+        author = f" ({escape(teacher)})" if teacher else ""
+        print(f"{date} {human_readable_size(size or 0):>10}  {escape(course)} > {escape(category)} > [bold]{escape(name)}[/bold]{author}")
+        print(f"  [dim]'{escape(file)}'[/dim]" if Path(file).exists() else "  [dim](não transferido)[/dim]")
+    if results:
+        print(f"{len(results)} resultados em {elapsed * 1000:.1f} ms.")
+    else:
+        print("Não foram encontrados ficheiros. O catálogo inclui as cadeiras já sincronizadas (ou planeadas).")
+
+    raise ExitHandler(0)
+
+@app.command()
+def verify(
+        path: Annotated[Path, typer.Option("-p", "--path", help="A pasta onde os ficheiros do CLIP são guardados.", show_default=False)] = None,
+        repair: Annotated[bool, typer.Option("--repair", help="Transfere novamente os ficheiros em falta, truncados ou corrompidos.")] = False,
+        quick: Annotated[bool, typer.Option("--quick", help="Só compara os tamanhos, sem ler o conteúdo dos ficheiros.")] = False,
+        workers: Annotated[int, typer.Option("--workers", help="Número máximo de ficheiros a ler em simultâneo.")] = cfg.VERIFY_WORKERS,
+        username: Annotated[str, typer.Option("-u","--username",help="O nome de utilizador no CLIP, para transferir os ficheiros com --repair (os sincronizados com outro utilizador usam o seu).", show_default=False)] = None,
+        relogin: ReloginOption = False,
+        download_workers: DownloadWorkersOption = cfg.MAX_DOWNLOAD_WORKERS,
+        progress: ProgressOption = "auto",
+        debug: DebugOption = False,
+    ):
+    """Verifica os ficheiros transferidos contra o manifesto (tamanho e hash) e lista os ficheiros em falta, truncados, corrompidos ou desconhecidos."""
+
+    progress_handler.set_mode(progress)
+    set_log_level(debug)
+
+    # Check valid path
+    path = default_path(path)
+    if not path.is_dir():
+        print("O caminho desejado não é uma directoria válida.")
+        raise ExitHandler(1)
+    path = Path(manifest.key(path)) # absolute, like the manifest's keys (a resolved link wouldn't match them)
+
+    print_progress(1, f"A verificar os ficheiros em {path}...", 2)
+    with progress_handler.monitor():
+        checked, unhashed, problems, unknown = verify_handler.verify(path, workers, quick)
+
+    for problem, file, _, _ in problems:
+        print(f"{problem}: '{file}'")
+    for file in unknown:
+        print(f"{verify_handler.UNKNOWN}: '{file}'")
+    print(f"Verificados {checked} ficheiros: {len(problems)} com problemas, {len(unknown)} desconhecidos.")
+    if unhashed and not quick:
+        print(f"{unhashed} ficheiros foram sincronizados sem hash, só o seu tamanho foi verificado.")
+
+    if not problems:
+        print_progress(2, "Concluído :)", 2)
+        raise ExitHandler(0)
+    if not repair:
+        print("Usa --repair para os transferir novamente.")
+        raise ExitHandler(1)
+
+    # Only the broken files are downloaded again, without scraping CLIP, each with the session of the user that synced it
+    cfg.show_disclaimer()
+    cfg.session_mount(pool_size=download_workers)
+    by_user = {}
+    for _, _, args, user in problems:
+        by_user.setdefault(user, []).append(args)
+    jobs = []
+    for user, files in by_user.items():
+        cfg.use_session(cfg.new_session())
+        plan_handler.current_user.set(user)
+        start_login(user if user is not None else username, relogin)
+        jobs.append((contextvars.copy_context(), [], [], files))
+    folders, stats = sync_files(jobs=jobs, download_workers=download_workers)
+    commit_cache()
+    print_progress(2, "Concluído :)", 2)
+    print(f"Transferidos novamente {stats.files} ficheiros ({human_readable_size(stats.bytes)}).")
+
+    # Files whose download failed are still broken
+    broken = []
+    for _, file, _, _ in problems:
+        record = manifest.lookup(file)
+        if verify_handler.check(file, record[3], record[5], quick) is not None:
+            broken.append(file)
+    if broken:
+        print(f"Não foi possível reparar {len(broken)} ficheiros:")
+        print("\n".join(f"'{file}'" for file in broken))
+    raise ExitHandler(1 if broken else 0)
+
+@app.command()
+def watch(
+        username: UsernameOption = None,
+        path: PathOption = None,
+        year: Annotated[Optional[List[int]], typer.Option("-y","--year",help="Define o ano lectivo a vigiar. Repete a opção para vigiar vários anos.", show_default=False)] = None,
+        all_years: Annotated[bool, typer.Option("--all-years", help="Vigia todos os anos lectivos do utilizador.")] = False,
+        interval: Annotated[int, typer.Option("-i", "--interval", help="Número de segundos entre verificações (com uma variação aleatória).")] = cfg.WATCH_INTERVAL,
+        relogin: ReloginOption = False,
+        refresh: RefreshOption = False,
+        index_workers: IndexWorkersOption = cfg.MAX_INDEX_WORKERS,
+        category_workers: CategoryWorkersOption = cfg.MAX_CATEGORY_WORKERS,
+        parse_workers: ParseWorkersOption = cfg.PARSE_WORKERS,
+        download_workers: DownloadWorkersOption = cfg.MAX_DOWNLOAD_WORKERS,
+        max_connections: MaxConnectionsOption = cfg.MAX_CONNECTIONS,
+        rate_limit: RateLimitOption = None,
+        bandwidth_limit: BandwidthLimitOption = None,
+        download_budget: DownloadBudgetOption = None,
+        dedup: DedupOption = False,
+        trace: TraceOption = None,
+        progress: ProgressOption = "auto",
+        debug: DebugOption = False,
+    ):
+    """Mantém o Clippy a correr e transfere os ficheiros novos assim que aparecem no CLIP."""
+    import requests
+
+    progress_handler.set_mode(progress)
+    start_routine(debug)
+    cfg.session_mount(max_connections, rate_limit, pool_size=index_workers + category_workers + download_workers,
+                      bandwidth_limit=bandwidth_limit * 1024 if bandwidth_limit else None)
+    if trace is not None:
+        tracer.start(trace)
+    parse_pool.set_workers(parse_workers)
+
+    # Check valid path
+    path = open_path(path, dedup)
+
+    #0) Start login once, the session logs in again by itself when it expires
+    userID = start_login(username, relogin)
+
+    print(f"A vigiar o CLIP a cada {interval}s. Prime Ctrl+C para terminar.")
+    courses = []
+    courses_checked = None
+    try:
+        while True:
+            try:
+                # 1) The user's courses rarely change, so they are only scraped again once in a while
+                # (the first time, the ones found by a recent run are used)
+                if courses_checked is None or time.monotonic() - courses_checked > cfg.WATCH_COURSES_REFRESH:
+                    max_age = 0 if refresh or courses_checked is not None else cfg.LISTING_MAX_AGE
+                    years = select_years(parse_years(userID, max_age), year, all_years)
+                    courses = [course for _year in years for course in parse_courses(_year, userID, max_age)]
+                    courses_checked = time.monotonic()
+                    log.info("Encontradas as seguintes unidades: "+" | ".join(course.name for course in courses) )
+
+                # 2-4) Only the categories whose count changed since the last check are scraped
+                manifest.start_run()
+                folders, stats = sync_files(courses=[(path, course) for course in courses], index_workers=index_workers,
+                                            category_workers=category_workers, download_workers=download_workers,
+                                            byte_budget=download_budget)
+
+                # 5) Update cache after each check
+                commit_cache()
+                commit_http_cache()
+                check_for_save_credentials()
+
+                if folders:
+                    print_summary(folders, stats, prefix=f"[{datetime.now():%H:%M:%S}] ")
+                else:
+                    print(f"[{datetime.now():%H:%M:%S}] Não foram encontrados ficheiros novos.")
+            except requests.exceptions.RequestException as e:
+                log.error(f"Erro de conexão ao CLIP, a tentar novamente na próxima verificação: {e}")
+            except (EmptyHTMLException, SessionExpiredError, LoginError) as e: # e.g. the server failed mid-response
+                log.error(f"{e} A tentar novamente na próxima verificação.")
+
+            # Random variation, so checks don't line up with other clients or the server's periodic tasks
+            delay = interval * random.uniform(1 - cfg.WATCH_JITTER, 1 + cfg.WATCH_JITTER)
+            log.info(f"Próxima verificação dentro de {delay:.0f}s.")
+            time.sleep(delay)
+    except KeyboardInterrupt:
+        print("A terminar o Clippy.")
+
+    raise ExitHandler(0)
+
 @app.callback(invoke_without_command=True)
 @app.command(help="Sincroniza os ficheiros de todas as cadeiras de um ano lectivo. [default]")
 def batch(ctx: typer.Context,
-        username: Annotated[str, typer.Option("-u", "--username",help="O nome de utilizador no CLIP.", show_default=False)] = None,
-        path: Annotated[Path, typer.Option("-p", "--path", help="A pasta onde os ficheiros do CLIP serão guardados.", show_default=False)] = None,
-        year: Annotated[int, typer.Option("-y","--year",help="Define o ano lectivo a transferir.", show_default=False)] = 0,
-        auto: Annotated[bool, typer.Option(help="Escolhe automaticamente o ano lectivo mais recente.")] = True,
-        relogin: Annotated[bool, typer.Option("--relogin", help="Ignora as credenciais guardadas em sistema.")] = False,
-        debug: Annotated[bool, typer.Option("-d","--debug",help="Cria um ficheiro log.log para efeitos de debug.", hidden = True)] = False,
+        username: Annotated[Optional[List[str]], typer.Option("-u", "--username",help="O nome de utilizador no CLIP. Repete a opção para sincronizar vários utilizadores.", show_default=False)] = None,
+        path: PathOption = None,
+        year: Annotated[Optional[List[int]], typer.Option("-y","--year",help="Define o ano lectivo a transferir. Repete a opção para transferir vários anos.", show_default=False)] = None,
+        all_years: Annotated[bool, typer.Option("--all-years", help="Transfere todos os anos lectivos do utilizador.")] = False,
+        auto: AutoOption = True,
+        relogin: ReloginOption = False,
+        refresh: RefreshOption = False,
+        index_workers: IndexWorkersOption = cfg.MAX_INDEX_WORKERS,
+        category_workers: CategoryWorkersOption = cfg.MAX_CATEGORY_WORKERS,
+        parse_workers: ParseWorkersOption = cfg.PARSE_WORKERS,
+        download_workers: DownloadWorkersOption = cfg.MAX_DOWNLOAD_WORKERS,
+        max_connections: MaxConnectionsOption = cfg.MAX_CONNECTIONS,
+        rate_limit: RateLimitOption = None,
+        bandwidth_limit: BandwidthLimitOption = None,
+        download_budget: DownloadBudgetOption = None,
+        dedup: DedupOption = False,
+        trace: TraceOption = None,
+        progress: ProgressOption = "auto",
+        debug: DebugOption = False,
         version: Annotated[Optional[bool], typer.Option("-v", "--version", help=__version__, callback=version_callback, is_eager=True)] = None,
     ):
     """\bO Clippy é um simples web scrapper e gestor de downloads para a plataforma interna de e-learning da FCT-NOVA, o CLIP.
@@ -164,80 +424,259 @@ def batch(ctx: typer.Context,
         # Execute subcommand
         return
     
+    progress_handler.set_mode(progress)
     start_routine(debug)
+    cfg.session_mount(max_connections, rate_limit, pool_size=index_workers + category_workers + download_workers,
+                      bandwidth_limit=bandwidth_limit * 1024 if bandwidth_limit else None)
+    if trace is not None:
+        tracer.start(trace)
+    parse_pool.set_workers(parse_workers)
 
     # Check valid path
-    if path is None:
-        path = Path.cwd()
-        if path.name != "CLIP": path = path / "CLIP"
-    print(f"A iniciar o Clippy na directoria {path}...")
-    path = check_path(path)
+    path = open_path(path, dedup)
 
-    #0) Start login and look for academic years
-    userID = start_login(username, relogin)
+    #0-1) Start login for each user and look for their courses
+    jobs = find_courses(path, username, year, all_years, auto, relogin, refresh)
 
-    years = parse_years(userID)
-    if year != 0 and year not in years.values:
-        log.error("O utilizador não tem cadeiras inscritas no ano solicitado.")
+    if not any(courses for _, courses, _, _ in jobs):
         raise ExitHandler(0)
-    elif len(years)<1:
-        log.error("Não foram encontrados anos lectivos nos quais o utilizador está inscrito.")
-        raise ExitHandler(0)
-    elif len(years)==1:
-        year = list(years.values())[0] # get index 0
-        log.info(f"Encontrado apenas um ano lectivo ({year}).")
-    elif auto:
-        year = sorted(list(years.values()))[-1] # get index 0
-        log.info("Modo automático activo, a escolher o ano lectivo mais recente...")
+
+    # 2-4) (Asynchronous) Load each unit's index and compare it to cached file if it exists,
+    # then load each changed subcategory's table and download missing files as soon as they are found
+    print_progress(2, "A verificar se há ficheiros novos...")
+    folders, stats = sync_files(jobs=jobs, index_workers=index_workers,
+                                category_workers=category_workers, download_workers=download_workers,
+                                byte_budget=download_budget)
+    log.debug(f"Ficheiros transferidos por pasta: {folders}")
+    if not folders:
+        print_progress(4, "Não há ficheiros a transferir.")
+
+    # 5) Update cache after successful download
+    print_progress(5, "A actualizar cache...")
+    commit_cache()
+    commit_http_cache()
+
+    # 6) Exit with success
+    print_progress(6, "Concluído :)")
+    if folders:
+        print_summary(folders, stats)
     else:
-        year = inquirer.rawlist( #TODO multiselect
-            message="Qual é o ano lectivo a transferir?",
-            choices=[
-                {"name": key, "value": value} for key, value in years.items()
-            ],
-            default=1,
-            max_height=len(years)
-        ).execute()
-    log.debug(f"Ano: {year}")
+        print("Não foram encontrados ficheiros novos.")
+    
+    check_for_save_credentials()
+
+    raise ExitHandler(0)
 
-    # 1) Scrape units list
-    print_progress(1,"A procurar unidades curriculares inscritas...")
-    courses = parse_courses(year,userID)
-    log.info("Encontradas as seguintes unidades: "+" | ".join(course.name for course in courses) )
+@app.command()
+def plan(
+        output: Annotated[Path, typer.Option("-o", "--output", help="O ficheiro onde o plano será guardado.")] = Path("plan.json"),
+        username: Annotated[Optional[List[str]], typer.Option("-u", "--username",help="O nome de utilizador no CLIP. Repete a opção para planear vários utilizadores.", show_default=False)] = None,
+        path: PathOption = None,
+        year: Annotated[Optional[List[int]], typer.Option("-y","--year",help="Define o ano lectivo a planear. Repete a opção para planear vários anos.", show_default=False)] = None,
+        all_years: Annotated[bool, typer.Option("--all-years", help="Planeia todos os anos lectivos do utilizador.")] = False,
+        auto: AutoOption = True,
+        relogin: ReloginOption = False,
+        refresh: RefreshOption = False,
+        index_workers: IndexWorkersOption = cfg.MAX_INDEX_WORKERS,
+        category_workers: CategoryWorkersOption = cfg.MAX_CATEGORY_WORKERS,
+        parse_workers: ParseWorkersOption = cfg.PARSE_WORKERS,
+        max_connections: MaxConnectionsOption = cfg.MAX_CONNECTIONS,
+        rate_limit: RateLimitOption = None,
+        trace: TraceOption = None,
+        progress: ProgressOption = "auto",
+        debug: DebugOption = False,
+    ):
+    """Procura os ficheiros novos no CLIP e guarda a lista do que seria transferido num plano, sem transferir nada."""
 
-    # 2) (Multithreaded) Load each unit's index and compare it to cached file if it exists
+    progress_handler.set_mode(progress)
+    start_routine(debug)
+    cfg.session_mount(max_connections, rate_limit, pool_size=index_workers + category_workers)
+    if trace is not None:
+        tracer.start(trace)
+    parse_pool.set_workers(parse_workers)
+
+    # Check valid path
+    path = open_path(path)
+
+    #0-1) Start login for each user and look for their courses
+    jobs = find_courses(path, username, year, all_years, auto, relogin, refresh)
+
+    # 2-3) (Asynchronous) Load each unit's index and each changed subcategory's table, listing the missing files
     print_progress(2, "A verificar se há ficheiros novos...")
-    subcats = threadpool_execute(search_cats_in_course, [(path, course) for course in courses])
-    log.debug(f"Lista de subcategorias a procurar: {subcats}")
+    sync_files(jobs=jobs, index_workers=index_workers, category_workers=category_workers, plan=True)
 
-    # 3) (Multithreaded) Load each subcategory's table and compare it to the local folder
-    print_progress(3, "A obter URLs dos ficheiros a transferir...")
-    files = threadpool_execute(search_files_in_category, subcats)
-    log.debug(f"Lista de ficheiros a transferir: {files}")
-    
-    # 4) (Multithreaded) Download missing files
-    if len(files) != 0:
-        download_time, download_size = download_files(files, path)
+    # 4) Save the plan; the course counts are kept in it until it is applied
+    files, size = plan_handler.write(output, path)
+    commit_cache()
+    commit_http_cache()
+
+    print_progress(6, "Concluído :)")
+    if files:
+        print(f"Plano com {files} ficheiros ({human_readable_size(size)}) guardado em '{output}'.")
+        print(f"Para os transferir, executa: clippy apply {output}")
     else:
+        print(f"Não foram encontrados ficheiros novos. Plano vazio guardado em '{output}'.")
+
+    check_for_save_credentials()
+
+    raise ExitHandler(0)
+
+@app.command()
+def apply(
+        plan_file: Annotated[Path, typer.Argument(help="O ficheiro do plano criado com clippy plan.", show_default=False)],
+        path: Annotated[Path, typer.Option("-p", "--path", help="A pasta onde os ficheiros do CLIP serão guardados, se não for a do plano.", show_default=False)] = None,
+        relogin: ReloginOption = False,
+        download_workers: DownloadWorkersOption = cfg.MAX_DOWNLOAD_WORKERS,
+        max_connections: MaxConnectionsOption = cfg.MAX_CONNECTIONS,
+        rate_limit: RateLimitOption = None,
+        bandwidth_limit: BandwidthLimitOption = None,
+        download_budget: DownloadBudgetOption = None,
+        dedup: DedupOption = False,
+        trace: TraceOption = None,
+        progress: ProgressOption = "auto",
+        debug: DebugOption = False,
+    ):
+    """Transfere os ficheiros de um plano criado com clippy plan, sem voltar a procurá-los no CLIP."""
+
+    progress_handler.set_mode(progress)
+    start_routine(debug)
+    cfg.session_mount(max_connections, rate_limit, pool_size=download_workers,
+                      bandwidth_limit=bandwidth_limit * 1024 if bandwidth_limit else None)
+    if trace is not None:
+        tracer.start(trace)
+
+    try:
+        path, planned, counts = plan_handler.read(plan_file, path)
+    except (OSError, ValueError) as e:
+        log.error(f"Não foi possível ler o plano: {e}")
+        raise ExitHandler(1)
+    path = open_path(path, dedup)
+
+    # Files already downloaded by a previous (e.g. interrupted) run are skipped
+    pending = {user: [file for file in files if not plan_handler.is_applied(file[0], file[3])] for user, files in planned.items()}
+    done = sum(len(files) for files in planned.values()) - sum(len(files) for files in pending.values())
+    if done:
+        log.info(f"{done} ficheiros do plano já estão na pasta.")
+
+    #0) Start login for each user with files to download
+    jobs = []
+    for user, files in pending.items():
+        if files:
+            cfg.use_session(cfg.new_session())
+            start_login(user, relogin)
+            jobs.append((contextvars.copy_context(), [], [], files))
+
+    # 4) (Asynchronous) Download the planned files
+    folders, stats = sync_files(jobs=jobs, download_workers=download_workers, byte_budget=download_budget)
+    if not folders:
         print_progress(4, "Não há ficheiros a transferir.")
 
-    # 5) Update cache after successful download
+    # 5) Store the counts of the courses whose files are all in place, so the next sync doesn't scan them again
     print_progress(5, "A actualizar cache...")
+    for folder, course_counts in counts:
+        if all(plan_handler.is_applied(file[0], file[3]) for files in planned.values() for file in files
+               if file[0].parent.parent == folder):
+            stash_cache(course_counts, folder)
     commit_cache()
 
     # 6) Exit with success
     print_progress(6, "Concluído :)")
-    if len(files) != 0:
-        unique_folders = sorted({str(file[0].parent) for file in files})
-        print(f"Transferidos {len(files)} ficheiros ({human_readable_size(download_size)} em [dim cyan bold]{download_time}[/dim cyan bold]s = {human_readable_size(download_size/download_time)}/s) para as pastas:",flush=True)
-        print("\n".join(f"'{folder}'" for folder in unique_folders))
+    if folders:
+        print_summary(folders, stats)
     else:
-        print("Não foram encontrados ficheiros novos.")
-    
+        print("Não há ficheiros do plano por transferir.")
+
     check_for_save_credentials()
 
     raise ExitHandler(0)
 
+def find_courses(path: Path, usernames: [str] = None, requested_years: [int] = None, all_years: bool = False,
+                 auto: bool = True, relogin: bool = False, refresh: bool = False) -> list:
+    """Logs in with each user and lists their courses in the chosen academic years.
+
+    Args:
+    path (Path): The folder where the CLIP files are saved.
+    usernames ([str]): The users to log in with (None for the saved user).
+    requested_years ([int]): The years requested by the user, if any.
+    all_years (bool): Choose every year.
+    auto (bool): Choose the latest year instead of asking the user.
+    relogin (bool): Ignore the saved credentials.
+    refresh (bool): Ask CLIP for the years and courses, even if a recent run already did.
+
+    Returns the (context, courses, subcats, files) jobs for sync_files(), one per user, with their session.
+    Courses shared with a previous user are only listed once.
+    The years and courses found less than LISTING_MAX_AGE ago are reused without asking CLIP (and checked in the background).
+    """
+    max_age = 0 if refresh else cfg.LISTING_MAX_AGE
+    jobs = []
+    known_courses = set()
+    for user in usernames or [None]:
+        # Each user has its own session (cookies), sharing the same connection pool
+        cfg.use_session(cfg.new_session())
+        plan_handler.current_user.set(user) # plans and the manifest record which user can download each file
+        userID = start_login(user, relogin)
+
+        try:
+            years = select_years(parse_years(userID, max_age), requested_years, all_years, auto)
+            log.debug(f"Anos: {years}")
+
+            # 1) Scrape units list
+            print_progress(1,"A procurar unidades curriculares inscritas...")
+            courses = []
+            for _year in years:
+                for course in parse_courses(_year, userID, max_age):
+                    course_key = (course.id, course.year, course.semester_type, str(course.semester))
+                    if course_key not in known_courses: # skip courses shared with a previous user
+                        known_courses.add(course_key)
+                        courses.append(course)
+        except EmptyHTMLException as e:
+            log.error(e)
+            raise ExitHandler(0)
+        log.info("Encontradas as seguintes unidades: "+" | ".join(course.name for course in courses) )
+        jobs.append((contextvars.copy_context(), [(path, course) for course in courses], [], []))
+    return jobs
+
+def select_years(years: dict, requested: [int] = None, all_years: bool = False, auto: bool = True) -> [int]:
+    """Chooses which of the user's academic years to transfer.
+
+    Args:
+    years (dict): The user's academic years, as returned by parse_years().
+    requested ([int]): The years requested by the user, if any.
+    all_years (bool): Choose every year.
+    auto (bool): Choose the latest year instead of asking the user.
+    
+    Returns the list of chosen years.
+    """
+    if len(years)<1:
+        log.error("Não foram encontrados anos lectivos nos quais o utilizador está inscrito.")
+        return []
+    elif all_years:
+        return sorted(years.values())
+    elif requested:
+        missing = [year for year in requested if year not in years.values()]
+        if missing:
+            log.error(f"O utilizador não tem cadeiras inscritas no(s) ano(s) solicitado(s): {missing}")
+        return [year for year in requested if year in years.values()]
+    elif len(years)==1:
+        year = list(years.values())[0] # get index 0
+        log.info(f"Encontrado apenas um ano lectivo ({year}).")
+        return [year]
+    elif auto:
+        log.info("Modo automático activo, a escolher o ano lectivo mais recente...")
+        return [sorted(years.values())[-1]]
+    else:
+        from InquirerPy import inquirer
+        return inquirer.checkbox(
+            message="Quais são os anos lectivos a transferir?",
+            choices=[
+                {"name": key, "value": value} for key, value in years.items()
+            ],
+            instruction="(Espaço para seleccionar)",
+            validate=lambda result: len(result) >= 1,
+            invalid_message="Escolhe pelo menos um ano lectivo.",
+            max_height=len(years)
+        ).execute()
+
 def start_routine(debug) -> int:
     """Sets up the program environment and logs in.
     Returns the user's ID."""
@@ -250,18 +689,20 @@ def start_routine(debug) -> int:
     # Check for updates
     check_for_updates()
 
+@tracer.traced("login")
 def start_login(username: str, force_relogin: bool = False):
     valid_login = False
     while not valid_login:
         try:
             if force_relogin:
-                userID = get_login(username)
-            elif username is None:
-                userID = get_login(load_username(), load_password())
-            else:
-                userID = get_login(username, load_password(username))
+                reset_login() # the saved credentials are ignored
+                userID = get_login(username, reuse_session=False)
+            else: # the password is only loaded if the stored session can't be reused
+                userID = get_login(username if username is not None else load_username())
             valid_login = True
-        except LoginError:
+        except LoginError as e:
+            log.error(e)
+            reset_login() # ask for the credentials instead of using the saved ones
             continue
     return userID
     
@@ -288,24 +729,27 @@ def set_log_level(debug: bool = False):
         file_logging.setFormatter(formatter)
         logger.addHandler(file_logging)
 
-def threadpool_execute(worker_function, items, max_workers=cfg.MAX_THREADS):
-    results = []
-    with cf.ThreadPoolExecutor(max_workers=max_workers) as pool: 
-        futures = {pool.submit(worker_function, *args): args for args in items}
-        
-        for future in cf.as_completed(futures):
-            args = futures[future]
-            try:
-                result = future.result()  # Get the result from the future
-                if result is not None:
-                    results.extend(result)
-            except Exception as e:
-                log.error(f"Erro a processar {args}: {e}")
-    
-    return results
+def default_path(path: Path = None) -> Path:
+    """Gets the folder where the CLIP files are saved: the given one, or a CLIP folder in the current directory."""
+    if path is None:
+        path = Path.cwd()
+        if path.name != "CLIP": path = path / "CLIP"
+    return path
+
+def open_path(path: Path = None, dedup: bool = False) -> Path:
+    """Checks the folder where the CLIP files are saved, asking to create it if it doesn't exist,
+    and keeps the deduplication store in it if enabled.
+    Returns the folder."""
+    path = default_path(path)
+    print(f"A iniciar o Clippy na directoria {path}...")
+    path = check_path(path)
+    if dedup:
+        blob_store.enable(path)
+    return path
 
 def check_path(path: Path):
     if not path.exists():
+        from InquirerPy import inquirer
         if inquirer.confirm(
             message=f"A directoria {path} não existe. Criá-la?",
             default=True,
@@ -325,6 +769,7 @@ def check_path(path: Path):
     return path
 
 def query_path(path: Path = None):
+    from InquirerPy import inquirer
     return Path(inquirer.filepath(
                 message="Introduza a directoria onde pretende guardar os ficheiros:",
                 default = str(path),
@@ -336,26 +781,44 @@ def dict_compare(dict_a: dict, dict_b: dict):
     elif dict_a is None: return dict_b
     else: return {key: dict_a[key] for key in dict_a.keys() if key not in dict_b or dict_a[key] > dict_b[key]}
 
-def search_cats_in_course(path: Path, course: Course) -> [(str, str, Course, Path)]:
-    print(f"A procurar documentos de {course.name}...")
+@tracer.traced("index", lambda path, course: {"course": course.name})
+def search_cats_in_course(path: Path, course: Course) -> ([(str, str, Course, Path, bool, DirSnapshot)], [(Path, str, int, float)]):
+    """
+    Load a course's index and decide, for each category, how to sync it with the local folder:
+    categories with new files in the server are scanned; in the others, the files the sync manifest has
+    but are missing from the local folder are downloaded again without loading the category's table.
+
+    Args:
+        path (Path): The folder where the CLIP files are saved.
+        course (Course): The course.
+
+    Returns (subcats, files)
+        subcats: The arguments for search_files_in_category() of each category to scan.
+        files: The arguments for download_file() of each file to download again.
+    """
+    log.info(f"A procurar documentos de {course.name}...")
+    root = path
     path = path / str(course.year)
 
     index, course.name = parse_index(course.year, course.semester_type, course.semester, course.id)
 
     if not index: #skips creating directory if there are no documents
         log.info(f"Não foram encontrados documentos em {course.name}.")
+        return [], []
     else:
         log.debug(f"Contagem para {course.name}: {index}")
         full_semester = str(course.semester)+course.semester_type.upper()
         full_path = path / full_semester / course.name
 
         full_path.mkdir(parents=True, exist_ok=True) # Create folder if it does not exist
+        snapshot = DirSnapshot(full_path, IgnoreRules.load(root)) # every local file of the course, listed once
 
         # Cache management
         cachedict = parse_cache(full_path, index, course.name)
         cachediff = dict_compare(index, cachedict)
 
         _subcats = []
+        _files = []
         
         if not cachediff:
             log.debug(f"Sem diferenças para {course.name} em relação à contagem em cache.")
@@ -367,28 +830,30 @@ def search_cats_in_course(path: Path, course: Course) -> [(str, str, Course, Pat
             stash_cache(index,full_path)
 
             for category,count in cachediff.items():
-                _subcats.append((category,index.get_catID(category),course,full_path))
-                #search_files_in_category(category,index.get_catID(category),course,full_path)
+                _subcats.append((category,index.get_catID(category),course,full_path,False,snapshot))
         
-        folderdict = count_files_in_subfolders(full_path)
-        folderdiff = dict_compare(cachedict, folderdict)
-
-        if not folderdiff:
-            log.debug(f"Sem diferenças para {course.name} em relação à contagem de ficheiros.")
-        else:
-            log.warning(f"A contagem de ficheiros em {course.name} não coincide com a da última actualização. Quaisquer ficheiros apagados serão transferidos novamente.")
-            log.debug(f"Na pasta: {folderdict}")
-            log.debug(f"Em cache: {cachedict}")
-            log.info(f"Pastas de {course.name} com menos ficheiros que a contagem em cache: {folderdiff}")
-
-            for category,count in folderdiff.items():
-                _subcats.append((category,index.get_catID(category),course,full_path))
-                #search_files_in_category(category,index.get_catID(category),course,full_path)
+        # Categories without changes in the server are checked against the manifest, file by file
+        folderdict = None
+        for category,count in (cachedict or {}).items():
+            if category in cachediff or category not in index:
+                continue
+            known, missing = reconcile(full_path / category, snapshot)
+            if missing:
+                log.warning(f"Faltam {len(missing)} ficheiros de {course.name} > {category} na pasta, vão ser transferidos novamente.")
+                log.debug(f"Ficheiros em falta: {missing}")
+                _files += missing
+            if known < count: # synced before the manifest existed, fall back to comparing the file count
+                folderdict = folderdict if folderdict is not None else snapshot.count_files()
+                if folderdict.get(category, 0) < count:
+                    log.warning(f"A pasta {course.name} > {category} tem menos ficheiros que a contagem da última actualização. Quaisquer ficheiros apagados serão transferidos novamente.")
+                    _subcats.append((category,index.get_catID(category),course,full_path,True,snapshot))
 
         log.debug(f"Subcategorias de {course.name}: {_subcats}")
-        return _subcats
+        return _subcats, _files
 
-def search_files_in_category(category: str, catID: str, course: Course, full_path: Path) -> [(Path, str, int, datetime)]:
+@tracer.traced("category", lambda category, catID, course, *args, **kwargs: {"course": course.name, "category": category})
+def search_files_in_category(category: str, catID: str, course: Course, full_path: Path, verify_local: bool = False,
+                             snapshot: DirSnapshot = None) -> [(Path, str, int, float)]:
     """
     Search for files in a specific category and download them if needed.
 
@@ -397,16 +862,19 @@ def search_files_in_category(category: str, catID: str, course: Course, full_pat
         catID (str): The ID of respective category.
         course (Course): The course for which to search documents.
         full_path (Path): The full path to the directory where files should be downloaded.
+        verify_local (bool): Look for each file in the local folder even if it is in the sync manifest.
+        snapshot (DirSnapshot, optional): A listing of the course's folder, to look for the files in.
     """
     try:
-        print(f"A procurar {category} de {course.name}...")
+        log.info(f"A procurar {category} de {course.name}...")
         table = parse_docs(course.year,course.semester_type, course.semester, course.id, catID)
+        manifest.record_catalogue(full_path / category, course.year, course.name, category, table)
 
         _files = []
         for file in table:
             folder = full_path / category
             log.debug(f"A procurar {file} na pasta {folder}...")
-            _file = get_file(file,folder)
+            _file = get_file(file,folder,verify_local,snapshot)
             if _file is not None:
                 _files.append(_file)
         
@@ -417,25 +885,47 @@ def search_files_in_category(category: str, catID: str, course: Course, full_pat
         log.error(f'Erro a procurar {category} de {course}: {str(ex)}')
         pass
 
-def download_files(files, path) -> (int,int):
-    """Download requested files to the specified path.
+def sync_files(courses=(), subcats=(), jobs=(), files=(), index_workers: int = cfg.MAX_INDEX_WORKERS,
+               category_workers: int = cfg.MAX_CATEGORY_WORKERS, download_workers: int = cfg.MAX_DOWNLOAD_WORKERS,
+               byte_budget: float = None, plan: bool = False) -> (dict, TransferStats):
+    """Search the given courses and subcategories for new files and download them.
     
     Args:
-    files: The array of files to download.
-    path (Path): The path to save the files.
+    courses: The array of (path, course) tuples whose index should be searched.
+    subcats: The array of subcategories whose table should be searched.
+    jobs: The array of (context, courses, subcats, files) tuples to search with another context (e.g. another user's session).
+    files: The array of files to download without searching (e.g. missing from the local folder).
+    index_workers (int): Maximum number of course indexes to load simultaneously.
+    category_workers (int): Maximum number of subcategory tables to load simultaneously.
+    download_workers (int): Maximum number of files to download simultaneously.
+    byte_budget (float): Maximum number of megabytes to download, the remaining files are left for the next run (None for unlimited).
+    plan (bool): Add the files to the plan (see plan_handler) instead of downloading them.
     
-    Returns (download_time, download_size)
-        download_time: How much time the download took.
-        download_size: The total size of the downloaded files.
+    Returns (folders, stats)
+        folders: The number of files sent to download to each folder.
+        stats: The statistics of the downloads (bytes, files, durations and throughput).
     """
-    download_timestart = time.time_ns()
-    download_sizestart = sum(f.stat().st_size for f in path.glob('**/*') if f.is_file())
-    print_progress(4, "A transferir ficheiros em falta...")
-    _ = threadpool_execute(download_file, files, max_workers=4)
-    print_progress(4,"Todos os ficheiros foram transferidos.")
-    download_time = (time.time_ns() - download_timestart) / 10**9
-    download_size = (sum(f.stat().st_size for f in path.glob('**/*') if f.is_file())) - download_sizestart
-    return download_time, download_size
+    # Each download's duration is only kept to be logged
+    stats = TransferStats(durations=log.getLogger().isEnabledFor(log.DEBUG))
+    # Downloads are scheduled by the size CLIP reports for each file
+    download = plan_handler.add if plan else partial(download_file, stats=stats)
+    with progress_handler.monitor(): # drawn by a single renderer, the workers only update counters
+        folders = run_pipeline(search_cats_in_course, search_files_in_category, download, courses, subcats, jobs, files,
+                               index_workers=index_workers, category_workers=category_workers, download_workers=download_workers,
+                               size_of=lambda file: file[2] or 0, byte_budget=int(byte_budget * 1024**2) if byte_budget else None,
+                               download_message="A registar ficheiros em falta no plano..." if plan else "A transferir ficheiros em falta...")
+    if folders and not plan:
+        print_progress(4,"Todos os ficheiros foram transferidos.")
+        log.debug(f"Estatísticas das transferências: {stats}")
+        for file, (size, duration) in (stats.durations or {}).items():
+            log.debug(f"{file}: {size} bytes em {duration:.3f}s")
+    log.debug(f"Concorrência: {cfg.get_session().limiter}")
+    return folders, stats
+
+def print_summary(folders: dict, stats: TransferStats, prefix: str = ""):
+    """Prints the number, size and speed of the downloaded files and the folders they were saved to."""
+    print(f"{prefix}Transferidos {stats.files} ficheiros ({human_readable_size(stats.bytes)} em [dim cyan bold]{stats.elapsed():.2f}[/dim cyan bold]s = {human_readable_size(stats.throughput())}/s) para as pastas:",flush=True)
+    print("\n".join(f"'{folder}'" for folder in sorted(folders)))
 
 def check_for_updates():
     '''Checks Github for updates.'''
@@ -453,6 +943,9 @@ def check_for_updates():
 
 
 if __name__ == "__main__":
+    # The parser processes are spawned, which re-runs a frozen executable (PyInstaller) in each of them
+    import multiprocessing
+    multiprocessing.freeze_support()
     try:
         app()
     except Exception as e:
@@ -1,42 +1,100 @@
-from bs4 import BeautifulSoup as bs
-import re
 import logging as log
 from .get_URL import get_URL_YearList, get_URL_CourseList, get_URL_FileList, get_URL_Index
-from .get_html import get_html
+from .get_html import fetch_html
+from . import http_cache, parse_pool, tracer
+from .html_backend import extract_years, extract_index, extract_courses, extract_files, YEAR_LINK
 from modules.CatCount import CatCount
 from modules.CourseList import CourseList
 from modules.FilesList import FilesList
+from modules.Course import Course
 from modules.EmptyHTMLException import EmptyHTMLException
 
 #Config
 import clippy.config as cfg
 
-def parse_years(user: int):
+def parse_cached(url: str, extractor, build=lambda records: records, dump=lambda result: result, load=lambda data: data,
+                 max_age: float = None):
+    """
+    Fetch and parse a page, reusing the result of the last parse if the page didn't change since then.
+    The HTML is parsed by the parser processes (see parse_pool), the result is built in the calling thread.
+    With max_age, a page fetched less than max_age seconds ago isn't fetched at all: the last parse is
+    returned and the page is checked in the background, so the next run gets its changes.
+
+    Args:
+        url (str): The URL of the page.
+        extractor (callable): Module-level function of html_backend that extracts the records of the page's HTML.
+        build (callable): Builds the parsed result from the extracted records.
+        dump (callable): Converts the parsed result to a JSON-serialisable value.
+        load (callable): Converts the stored value back to the parsed result.
+        max_age (float, optional): How old, in seconds, the last parse can be to be used without asking the server.
+    """
+    if max_age:
+        parsed = http_cache.get_fresh(url, max_age)
+        if parsed is not None:
+            try:
+                result = load(parsed)
+            except (KeyError, TypeError, ValueError): # stored by an older version, in another format
+                pass
+            else:
+                log.debug(f"Página verificada há menos de {max_age}s, a usar a análise em cache: {url}")
+                http_cache.refresh(lambda: revalidate(url, extractor, build, dump, load, parsed))
+                return result
+    html, unchanged = fetch_html(url)
+    if unchanged:
+        parsed = http_cache.get_parsed(url)
+        if parsed is not None:
+            try:
+                result = load(parsed)
+                log.debug(f"Página inalterada desde a última actualização, a saltar análise: {url}")
+                return result
+            except (KeyError, TypeError, ValueError): # stored by an older version, in another format
+                log.debug(f"Análise em cache num formato antigo, a analisar novamente: {url}")
+    with tracer.span("parse", page=tracer.url_class(url), bytes=len(html)):
+        try:
+            records = parse_pool.extract(extractor, html)
+        except Exception:
+            log.debug(f"Falhou a análise de {url}, com o seguinte conteúdo HTML:\n {html}")
+            raise
+        result = build(records)
+    http_cache.set_parsed(url, dump(result))
+    return result
+
+def revalidate(url: str, extractor, build, dump, load, parsed):
+    """
+    Fetch and parse a page whose cached parse was used, so the next run uses its changes.
+
+    Args:
+        url (str): The URL of the page.
+        extractor, build, dump, load: As in parse_cached().
+        parsed: The stored value of the parse that was used.
+    """
+    if dump(parse_cached(url, extractor, build, dump, load)) != parsed:
+        log.info(f"A página {url} mudou desde a última verificação; as alterações serão usadas na próxima execução (ou com --refresh).")
+
+@tracer.traced("years")
+def parse_years(user: int, max_age: float = cfg.LISTING_MAX_AGE):
     """
     Parse the user page to look for academic years the user was enrolled in.
 
     Args:
         user (int): The user's ID.
+        max_age (float): How old, in seconds, the last parse can be to be used without asking the server (0 to always ask).
     """
 
     url = get_URL_YearList(user)
-    soup = bs(get_html(url), 'html.parser')
-    links = soup.find_all("a", {"href": re.compile(r"ano_lectivo.+&ano_lectivo=(\d+)")})
-    log.debug(links)
-    #years = {match.group(1) for link in links if (match := re.search(r"ano_lectivo.+&ano_lectivo=(\d+)", link))}
-    years = { link.text : int(re.search(r"ano_lectivo.+&ano_lectivo=(\d+)",link['href']).group(1)) for link in links }
-
+    years = parse_cached(url, extract_years, build_years, max_age=max_age)
     log.debug(years)
     return years
 
-def parse_title(html: bs):
+def build_years(links: [(str, str)]):
     """
-    Parse the title of a course from its document index.
-    
+    Get the academic years the user was enrolled in from the links of the user page.
+
     Args:
-        html (bs): The HTML content of a course's documents page.
+        links ([(str, str)]): The text and href of each link to an academic year.
     """
-    return html.find('td', {'bgcolor': '#ddddd0'}).find('span', {'class': 'h4'}).text
+    log.debug(links)
+    return { text : int(YEAR_LINK.search(href).group(1)) for text, href in links }
 
 def parse_index(year: int, semester_type: str, semester: int, course: int):
     """
@@ -54,8 +112,9 @@ def parse_index(year: int, semester_type: str, semester: int, course: int):
     # Get all the links count
     # Create url link for the class
     url = get_URL_Index(year,semester_type, semester,course)
-    soup = bs(get_html(url), 'html.parser')
-    return CatCount(soup), parse_title(soup)
+    return parse_cached(url, extract_index, lambda records: (CatCount(records[0]), records[1]),
+                        dump=lambda result: [result[0], result[1]],
+                        load=lambda data: (CatCount.from_dict(data[0]), data[1]))
 
 def parse_docs(year: int, semester_type: str, semester: int, course: int, category: str):
     """
@@ -70,23 +129,34 @@ def parse_docs(year: int, semester_type: str, semester: int, course: int, catego
         category (str): The category of document.
 
     Returns:
-        FilesList: An array of ClipFile objects.
+        FilesList: The table of documents, which yields a ClipFile object for each document.
     """
     url = get_URL_FileList(year,semester_type,semester,course,category)
-    soup = bs(get_html(url), 'html.parser')  
-    return FilesList(soup)
+    return parse_cached(url, extract_files, FilesList,
+                        dump=lambda files: files.columns(),
+                        load=FilesList.from_columns)
 
-def parse_courses(year: int, user: int):
+@tracer.traced("courses", lambda year, user, *args, **kwargs: {"year": year})
+def parse_courses(year: int, user: int, max_age: float = cfg.LISTING_MAX_AGE):
     """
     Parse a list of courses for a specific year and user.
 
     Args:
         year (int): The academic year.
         user (int): The user ID.
+        max_age (float): How old, in seconds, the last parse can be to be used without asking the server (0 to always ask).
 
     Returns:
         CourseList: An object containing parsed course information.
+
+    Raises:
+        EmptyHTMLException: If the server returned an invalid page.
     """
     url = get_URL_CourseList(year, user)
-    soup = bs(get_html(url), 'html.parser') #TODO quando o servidor falha a meio dá IndexError out of range
-    return CourseList(soup)
\ No newline at end of file
+    try:
+        return parse_cached(url, extract_courses, CourseList,
+                            dump=lambda courses: [[course.name, course.id, course.year, course.semester, course.semester_type] for course in courses],
+                            load=lambda data: CourseList.from_courses([Course(*row) for row in data]), max_age=max_age)
+    except IndexError as e: # the server failed mid-response
+        raise EmptyHTMLException("Falha crítica: o servidor devolveu conteúdo HTML inválido. Espere uns segundos e tente novamente.\n"
+                                 "O conteúdo HTML devolvido pelo servidor fica registado no log de debug.") from e
\ No newline at end of file
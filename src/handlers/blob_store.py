@@ -0,0 +1,180 @@
+import hashlib
+import logging as log
+import os
+import shutil
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qs
+
+from handlers import manifest
+
+#Config
+import clippy.config as cfg
+
+"""
+Content-addressed deduplication store: with --dedup, each downloaded file is kept once in
+<path>/.clippy/store, named after the SHA-256 of its content, and linked into every folder where it
+appears (a reflink where the filesystem supports it, otherwise a hardlink, otherwise a copy).
+A file whose name, size and server object ID match a stored one isn't downloaded again.
+"""
+
+FICLONE = 0x40049409 # Linux ioctl that makes a copy-on-write clone of a file (btrfs, XFS)
+
+store_path = None
+
+def enable(path: Path):
+    """
+    Turns on deduplication for the files synced to a folder.
+
+    Args:
+        path (Path): The folder where the CLIP files are saved; the store is kept inside it.
+    """
+    global store_path
+    store_path = path / cfg.DEDUP_STORE
+    Path.mkdir(store_path, parents=True, exist_ok=True)
+    log.info(f"Desduplicação activa, ficheiros guardados em {store_path}")
+
+def enabled() -> bool:
+    return store_path is not None
+
+def hint(url: str) -> str:
+    """
+    Get the server's identifier of a file from its download link (the "oid" of the object in CLIP).
+
+    Args:
+        url (str): The download link of the file.
+    """
+    parts = urlsplit(url)
+    oid = parse_qs(parts.query).get("oid")
+    return oid[0] if oid else parts.path + "?" + parts.query
+
+def blob_path(hash: str) -> Path:
+    return store_path / hash[:2] / hash
+
+def file_hash(path: Path) -> str:
+    """
+    Get the SHA-256 of a file's content.
+
+    Args:
+        path (Path): The path of the file.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(cfg.DOWNLOAD_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def reflink(source: Path, target: Path):
+    """
+    Clone a file without copying its data, on filesystems that support it.
+
+    Raises:
+        OSError: If the filesystem (or OS) doesn't support it.
+    """
+    try:
+        import fcntl
+    except ImportError: # Windows
+        raise OSError("reflink não suportado")
+    with open(source, 'rb') as src, open(target, 'wb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            target.unlink()
+            raise
+
+def place(blob: Path, filepath: Path, file_mtime: float = None):
+    """
+    Put a stored file in a folder, replacing any file with the same name.
+
+    Args:
+        blob (Path): The file in the store.
+        filepath (Path): The path where it should appear.
+        file_mtime (float, optional): The modification time of the file in the server (epoch).
+    """
+    Path.mkdir(filepath.parent, parents=True, exist_ok=True)
+    temp = filepath.with_name(f".{filepath.name}.link")
+    temp.unlink(missing_ok=True)
+    shared = False
+    try:
+        reflink(blob, temp)
+    except OSError:
+        try:
+            os.link(blob, temp)
+            shared = True
+        except OSError: # e.g. the folder is in another filesystem
+            shutil.copyfile(blob, temp)
+    if file_mtime is not None:
+        # Hardlinks share their mtime, which has to stay at least as recent as every copy's mtime in the server
+        mtime = max(file_mtime, temp.stat().st_mtime) if shared else file_mtime
+        os.utime(temp, times=(mtime, mtime))
+    os.replace(temp, filepath)
+
+def verified(blob: Path, hash: str) -> bool:
+    """
+    Check that a stored file still has the content it is named after
+    (a hardlinked copy edited in one of the folders changes all of them).
+
+    Args:
+        blob (Path): The file in the store.
+        hash (str): The SHA-256 it should have.
+    """
+    try:
+        if file_hash(blob) == hash:
+            return True
+    except FileNotFoundError:
+        return False
+    log.warning(f"O ficheiro {blob} foi alterado e vai ser removido do armazém.")
+    blob.unlink(missing_ok=True)
+    return False
+
+def link_known(filepath: Path, url: str, file_size: int, file_mtime: float = None) -> str:
+    """
+    Put a file in its folder from the store, if its name, size and server hint match a stored file.
+
+    Args:
+        filepath (Path): The path where the file should be saved.
+        url (str): The download link of the file.
+        file_size (int): The size of the file as reported by the server.
+        file_mtime (float, optional): The modification time of the file in the server (epoch).
+
+    Returns:
+        str: The SHA-256 of the placed file, or None if it has to be downloaded.
+    """
+    key = (filepath.name, file_size, hint(url))
+    hash = manifest.lookup_blob(*key)
+    if hash is None:
+        return None
+    blob = blob_path(hash)
+    if not verified(blob, hash):
+        manifest.record_blob(*key, None)
+        return None
+    place(blob, filepath, file_mtime)
+    log.info(f"{filepath.name} já está no armazém, ligado a '{filepath.parent}' sem o transferir.")
+    return hash
+
+def add(filepath: Path, url: str, file_size: int, file_mtime: float = None, hash: str = None):
+    """
+    Move a downloaded file into the store and link it back to its folder.
+    If the store already has the same content, the download is replaced by a link to it.
+
+    Args:
+        filepath (Path): The path of the downloaded file.
+        url (str): The download link of the file.
+        file_size (int): The size of the file as reported by the server.
+        file_mtime (float, optional): The modification time of the file in the server (epoch).
+        hash (str, optional): The SHA-256 of the file, if it was computed while downloading it.
+    """
+    hash = hash or file_hash(filepath)
+    blob = blob_path(hash)
+    Path.mkdir(blob.parent, parents=True, exist_ok=True)
+    if blob.exists() and verified(blob, hash):
+        log.info(f"{filepath.name} é igual a um ficheiro já guardado, a substituir por uma ligação.")
+        place(blob, filepath, file_mtime)
+    else:
+        try:
+            os.link(filepath, blob)
+        except FileExistsError: # stored by another worker meanwhile
+            pass
+        except OSError:
+            shutil.copyfile(filepath, blob)
+    manifest.record_blob(filepath.name, file_size, hint(url), hash)
@@ -3,51 +3,50 @@ import logging as log
 from pathlib import Path
 
 from modules.CatCount import CatCount
+from handlers import manifest, tracer
 
 #Config
 import clippy.config as cfg # noqa: F401
 
-cache_stack = []
-
 def stash_cache(dict: CatCount, folder: Path):
     """
-    Stores JSON dump operations in an array for later execution with commit_cache().
-    
+    Stores a course's file count in the sync manifest for later execution with commit_cache().
+
     Args:
         dict (CatCount): A CatCount dictionary that stores a file count.
-        folder (Path): The folder where cache is to be stored
+        folder (Path): The course folder the count refers to.
     """
-    global cache_stack
-    cache_stack.append((folder / ".cache.json", dict))
+    manifest.set_counts(folder, dict)
 
+@tracer.traced("commit")
 def commit_cache():
     """
-    Creates a cache JSON file that stores a CatCount dictionary that was previously stashed with stash_cache().
-    
-    Args:
-        count (dict): A CatCount dictionary that stores a file count.
+    Writes the CatCount dictionaries that were previously stashed with stash_cache(), along with every
+    file recorded during the run, to the sync manifest.
     """
-    global cache_stack
-    for file, dict in cache_stack:
-        with open(file, 'w+') as json_file:
-            json.dump(dict, json_file)
+    manifest.commit()
 
 def parse_cache(full_path: Path, index: CatCount, coursename: str):
     """
-    Loads a cached file with the CatCount data from the previous scrape.
+    Loads the CatCount data from the previous scrape.
+    Falls back to the course folder's legacy .cache.json file, from before the sync manifest existed.
 
     Args:
-        full_path (Path): The path to the folder where cache is stored.
+        full_path (Path): The path to the course folder.
         index (CatCount): The fresh scraped data.
         coursename (str): The course's name.
     """
-    try:
-        cache_path = full_path / ".cache.json"
-        with open(cache_path, 'r') as json_file:
-            cache = json.load(json_file)
-    except FileNotFoundError:
-        log.info(f"Não foi encontrada contagem em cache para {coursename}.")
-        return None
+    cache = manifest.get_counts(full_path)
+    if cache is None:
+        try:
+            cache_path = full_path / ".cache.json"
+            with open(cache_path, 'r') as json_file:
+                cache = json.load(json_file)
+            log.info(f"A migrar a contagem de {coursename} de {cache_path} para o manifesto.")
+            manifest.set_counts(full_path, cache)
+        except FileNotFoundError:
+            log.info(f"Não foi encontrada contagem em cache para {coursename}.")
+            return None
 
     log.debug(f"Contagem em cache para {coursename}: {cache}")
-    return cache
\ No newline at end of file
+    return cache
@@ -1,9 +1,9 @@
-import requests
 import logging as log
 
 # Get the latest release from GitHub
 def get_latest_release():
     """Checks github for the latest release."""
+    import requests
     url = "https://api.github.com/repos/abtsousa/clippy/releases/latest"
     try:
         response = requests.get(url)
@@ -1,5 +1,3 @@
-import keyring
-from InquirerPy import inquirer
 import logging as log
 import configparser
 from pathlib import Path
@@ -46,6 +44,7 @@ def save_username_alt(username):
         print(f"Ficheiro de configuração guardado em: '{cfg.cfgpath}'")
 
 def delete_password(username):
+    import keyring
     keyring.delete_password(service_name, username)
 
 def load_username():
@@ -59,7 +58,8 @@ def load_username():
         log.debug(f"Found saved username: {username}")
         return username
     
-    # Keyring
+    # Keyring (imported only when needed, loading its backends is slow)
+    import keyring
     cred = keyring.get_credential(service_name, None)  # does not work in all keychain managers e.g. macOS
     if cred is not None:
         log.debug(f"Found saved username: {cred.username}")
@@ -71,8 +71,12 @@ def load_username():
     return username
 
 
-def load_password(username=load_username()):
-    """Loads a saved password, if found."""
+def load_password(username=None):
+    """Loads a saved password, if found.
+    
+    Args:
+        username (str): The user's username (the saved username if None).
+    """
     global keyring_disable
 
     if reset_flag:
@@ -85,6 +89,9 @@ def load_password(username=load_username()):
         return password
     
     # Keyring
+    import keyring
+    if username is None:
+        username = load_username()
     try:
         return keyring.get_password(service_name, username)
     except (keyring.errors.NoKeyringError, keyring.errors.KeyringError):  # keyring not found, not installed or error loading
@@ -99,6 +106,8 @@ def save_credentials(username, password):
         username (str): The user's username.
         password (str): The user's password.
     """
+    import keyring
+    from InquirerPy import inquirer
     if not keyring_disable and inquirer.confirm(
         message="Guardar credenciais em sistema para a próxima vez?",
         default=True,
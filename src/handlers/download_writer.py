@@ -0,0 +1,101 @@
+from pathlib import Path
+import glob
+import logging as log
+import os
+
+#Config
+import clippy.config as cfg
+
+def part_path(filepath: Path, file_mtime: float = None) -> Path:
+    """
+    Get the path of the hidden temporary file where a download is written until it completes.
+    The server's modification time is part of the name, so a partial download of an older version is never resumed.
+
+    Args:
+        filepath (Path): The final path of the file.
+        file_mtime (float, optional): The modification time of the file in the server (epoch).
+    """
+    stamp = int(file_mtime) if file_mtime is not None else 0
+    return filepath.with_name(f".{filepath.name}.{stamp}.part")
+
+def write_download(filepath: Path, url: str, file_mtime: float = None, chunk_size: int = cfg.DOWNLOAD_CHUNK_SIZE, progress=None,
+                   digest=None) -> int:
+    """
+    Stream a file from a given URL to a temporary .part file, then atomically move it to its final path.
+    A partial download left by a previous run is resumed with a Range request if the server supports it.
+    With a bandwidth limit, each chunk waits for its share of the speed of every download together.
+
+    Args:
+        filepath (Path): The path where the downloaded file will be saved.
+        url (str): The URL of the file to download.
+        file_mtime (float, optional): The desired modification time for the downloaded file (epoch). Defaults to None.
+        chunk_size (int, optional): The size in bytes of each chunk read from the network.
+        progress (callable, optional): Called with the number of bytes of each chunk written (and of the resumed part).
+        digest (hashlib object, optional): Updated with the whole content of the file as it is written (and the resumed part).
+
+    Returns:
+        int: The number of bytes transferred in this run.
+    """
+    Path.mkdir(filepath.parent, parents=True, exist_ok=True)
+    part = part_path(filepath, file_mtime)
+
+    # Partial downloads of other versions of the file can't be resumed
+    for stale in filepath.parent.glob(f".{glob.escape(filepath.name)}.*.part"):
+        if stale != part:
+            stale.unlink(missing_ok=True)
+
+    session = cfg.get_session()
+    bandwidth = session.bandwidth
+    if bandwidth is not None: # smaller chunks, so the limit is kept smoothly instead of in bursts
+        chunk_size = max(16 * 1024, min(chunk_size, int(bandwidth.rate / 4)))
+
+    offset = part.stat().st_size if part.exists() else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+    r = session.get(url, stream=True, headers=headers)
+
+    if r.status_code == 416: # partial file doesn't match the server's file anymore
+        log.debug(f"Não foi possível retomar {filepath.name}, a transferir do início.")
+        r.close()
+        offset = 0
+        r = session.get(url, stream=True)
+
+    with r: # released to the pool even if the download fails
+        if r.status_code == 206 and r.headers.get("Content-Range", "").startswith(f"bytes {offset}-"):
+            log.info(f"A retomar a transferência de {filepath.name} a partir de {offset} bytes.")
+            mode = 'ab'
+        elif r.status_code == 200:
+            offset = 0
+            mode = 'wb'
+        else:
+            from requests import HTTPError
+            raise HTTPError(f'Código de estado HTTP: {r.status_code}')
+
+        if progress is not None and offset:
+            progress(offset)
+        if digest is not None and offset:
+            with open(part, 'rb') as f:
+                for chunk in iter(lambda: f.read(chunk_size), b""):
+                    digest.update(chunk)
+
+        expected_size = int(r.headers["Content-Length"]) + offset if "Content-Length" in r.headers else None
+        written = 0
+        with open(part, mode) as f:
+            for chunk in r.iter_content(chunk_size=chunk_size):
+                if chunk:
+                    if bandwidth is not None:
+                        bandwidth.acquire(len(chunk))
+                    f.write(chunk)
+                    if digest is not None:
+                        digest.update(chunk)
+                    written += len(chunk)
+                    if progress is not None:
+                        progress(len(chunk))
+
+    if expected_size is not None and offset + written < expected_size:
+        raise IOError(f"Transferência incompleta ({offset + written} de {expected_size} bytes), será retomada na próxima execução.")
+
+    if file_mtime is not None:
+        log.debug("A actualizar mod-time para %d", int(file_mtime))
+        os.utime(part, times=(file_mtime, file_mtime))
+    os.replace(part, filepath)
+    return written
@@ -1,18 +1,20 @@
-from datetime import datetime
-from tqdm import tqdm
 from pathlib import Path
-from rich import print
+import hashlib
 import logging as log
-import os
-import requests
+import time
 
 from modules.ClipFile import ClipFile
-from handlers.print_handler import fixed_string_length
+from modules.DirSnapshot import DirSnapshot
+from modules.TransferStats import TransferStats
+from handlers.download_writer import write_download
+from handlers import blob_store, manifest, plan_handler, progress_handler, tracer
 
 #Config
 import clippy.config as cfg
 
-def download_file(filepath: Path, url: str, file_size=0, file_mtime=None):
+@tracer.traced("download", lambda filepath, *args, **kwargs: {"course": filepath.parent.parent.name,
+                                                               "category": filepath.parent.name, "file": filepath.name})
+def download_file(filepath: Path, url: str, file_size=0, file_mtime=None, stats: TransferStats = None):
     """
     Download a file from a given URL to a specified filepath.
 
@@ -20,74 +22,101 @@ def download_file(filepath: Path, url: str, file_size=0, file_mtime=None):
         filepath (Path): The path where the downloaded file will be saved.
         url (str): The URL of the file to download.
         file_size (int, optional): The expected size of the file in bytes. Defaults to 0.
-        file_mtime (datetime.datetime, optional): The desired modification time for the downloaded file. Defaults to None.
+        file_mtime (float, optional): The desired modification time for the downloaded file (epoch). Defaults to None.
+        stats (TransferStats, optional): Where to record the bytes transferred and the time it took.
     """
     try:
-        r = cfg.session.get(url, stream=True)
-        if file_size==0: file_size=r.headers['Content-Length']
-        chunk_size = 1024
-        downloaded_size = 0
-
-        if r.status_code == 200:
-            Path.mkdir(filepath.parent,parents=True, exist_ok=True)
-            with open(filepath, 'wb+') as f:
-                pbar = tqdm(total=file_size, unit="B", unit_scale=True, unit_divisor=1024, desc=f"A transferir {fixed_string_length(filepath.name,30)}")
-                for chunk in r.iter_content(chunk_size=chunk_size):
-                    if chunk:
-                        downloaded_size += len(chunk)
-                        pbar.update(len(chunk))
-                        f.write(chunk)
-                pbar.total=downloaded_size #force show 100% if file size overestimated or downloaded too fast
-                pbar.refresh()
-            if file_mtime is not None:
-                log.debug("Mod-time do ficheiro: %d", int(os.stat(filepath).st_mtime))
-                mtime = file_mtime.timestamp()
-                log.debug("A actualizar para %d", int(mtime))
-                os.utime(filepath,times=(mtime,mtime))
-                log.debug("Novo mod-time: %d", int(os.stat(filepath).st_mtime))
-        else:
-            raise requests.HTTPError(f'Código de estado HTTP: {r.status_code}')
+        hash = blob_store.link_known(filepath, url, file_size, file_mtime) if blob_store.enabled() else None
+        if hash is not None:
+            stat = filepath.stat()
+            manifest.record(filepath, url, file_size, file_mtime, stat.st_size, stat.st_mtime, hash=hash,
+                            user=plan_handler.current_user.get())
+            progress_handler.done(0, file_size)
+            return
+        start = time.perf_counter()
+        digest = hashlib.sha256() # recorded in the manifest, for clippy verify
+        # The progress display reads the bytes written, nothing is drawn from this thread
+        with progress_handler.transfer(filepath.name, file_size) as update:
+            written = write_download(filepath, url, file_mtime, progress=update, digest=digest)
+        if stats is not None:
+            stats.add(filepath, written, start, time.perf_counter())
+        if blob_store.enabled():
+            blob_store.add(filepath, url, file_size, file_mtime, digest.hexdigest())
+        stat = filepath.stat()
+        manifest.record(filepath, url, file_size, file_mtime, stat.st_size, stat.st_mtime, hash=digest.hexdigest(),
+                        user=plan_handler.current_user.get())
     except Exception as ex:
        log.error(f'Falhou o download de \'{url}\': {str(ex)}')
        pass
 
-def get_file(file: ClipFile, path: Path) -> (Path, str, int, datetime):
+def get_file(file: ClipFile, path: Path, verify_local: bool = False, snapshot: DirSnapshot = None) -> (Path, str, int, float):
     """
-    Search for a local file.
-    Calls download_to_file() to (re)download it if it's older or not found.
+    Search for a local file, first in the sync manifest and then in the local folder.
+    Returns the arguments for download_file() to (re)download it if it's older or not found.
 
     Args:
         file (ClipFile): The file to download.
         path (Path): The path where the file should be saved.
+        verify_local (bool): Check the local folder even if the manifest has the file (e.g. if it might have been deleted).
+        snapshot (DirSnapshot, optional): A listing of the course's folder, to check the local folder without a stat per file.
     """
-    log.debug(f"{file} {file.is_synced(path)}")
     file_path = path / file.name
-    
-    sync_status = file.is_synced(path)
+    mtime = file.mtime
+
+    if snapshot is not None and snapshot.ignored(file_path):
+        log.info(f"{file_path} é ignorado pelas regras de {cfg.IGNORE_FILE}, a saltar...")
+        # Recorded without a local copy, so the manifest still covers every file of the category
+        manifest.record(file_path, file.link, file.size, mtime, None, None, downloaded=False, user=plan_handler.current_user.get())
+        return None
+
+    if not verify_local:
+        # The snapshot tells for free if the file was deleted since it was recorded
+        record = manifest.lookup(file_path)
+        if (record is not None and record[2] is not None and record[3] is not None and record[2] >= mtime
+                and (snapshot is None or snapshot.stat(file_path) is not None)):
+            log.debug(f"{file} está no manifesto.")
+            return None
+
+    sync_status = file.is_synced(path, snapshot)
+    log.debug(f"{file} {sync_status}")
 
     if sync_status is None:
         return (path / file.name,file.link,file.size,file.mtime)
     elif sync_status: #True
         log.info(f"Encontrado {file.name} na pasta '{path}', a saltar...")
+        if snapshot is not None:
+            local_size, local_mtime = snapshot.stat(file_path)
+        else:
+            stat = file_path.stat()
+            local_size, local_mtime = stat.st_size, stat.st_mtime
+        manifest.record(file_path, file.link, file.size, mtime, local_size, local_mtime, downloaded=False,
+                        user=plan_handler.current_user.get())
         return None
     else: #False
         log.warning(f"O ficheiro '{file_path}' está desactualizado e vai ser transferido.")
         #download_to_file(path / file.name,file.link,file.size,file.mtime)
         return (path / file.name,file.link,file.size,file.mtime)
 
-def count_files_in_subfolders(path: Path) -> dict:
+def reconcile(folder: Path, snapshot: DirSnapshot) -> (int, [(Path, str, int, float)]):
     """
-    Counts the number of files in the subfolders of a given path.
+    Compare the files the sync manifest has in a folder with the local folder, without fetching its table from CLIP.
+    Files missing from the folder (or older than in the server) are returned to be downloaded again.
 
     Args:
-        path (Path): The path to the folder.
-    
+        folder (Path): The folder of a course's category.
+        snapshot (DirSnapshot): A listing of the course's folder.
+
     Returns:
-        A dictionary with each subfolder's name (key) and their respective files count (value).
+        (int, [(Path, str, int, float)]): The number of files the manifest has in the folder,
+        and the arguments for download_file() of each one that has to be downloaded.
     """
-    result = {}
-    for folder in path.iterdir():
-        if folder.is_dir():
-            file_count = sum(1 for _ in folder.glob('*') if _.is_file() and not _.name.startswith('.'))
-            result[folder.name] = file_count
-    return result
\ No newline at end of file
+    records = manifest.files_in(folder)
+    missing = []
+    for path, url, size, server_mtime, _, _ in records:
+        path = Path(path)
+        if snapshot.ignored(path):
+            continue
+        stat = snapshot.stat(path)
+        if stat is None or (server_mtime is not None and stat[1] < server_mtime):
+            missing.append((path, url, size, server_mtime))
+    return len(records), missing
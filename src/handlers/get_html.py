@@ -2,6 +2,11 @@
 import clippy.config as cfg
 import logging as log
 from modules.EmptyHTMLException import EmptyHTMLException
+from modules.SessionExpiredError import SessionExpiredError
+from . import http_cache
+
+# CLIP answers with its login form instead of the requested page when the session has expired
+LOGIN_FORM = 'name="senha"'
 
 def get_html(url: str):
     """
@@ -13,8 +18,40 @@ def get_html(url: str):
     Returns:
         str: The HTML content of the URL.
     """
-    response = cfg.session.get(url)
+    html, _ = fetch_html(url)
+    return html
+
+def fetch_html(url: str, retry_login: bool = True) -> (str, bool):
+    """
+    Retrieve the HTML content of a given URL, using the cached copy if the server reports it didn't change.
+    If the session has expired, logs in again with the same credentials and repeats the request.
+
+    Args:
+        url (str): The URL to fetch.
+        retry_login (bool): Log in again if the session has expired, instead of raising SessionExpiredError.
+
+    Returns:
+        (str, bool): The HTML content of the URL, and whether it is unchanged since it was last cached.
+    """
+    from handlers.get_login import login_count, relogin # get_login imports this module
+    seen_logins = login_count()
+
+    response = cfg.get_session().get(url, headers=http_cache.conditional_headers(url))
     response.raise_for_status()  # Raise an exception for HTTP errors
-    log.debug(f"[HTML] Received HTML for {url}:\n\n{response.text}")
-    if len(response.text) == 0: raise EmptyHTMLException
-    return response.text
+    if response.status_code == 304:
+        html = http_cache.load_body(url)
+        if html is not None:
+            log.debug(f"[HTML] Page not modified, using cached HTML for {url}")
+            return html, True
+        response = cfg.get_session().get(url) # cached copy was lost, fetch it again
+        response.raise_for_status()
+
+    html = response.text # decoded again on each access
+    log.debug(f"[HTML] Received {len(html)} characters for {url}")
+    if len(html) == 0: raise EmptyHTMLException
+    if LOGIN_FORM in html: # never cache the login page in place of the requested one
+        if not retry_login: raise SessionExpiredError
+        relogin(seen_logins)
+        return fetch_html(url, retry_login=False)
+    unchanged = http_cache.store(url, html, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+    return html, unchanged
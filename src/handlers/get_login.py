@@ -1,40 +1,60 @@
-import re, requests
+import re, sys, threading, weakref
 import logging as log
 from time import sleep
-from InquirerPy import inquirer
 from modules.LoginError import LoginError
+from modules.SessionExpiredError import SessionExpiredError
 from .print_handler import print_progress
-from .get_html import get_html
-from handlers.creds_handler import save_credentials, load_username, load_password
+from .get_html import fetch_html
+from handlers.creds_handler import save_credentials, load_password
+from handlers.session_store import restore_session, save_session, delete_session
 
 #Config
 import clippy.config as cfg
 
 count = 0
 
-# Flag if saved credentials don't match entered credentials
-saved_creds = ()
-update_creds_flag = False
+# Entered credentials that don't match the saved ones, of each user (username -> password)
+pending_creds = {}
+asked_creds = set() # credentials the user was already asked to save in this run
 
-def get_login(username: str = None,password: str = None) -> int:
+# Credentials and number of logins of each session, so an expired session can log in again
+login_lock = threading.Lock()
+logins = weakref.WeakKeyDictionary() # session -> (username, password, count)
+
+def get_login(username: str = None,password: str = None, reuse_session: bool = True) -> int:
     """
     Get the login username and password from the user and generate a session.
+    The session stored by a previous run is reused if there is one, without contacting the server:
+    if CLIP rejects it, get_html() logs in again. The password is only loaded (or asked for) to log in.
     
     Args:
         username (str): The user's username (optional).
-        password (str): The user's password (optional).
-        count (int): Counts the number of retries it has took.
+        password (str): The user's password (optional, the saved one or asked for if needed).
+        reuse_session (bool): Reuse the session stored by a previous run, instead of logging in.
     
     Returns:
         int: The user's internal ID.
     """
+    import requests
     global count #retry count
-    if username is None: username = inquirer.text(message="Nome de utilizador:").execute()
-    if password is None: password = inquirer.secret(
-        message=f"Palavra-passe para {username}:",
-        transformer=lambda _: "[ocultada]",
-    ).execute()
+    if username is None:
+        from InquirerPy import inquirer
+        username = inquirer.text(message="Nome de utilizador:").execute()
     
+    if reuse_session:
+        id = restore_session(username, cfg.get_session())
+        if id is not None:
+            logged_in(username, password)
+            return id
+
+    if password is None: password = load_password(username)
+    if password is None:
+        from InquirerPy import inquirer
+        password = inquirer.secret(
+            message=f"Palavra-passe para {username}:",
+            transformer=lambda _: "[ocultada]",
+        ).execute()
+
     login_data = {
         'identificador': username,
         'senha': password
@@ -42,28 +62,23 @@ def get_login(username: str = None,password: str = None) -> int:
 
     try:
         print_progress(0,"A fazer login...")
-        response = cfg.session.post('https://clip.fct.unl.pt/', data=login_data, timeout=10)
+        response = cfg.get_session().post(f"{cfg.domain}/", data=login_data, timeout=10)
         response.raise_for_status()  # Raise an exception for HTTP errors
         if "Autenticação inválida" in response.text:
             raise LoginError("Autenticação falhou.")
         
         # Return user ID
-        if response.url != "https://clip.fct.unl.pt/":
+        if response.url != f"{cfg.domain}/":
             log.warning("Parece ter havido alterações à página inicial do CLIP (possíveis notificações ou avisos?). A tentar contornar...")
-            userHTML = get_html("https://clip.fct.unl.pt/utente/eu")
+            userHTML, _ = fetch_html(f"{cfg.domain}/utente/eu", retry_login=False)
         else:
             userHTML = response.text
         
         try:
-            id = re.search(r"\/utente\/eu\/aluno\?aluno=(\d+)",userHTML).group(1)
-        
-            # Temporarily save entered credentials so they can optionally be saved at the end of the program
-            if username != load_username() or password != load_password():
-                global update_creds_flag, saved_creds
-                update_creds_flag = True
-                saved_creds = (username, password)
-
-            return int(id)
+            id = int(re.search(r"\/utente\/eu\/aluno\?aluno=(\d+)",userHTML).group(1))
+            logged_in(username, password)
+            save_session(username, id, cfg.get_session())
+            return id
         except AttributeError:
             raise RuntimeError("Não foi possível obter o ID do utilizador.")
         
@@ -72,15 +87,67 @@ def get_login(username: str = None,password: str = None) -> int:
         count += 1
         if count > 3: raise LoginError("Demasiadas tentativas de conexão. Tente novamente mais tarde.")
         log.warning(f"Ligação ao servidor excedeu o tempo, a tentar novamente... ({count}/3)")
-        cfg.session_mount() # Reset session
+        cfg.reset_session()
         sleep(1)
-        get_login(username,password)
+        return get_login(username,password,reuse_session)
     except requests.exceptions.RequestException as e:
         raise LoginError(f"Erro de conexão durante o login: {e}")
     
+def logged_in(username: str, password: str):
+    """
+    Remember the credentials of the current session after it logged in, so it can log in again when it expires.
+
+    Args:
+        username (str): The user's username.
+        password (str): The user's password (None if a stored session was reused without it).
+    """
+    # Temporarily save entered credentials so they can optionally be saved at the end of the program
+    if password is not None and (username, password) not in asked_creds and password != load_password(username):
+        pending_creds[username] = password
+
+    session = cfg.get_session()
+    logins[session] = (username, password, logins.get(session, (None, None, 0))[2] + 1) # without a password, it's loaded to log in again
+
+def login_count() -> int:
+    """
+    Get the number of times the current session has logged in.
+
+    Returns:
+        int: The number of logins, 0 if the session never logged in.
+    """
+    return logins.get(cfg.get_session(), (None, None, 0))[2]
+
+def relogin(seen_count: int):
+    """
+    Log in again with the credentials of the current session, after the server reported it expired.
+    If several workers find the session expired at the same time, only the first one logs in.
+
+    Args:
+        seen_count (int): The session's login_count() when the request that found it expired was sent.
+
+    Raises:
+        SessionExpiredError: If the session never logged in, so there are no credentials to reuse.
+    """
+    session = cfg.get_session()
+    with login_lock:
+        username, password, logins_done = logins.get(session, (None, None, 0))
+        if logins_done != seen_count: # another worker already logged in again
+            return
+        if username is None:
+            raise SessionExpiredError
+        log.info(f"A sessão de {username} no CLIP expirou, a fazer login novamente...")
+        session.cookies.clear()
+        delete_session(username)
+        get_login(username, password, reuse_session=False)
+
 def check_for_save_credentials():
     """
-    Check if the flag to update saved credentials has been set, and update them if so.
+    Check if any user entered credentials that don't match the saved ones, and offer to save them if so.
+    Each user is only asked once per run (e.g. not after each check of watch mode), and never without a terminal.
     """
-    if update_creds_flag:
-        save_credentials(saved_creds[0], saved_creds[1])
\ No newline at end of file
+    if not sys.stdin.isatty():
+        return
+    while pending_creds:
+        username, password = pending_creds.popitem()
+        asked_creds.add((username, password))
+        save_credentials(username, password)
\ No newline at end of file
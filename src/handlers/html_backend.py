@@ -0,0 +1,196 @@
+import re
+import logging as log
+
+#Config
+import clippy.config as cfg
+
+"""
+Extraction of the data Clippy needs from CLIP's pages.
+
+Every extractor receives the raw HTML of a page and goes straight to the table it needs, returning
+plain strings instead of a parsed tree. The parser backend is the fastest one installed, in this order:
+    selectolax (lexbor) >> lxml >> html.parser (Beautiful Soup, always available)
+"""
+
+BACKENDS = ("selectolax", "lxml", "html.parser")
+
+YEAR_LINK = re.compile(r"ano_lectivo.+&ano_lectivo=(\d+)")
+COURSE_LINK = re.compile(r"&unidade=(\d+)")
+
+backend = None
+
+def get_backend() -> str:
+    """
+    Get the name of the parser backend in use, choosing it on the first call.
+
+    Returns:
+        str: One of BACKENDS.
+    """
+    global backend
+    if backend is None:
+        candidates = BACKENDS if cfg.PARSER_BACKEND is None else (cfg.PARSER_BACKEND,)
+        for name in candidates:
+            try:
+                if name == "selectolax":
+                    import selectolax.lexbor # noqa: F401
+                elif name == "lxml":
+                    import lxml.html # noqa: F401
+                elif name == "html.parser":
+                    import bs4 # noqa: F401
+                else:
+                    raise ValueError(f"Parser desconhecido: {name}")
+                backend = name
+                break
+            except ImportError:
+                log.debug(f"Parser {name} não está instalado.")
+        else:
+            raise ImportError(f"O parser {cfg.PARSER_BACKEND} não está instalado.")
+        log.debug(f"A usar o parser {backend}.")
+    return backend
+
+def extract_years(html: str) -> [(str, str)]:
+    """
+    Extract the links to each academic year from the user page.
+
+    Args:
+        html (str): The HTML content of the user page.
+
+    Returns:
+        [(str, str)]: The text and href of each link.
+    """
+    return [(text, href) for text, href in EXTRACTORS[get_backend()]["links"](html) if YEAR_LINK.search(href)]
+
+def extract_index(html: str) -> ([str], str):
+    """
+    Extract the subcategory links and the course title from a course's document index.
+
+    Args:
+        html (str): The HTML content of the course's documents page.
+
+    Returns:
+        ([str], str): The text of each subcategory link, and the course title.
+    """
+    return EXTRACTORS[get_backend()]["index"](html)
+
+def extract_courses(html: str) -> [(str, str)]:
+    """
+    Extract the links to each course from a Courses page.
+
+    Args:
+        html (str): The HTML content of a Courses page.
+
+    Returns:
+        [(str, str)]: The text and href of each link.
+
+    Raises:
+        IndexError: If the page doesn't have the courses table.
+    """
+    return [(text, href) for text, href in EXTRACTORS[get_backend()]["courses"](html) if COURSE_LINK.search(href)]
+
+def extract_files(html: str) -> [[str]]:
+    """
+    Extract the rows of a subcategory's table of documents.
+
+    Args:
+        html (str): The HTML content of the subcategory's page.
+
+    Returns:
+        [[str]]: For each row, its name, href, date, size and teacher.
+    """
+    return EXTRACTORS[get_backend()]["files"](html)
+
+# selectolax
+
+def _selectolax_tree(html: str):
+    from selectolax.lexbor import LexborHTMLParser
+    return LexborHTMLParser(html)
+
+def _selectolax_links(html: str):
+    return [(a.text(), a.attributes.get("href") or "") for a in _selectolax_tree(html).css("a[href]")]
+
+def _selectolax_index(html: str):
+    tree = _selectolax_tree(html)
+    links = [a.text() for a in tree.css('td[width="100%"]')[1].css("a")]
+    title = tree.css_first('td[bgcolor="#ddddd0"]').css_first("span.h4").text()
+    return links, title
+
+def _selectolax_courses(html: str):
+    return [(a.text(), a.attributes.get("href") or "") for a in _selectolax_tree(html).css('td[width="100%"]')[1].css("a[href]")]
+
+def _selectolax_files(html: str):
+    tree = _selectolax_tree(html)
+    table = next(th for th in tree.css("th") if th.text(deep=False) == "Documentos")
+    while table.tag != "table":
+        table = table.parent
+    rows = []
+    for row in table.css("tr[bgcolor]"):
+        columns = row.css("td")
+        if columns:
+            rows.append([columns[0].text().strip(), columns[1].css_first("a").attributes.get("href"),
+                         columns[2].text().strip(), columns[3].text().strip(), columns[4].text().strip()])
+    return rows
+
+# lxml
+
+def _lxml_tree(html: str):
+    import lxml.html
+    try:
+        return lxml.html.fromstring(html)
+    except ValueError: # unicode strings with an encoding declaration
+        return lxml.html.fromstring(html.encode("utf-8"), parser=lxml.html.HTMLParser(encoding="utf-8"))
+
+def _lxml_links(html: str):
+    return [(a.text_content(), a.get("href")) for a in _lxml_tree(html).iterfind(".//a[@href]")]
+
+def _lxml_index(html: str):
+    tree = _lxml_tree(html)
+    links = [a.text_content() for a in tree.xpath('//td[@width="100%"]')[1].iterfind(".//a")]
+    title = tree.xpath('(//td[@bgcolor="#ddddd0"])[1]//span[contains(concat(" ", @class, " "), " h4 ")]')[0].text_content()
+    return links, title
+
+def _lxml_courses(html: str):
+    return [(a.text_content(), a.get("href")) for a in _lxml_tree(html).xpath('//td[@width="100%"]')[1].iterfind(".//a[@href]")]
+
+def _lxml_files(html: str):
+    table = _lxml_tree(html).xpath('//th[text()="Documentos"]/ancestor::table[1]')[0]
+    rows = []
+    for row in table.iterfind(".//tr[@bgcolor]"):
+        columns = row.findall(".//td")
+        if columns:
+            rows.append([columns[0].text_content().strip(), columns[1].find(".//a").get("href"),
+                         columns[2].text_content().strip(), columns[3].text_content().strip(), columns[4].text_content().strip()])
+    return rows
+
+# html.parser
+
+def _soup(html: str, *args, **kwargs):
+    from bs4 import BeautifulSoup as bs, SoupStrainer
+    return bs(html, 'html.parser', parse_only=SoupStrainer(*args, **kwargs))
+
+def _soup_links(html: str):
+    return [(a.text, a['href']) for a in _soup(html, "a", href=True)]
+
+def _soup_index(html: str):
+    soup = _soup(html, "td") # only the table cells, where the links and the title are
+    links = [a.text for a in soup.find_all("td", attrs={"width": "100%"})[1].find_all("a")]
+    title = soup.find('td', {'bgcolor': '#ddddd0'}).find('span', {'class': 'h4'}).text
+    return links, title
+
+def _soup_courses(html: str):
+    return [(a.text, a['href']) for a in _soup(html, "td", attrs={"width": "100%"}).find_all("td", attrs={"width": "100%"})[1].find_all("a", href=True)]
+
+def _soup_files(html: str):
+    table = _soup(html, "table").find('th', string='Documentos').find_parent('table')
+    rows = []
+    for row in table.find_all("tr", {'bgcolor': True}):
+        columns = row.find_all("td")
+        if columns != []:
+            rows.append([columns[0].text.strip(), columns[1].find("a").get("href"),
+                         columns[2].text.strip(), columns[3].text.strip(), columns[4].text.strip()])
+    return rows
+
+EXTRACTORS = {
+    "selectolax": {"links": _selectolax_links, "index": _selectolax_index, "courses": _selectolax_courses, "files": _selectolax_files},
+    "lxml": {"links": _lxml_links, "index": _lxml_index, "courses": _lxml_courses, "files": _lxml_files},
+    "html.parser": {"links": _soup_links, "index": _soup_index, "courses": _soup_courses, "files": _soup_files},
+}
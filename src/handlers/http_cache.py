@@ -0,0 +1,204 @@
+import contextvars
+import hashlib
+import json
+import logging as log
+import threading
+import time
+
+from handlers import tracer
+
+#Config
+import clippy.config as cfg
+
+cache_lock = threading.Lock()
+cache_index = None # URL -> {etag, last_modified, hash, size, atime, fetched, parsed}
+refreshes = [] # background checks of pages whose cached parse was used
+
+def load_http_cache() -> dict:
+    """
+    Loads the index of cached pages from disk, if it wasn't loaded yet.
+
+    Returns:
+        dict: The index of cached pages, keyed by URL.
+    """
+    global cache_index
+    with cache_lock:
+        if cache_index is None:
+            try:
+                with open(cfg.HTTP_CACHE_PATH / "index.json", 'r') as json_file:
+                    cache_index = json.load(json_file)
+                log.debug(f"Cache HTTP carregada com {len(cache_index)} páginas.")
+            except (FileNotFoundError, json.JSONDecodeError):
+                log.info("Não foi encontrada cache HTTP.")
+                cache_index = {}
+        return cache_index
+
+def body_path(url: str):
+    """
+    Get the path of the file that stores the cached body of a URL.
+
+    Args:
+        url (str): The URL of the page.
+    """
+    return cfg.HTTP_CACHE_PATH / (hashlib.sha1(url.encode()).hexdigest() + ".html")
+
+def conditional_headers(url: str) -> dict:
+    """
+    Get the If-None-Match / If-Modified-Since headers for a cached URL.
+
+    Args:
+        url (str): The URL of the page.
+
+    Returns:
+        dict: The headers to send with the request (empty if the page is not cached).
+    """
+    entry = load_http_cache().get(url)
+    headers = {}
+    if entry is not None:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+def load_body(url: str):
+    """
+    Load the cached body of a URL after the server answered 304 Not Modified.
+
+    Args:
+        url (str): The URL of the page.
+
+    Returns:
+        str: The cached HTML, or None if it was lost.
+    """
+    try:
+        html = body_path(url).read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return None
+    with cache_lock:
+        cache_index[url]["atime"] = cache_index[url]["fetched"] = time.time()
+    return html
+
+def store(url: str, html: str, etag: str = None, last_modified: str = None) -> bool:
+    """
+    Store a freshly downloaded page in the cache.
+
+    Args:
+        url (str): The URL of the page.
+        html (str): The HTML content of the page.
+        etag (str): The ETag header sent by the server, if any.
+        last_modified (str): The Last-Modified header sent by the server, if any.
+
+    Returns:
+        bool: True if the page has the same content as the cached copy.
+    """
+    digest = hashlib.sha256(html.encode()).hexdigest()
+    entry = load_http_cache().get(url)
+    unchanged = entry is not None and entry["hash"] == digest
+
+    if not unchanged:
+        cfg.HTTP_CACHE_PATH.mkdir(parents=True, exist_ok=True)
+        body_path(url).write_text(html, encoding="utf-8")
+
+    with cache_lock:
+        cache_index[url] = {
+            "etag": etag,
+            "last_modified": last_modified,
+            "hash": digest,
+            "size": len(html),
+            "atime": time.time(),
+            "fetched": time.time(),
+            "parsed": entry.get("parsed") if unchanged else None,
+        }
+    return unchanged
+
+def get_parsed(url: str):
+    """
+    Get the parsed result stored for a cached page.
+
+    Args:
+        url (str): The URL of the page.
+    """
+    entry = load_http_cache().get(url)
+    return None if entry is None else entry.get("parsed")
+
+def get_fresh(url: str, max_age: float):
+    """
+    Get the parsed result stored for a page, if the server was last asked for it less than max_age seconds ago.
+
+    Args:
+        url (str): The URL of the page.
+        max_age (float): The maximum age of the page, in seconds.
+    """
+    entry = load_http_cache().get(url)
+    if entry is None or time.time() - entry.get("fetched", 0) > max_age:
+        return None
+    with cache_lock:
+        entry["atime"] = time.time()
+    return entry.get("parsed")
+
+def refresh(function):
+    """
+    Runs a function in a background thread, in the caller's context (e.g. its session), to check a page
+    whose cached parse was used without asking the server. commit_http_cache() waits for it to finish.
+
+    Args:
+        function (callable): The function to run.
+    """
+    context = contextvars.copy_context()
+
+    def run():
+        try:
+            context.run(function)
+        except Exception as e:
+            log.debug(f"Falhou a verificação em segundo plano: {e}")
+
+    thread = threading.Thread(target=run, name="refresh", daemon=True)
+    with cache_lock:
+        refreshes.append(thread)
+    thread.start()
+
+def set_parsed(url: str, parsed):
+    """
+    Store the parsed result of a cached page, so it can be reused while the page doesn't change.
+
+    Args:
+        url (str): The URL of the page.
+        parsed: A JSON-serialisable representation of the parsed page.
+    """
+    with cache_lock:
+        if url in cache_index:
+            cache_index[url]["parsed"] = parsed
+
+@tracer.traced("commit")
+def commit_http_cache():
+    """
+    Writes the cache index to disk, evicting the least recently used pages above the size bounds.
+    Pages still being checked in the background are waited for first.
+    """
+    with cache_lock:
+        pending = refreshes[:]
+        refreshes.clear()
+    for thread in pending:
+        thread.join()
+
+    if cache_index is None:
+        return # cache was never used
+
+    with cache_lock:
+        entries = sorted(cache_index.items(), key=lambda item: item[1]["atime"], reverse=True)
+        kept = {}
+        total_size = 0
+        for url, entry in entries:
+            total_size += entry["size"]
+            if len(kept) >= cfg.HTTP_CACHE_MAX_ENTRIES or total_size > cfg.HTTP_CACHE_MAX_SIZE:
+                log.debug(f"A remover {url} da cache HTTP.")
+                body_path(url).unlink(missing_ok=True)
+            else:
+                kept[url] = entry
+        cache_index.clear()
+        cache_index.update(kept)
+
+        cfg.HTTP_CACHE_PATH.mkdir(parents=True, exist_ok=True)
+        with open(cfg.HTTP_CACHE_PATH / "index.json", 'w+') as json_file:
+            json.dump(cache_index, json_file)
@@ -0,0 +1,461 @@
+import logging as log
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+
+#Config
+import clippy.config as cfg
+
+"""
+Sync manifest: a single SQLite database in the user data dir that records every file Clippy knows about
+(its URL, server size and mtime, local path, local stat signature, the user whose session found it and, for
+downloaded files, the SHA-256 of their content), each course's category count
+and, with deduplication on, the content hash of each file in the store.
+Change detection is answered with indexed lookups here instead of walking the local folders.
+
+It also keeps the catalogue of every category table scraped (course, category, name, teacher, date and
+size of each file), with a full-text index over it (SQLite FTS5, where available) for clippy search.
+Categories that weren't scraped since the catalogue exists (unchanged ones aren't) are filled in from
+their file records, without teachers, until they are.
+
+Writes are buffered in memory and the course counts are only committed at the end of a successful run, like
+the old cache files. File records and catalogue rows are written every MANIFEST_BATCH rows, so memory stays
+bounded on large archives; without the counts, an interrupted run's courses are still scanned again.
+"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    folder TEXT NOT NULL,
+    url TEXT NOT NULL,
+    size INTEGER,
+    server_mtime REAL,
+    local_size INTEGER,
+    local_mtime REAL,
+    downloaded_at REAL NOT NULL,
+    hash TEXT,
+    user TEXT
+);
+CREATE INDEX IF NOT EXISTS files_folder ON files (folder);
+CREATE INDEX IF NOT EXISTS files_downloaded_at ON files (downloaded_at);
+CREATE TABLE IF NOT EXISTS counts (
+    folder TEXT NOT NULL,
+    category TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (folder, category)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    hint TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    PRIMARY KEY (name, size, hint)
+);
+CREATE TABLE IF NOT EXISTS catalogue (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    folder TEXT NOT NULL,
+    year INTEGER,
+    course TEXT,
+    category TEXT,
+    name TEXT NOT NULL,
+    teacher TEXT,
+    size INTEGER,
+    mtime REAL,
+    url TEXT
+);
+CREATE INDEX IF NOT EXISTS catalogue_folder ON catalogue (folder);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started REAL NOT NULL,
+    finished REAL
+);
+"""
+
+# Full-text index of the catalogue, kept up to date by triggers
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE catalogue_search USING fts5(name, teacher, course, category, content='catalogue', content_rowid='id', prefix='2 3');
+CREATE TRIGGER catalogue_insert AFTER INSERT ON catalogue BEGIN
+    INSERT INTO catalogue_search (rowid, name, teacher, course, category) VALUES (new.id, new.name, new.teacher, new.course, new.category);
+END;
+CREATE TRIGGER catalogue_delete AFTER DELETE ON catalogue BEGIN
+    INSERT INTO catalogue_search (catalogue_search, rowid, name, teacher, course, category) VALUES ('delete', old.id, old.name, old.teacher, old.course, old.category);
+END;
+INSERT INTO catalogue_search (catalogue_search) VALUES ('rebuild');
+"""
+
+db_lock = threading.Lock()
+connection = None
+run_start = time.time()
+run_downloads = 0 # files downloaded since run_start, a run without any isn't listed by clippy changes
+pending_files = []
+pending_counts = []
+pending_blobs = {} # (name, size, hint) -> hash
+pending_catalogue = {} # category folder -> rows of its table
+pending_rows = 0 # catalogue rows in pending_catalogue
+full_text = False # whether SQLite has FTS5, otherwise searches fall back to LIKE
+
+def fold(text: str) -> str:
+    """
+    Get a text without case or accents, to match it like FTS5 does when searching with LIKE (SQLite's
+    LIKE only ignores the case of ASCII letters).
+
+    Args:
+        text (str): The text (None is kept).
+    """
+    if text is None:
+        return None
+    return "".join(char for char in unicodedata.normalize("NFKD", text) if not unicodedata.combining(char)).casefold()
+
+def connect() -> sqlite3.Connection:
+    """
+    Opens the manifest database, creating it if it doesn't exist yet.
+
+    Returns:
+        sqlite3.Connection: The shared connection (use it while holding db_lock).
+    """
+    global connection, full_text
+    with db_lock:
+        if connection is None:
+            Path.mkdir(cfg.MANIFEST_PATH.parent, parents=True, exist_ok=True)
+            connection = sqlite3.connect(cfg.MANIFEST_PATH, check_same_thread=False)
+            connection.executescript(SCHEMA)
+            connection.create_function("fold", 1, fold)
+            columns = [column[1] for column in connection.execute("PRAGMA table_info(files)")]
+            for column in ("hash", "user"): # created by an older version
+                if column not in columns:
+                    connection.execute(f"ALTER TABLE files ADD COLUMN {column} TEXT")
+            full_text = connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'catalogue_search'").fetchone() is not None
+            if not full_text:
+                try:
+                    with connection:
+                        connection.executescript(SEARCH_SCHEMA)
+                    full_text = True
+                except sqlite3.OperationalError as e: # SQLite built without FTS5
+                    log.debug(f"Pesquisa de texto indisponível: {e}")
+            log.debug(f"Manifesto aberto: {cfg.MANIFEST_PATH}")
+        return connection
+
+def key(path: Path) -> str:
+    """
+    Get the manifest key of a local path (absolute, without resolving links to avoid extra stat calls).
+
+    Args:
+        path (Path): The local path.
+    """
+    return os.path.abspath(path)
+
+def start_run():
+    """
+    Marks the start of a new run, for processes that sync several times (e.g. watch mode).
+    """
+    global run_start, run_downloads
+    run_start = time.time()
+    run_downloads = 0
+run_downloads = 0 # files downloaded since run_start, a run without any isn't listed by clippy changes
+
+def lookup(path: Path):
+    """
+    Look up a file in the manifest.
+
+    Args:
+        path (Path): The local path of the file.
+
+    Returns:
+        tuple: The file's url, size, server_mtime, local_size, local_mtime and hash, or None if it is unknown.
+    """
+    db = connect()
+    with db_lock:
+        return db.execute("SELECT url, size, server_mtime, local_size, local_mtime, hash FROM files WHERE path = ?", (key(path),)).fetchone()
+
+def record(path: Path, url: str, size: int, server_mtime: float, local_size: int, local_mtime: float, downloaded: bool = True,
+           hash: str = None, user: str = None):
+    """
+    Stores a file record, to be written with commit().
+
+    Args:
+        path (Path): The local path of the file.
+        url (str): The download link of the file.
+        size (int): The size of the file as reported by the server.
+        server_mtime (float): The modification time of the file in the server (epoch).
+        local_size (int): The size of the local file.
+        local_mtime (float): The modification time of the local file (epoch).
+        downloaded (bool): False if the file was already in the local folder, so it isn't listed as a change
+                           (and the time it was downloaded, if it was, is kept).
+        hash (str, optional): The SHA-256 of the local file's content; without it, the hash already recorded
+                              is kept as long as the local size and mtime didn't change.
+        user (str, optional): The username whose session found the file (None for the saved or given user).
+    """
+    global run_downloads
+    db = connect()
+    with db_lock:
+        run_downloads += downloaded
+        pending_files.append((key(path), key(Path(path).parent), url, size, server_mtime, local_size, local_mtime,
+                              time.time() if downloaded else 0.0, hash, user))
+        if len(pending_files) >= cfg.MANIFEST_BATCH:
+            with db:
+                flush(db)
+
+def files_under(root: Path) -> [(str, str, int, float, int, float, str, str)]:
+    """
+    List the files recorded anywhere inside a folder.
+
+    Args:
+        root (Path): The folder (e.g. where the CLIP files are saved).
+
+    Returns:
+        [(str, str, int, float, int, float, str, str)]: The local path, url, size, server_mtime, local_size, local_mtime, hash
+        and user of each file.
+    """
+    prefix = os.path.join(key(root), "")
+    db = connect()
+    with db_lock: # a range instead of LIKE, so paths with "%" or "_" match and the primary key is used
+        return db.execute("SELECT path, url, size, server_mtime, local_size, local_mtime, hash, user FROM files WHERE path >= ? AND path < ?",
+                          (prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1))).fetchall()
+
+def files_in(folder: Path) -> [(str, str, int, float, int, float)]:
+    """
+    List the files recorded in a folder.
+
+    Args:
+        folder (Path): The folder (e.g. a course's category).
+
+    Returns:
+        [(str, str, int, float, int, float)]: The local path, url, size, server_mtime, local_size and local_mtime of each file.
+    """
+    db = connect()
+    with db_lock:
+        return db.execute("SELECT path, url, size, server_mtime, local_size, local_mtime FROM files WHERE folder = ?", (key(folder),)).fetchall()
+
+def get_counts(folder: Path):
+    """
+    Get the category count of a course folder from the last successful sync.
+
+    Args:
+        folder (Path): The course folder.
+
+    Returns:
+        dict: Each category (key) and its file count (value), or None if the course was never synced.
+    """
+    db = connect()
+    with db_lock:
+        rows = db.execute("SELECT category, count FROM counts WHERE folder = ?", (key(folder),)).fetchall()
+    return dict(rows) if rows else None
+
+def set_counts(folder: Path, counts: dict):
+    """
+    Stores the category count of a course folder, to be written with commit().
+
+    Args:
+        folder (Path): The course folder.
+        counts (dict): Each category (key) and its file count (value).
+    """
+    with db_lock:
+        pending_counts.append((key(folder), dict(counts)))
+
+def take_counts() -> [(str, dict)]:
+    """
+    Removes the category counts stored with set_counts() since the last commit(), so they aren't written.
+
+    Returns:
+        [(str, dict)]: The course folders and their category counts.
+    """
+    with db_lock:
+        counts = list(pending_counts)
+        pending_counts.clear()
+    return counts
+
+def record_catalogue(folder: Path, year: int, course: str, category: str, table):
+    """
+    Stores the table of a category as it was scraped, replacing the one from a previous run, to be written with commit().
+
+    Args:
+        folder (Path): The local folder of the category.
+        year (int): The academic year.
+        course (str): The course's name.
+        category (str): The category's name.
+        table (FilesList): The table of documents.
+    """
+    columns = table.columns()
+    rows = [(key(Path(folder) / name), key(folder), year, course, category, name, teacher, size, mtime, cfg.domain + href)
+            for name, href, mtime, size, teacher in zip(columns["names"], columns["links"], columns["mtimes"], columns["sizes"], columns["teachers"])]
+    global pending_rows
+    db = connect()
+    with db_lock:
+        replaced = pending_catalogue.pop(key(folder), ())
+        pending_catalogue[key(folder)] = rows
+        pending_rows += len(rows) - len(replaced)
+        if pending_rows >= cfg.MANIFEST_BATCH:
+            with db:
+                flush(db)
+
+def backfill_catalogue(db: sqlite3.Connection):
+    """
+    Adds the recorded files of the folders the catalogue doesn't have to it (e.g. synced by an older version
+    and unchanged since), taking the year, course and category from their paths. Teachers are only known once
+    the category is scraped, which replaces these rows. Use it while holding db_lock.
+
+    Args:
+        db (sqlite3.Connection): The manifest's connection.
+    """
+    records = db.execute("SELECT path, folder, url, size, server_mtime FROM files WHERE folder IN "
+                         "(SELECT folder FROM files EXCEPT SELECT folder FROM catalogue)").fetchall()
+    if not records:
+        return
+    rows = []
+    for path, folder, url, size, mtime in records:
+        parts = Path(path).parts # .../year/semester/course/category/name
+        year = int(parts[-5]) if len(parts) >= 5 and parts[-5].isdigit() else None
+        rows.append((path, folder, year, parts[-3] if len(parts) >= 3 else None, parts[-2], parts[-1], None, size, mtime, url))
+    with db:
+        db.executemany("INSERT INTO catalogue (path, folder, year, course, category, name, teacher, size, mtime, url) "
+                       "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    log.debug(f"Catálogo completado com {len(rows)} ficheiros do manifesto.")
+
+def search(query: str, year: int = None, limit: int = 50) -> [(str, int, str, str, str, str, int, float)]:
+    """
+    Search the catalogue for files whose name, teacher, course or category have every word of a query
+    (or words starting with them), best matches first.
+
+    Args:
+        query (str): The words to search for.
+        year (int, optional): Only search this academic year.
+        limit (int): Maximum number of results.
+
+    Returns:
+        [(str, int, str, str, str, str, int, float)]: The local path, year, course, category, name, teacher, size and mtime of each file.
+    """
+    words = re.findall(r"\w+", query)
+    if not words:
+        return []
+    db = connect()
+    columns = "catalogue.path, catalogue.year, catalogue.course, catalogue.category, catalogue.name, catalogue.teacher, catalogue.size, catalogue.mtime"
+    if full_text:
+        sql = (f"SELECT {columns} FROM catalogue_search JOIN catalogue ON catalogue.id = catalogue_search.rowid "
+               "WHERE catalogue_search MATCH ?")
+        args = [" ".join(f'"{word}"*' for word in words)]
+        order = "ORDER BY catalogue_search.rank"
+    else:
+        sql = f"SELECT {columns} FROM catalogue WHERE " + " AND ".join(
+            "(fold(name) LIKE ? OR fold(teacher) LIKE ? OR fold(course) LIKE ? OR fold(category) LIKE ?)" for _ in words)
+        args = [f"%{fold(word)}%" for word in words for _ in range(4)]
+        order = "ORDER BY catalogue.mtime DESC"
+    if year is not None:
+        sql += " AND catalogue.year = ?"
+        args.append(year)
+    with db_lock:
+        backfill_catalogue(db)
+        return db.execute(f"{sql} {order} LIMIT ?", (*args, limit)).fetchall()
+
+def lookup_blob(name: str, size: int, hint: str) -> str:
+    """
+    Look up the content of a file in the deduplication store, by its name, size and server hint.
+
+    Args:
+        name (str): The name of the file.
+        size (int): The size of the file as reported by the server.
+        hint (str): The server's identifier of the file (see blob_store.hint()).
+
+    Returns:
+        str: The SHA-256 of the file's content, or None if it is unknown.
+    """
+    db = connect()
+    with db_lock:
+        if (name, size, hint) in pending_blobs:
+            return pending_blobs[(name, size, hint)]
+        row = db.execute("SELECT hash FROM blobs WHERE name = ? AND size = ? AND hint = ?", (name, size, hint)).fetchone()
+    return None if row is None else row[0]
+
+def record_blob(name: str, size: int, hint: str, hash: str):
+    """
+    Stores the content hash of a file, to be written with commit().
+    It can be looked up with lookup_blob() right away.
+
+    Args:
+        name (str): The name of the file.
+        size (int): The size of the file as reported by the server.
+        hint (str): The server's identifier of the file.
+        hash (str): The SHA-256 of the file's content, or None to forget it.
+    """
+    with db_lock:
+        pending_blobs[(name, size, hint)] = hash
+
+def flush(db: sqlite3.Connection):
+    """
+    Writes the pending file records, content hashes and catalogue rows (not the course counts).
+    Use it while holding db_lock, inside a transaction.
+
+    Args:
+        db (sqlite3.Connection): The manifest's connection.
+    """
+    global pending_rows
+    db.executemany("INSERT INTO files (path, folder, url, size, server_mtime, local_size, local_mtime, downloaded_at, hash, user) "
+                   "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (path) DO UPDATE SET folder = excluded.folder, url = excluded.url, "
+                   "size = excluded.size, server_mtime = excluded.server_mtime, local_size = excluded.local_size, "
+                   "local_mtime = excluded.local_mtime, user = excluded.user, "
+                   "downloaded_at = CASE WHEN excluded.downloaded_at > 0 THEN excluded.downloaded_at ELSE downloaded_at END, "
+                   "hash = CASE WHEN excluded.hash IS NOT NULL THEN excluded.hash "
+                   "WHEN local_size IS excluded.local_size AND local_mtime IS excluded.local_mtime THEN hash END",
+                   pending_files)
+    db.executemany("DELETE FROM blobs WHERE name = ? AND size = ? AND hint = ?",
+                   [blob for blob, hash in pending_blobs.items() if hash is None])
+    db.executemany("INSERT OR REPLACE INTO blobs (name, size, hint, hash) VALUES (?, ?, ?, ?)",
+                   [(*blob, hash) for blob, hash in pending_blobs.items() if hash is not None])
+    for folder, rows in pending_catalogue.items():
+        db.execute("DELETE FROM catalogue WHERE folder = ?", (folder,))
+        db.executemany("INSERT INTO catalogue (path, folder, year, course, category, name, teacher, size, mtime, url) "
+                   "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    log.debug(f"Manifesto: escritos {len(pending_files)} ficheiros e {pending_rows} linhas do catálogo.")
+    pending_files.clear()
+    pending_blobs.clear()
+    pending_catalogue.clear()
+    pending_rows = 0
+
+def commit():
+    """
+    Writes every pending record to the manifest and, if it downloaded any file, marks the current run as finished
+    (so a check of watch mode or a plan that found nothing new doesn't hide the last changes from clippy changes).
+    """
+    global run_downloads
+    db = connect()
+    with db_lock, db:
+        flush(db)
+        for folder, counts in pending_counts:
+            db.execute("DELETE FROM counts WHERE folder = ?", (folder,))
+            db.executemany("INSERT INTO counts (folder, category, count) VALUES (?, ?, ?)",
+                           [(folder, category, count) for category, count in counts.items()])
+        if run_downloads:
+            db.execute("INSERT INTO runs (started, finished) VALUES (?, ?)", (run_start, time.time()))
+            run_downloads = 0
+        log.debug(f"Manifesto actualizado: {len(pending_counts)} cadeiras.")
+        pending_counts.clear()
+
+def last_run():
+    """
+    Get the start and end time of the last successful run that downloaded files.
+
+    Returns:
+        (float, float): The start and end time (epoch), or None if there were no runs.
+    """
+    db = connect()
+    with db_lock:
+        return db.execute("SELECT started, finished FROM runs ORDER BY id DESC LIMIT 1").fetchone()
+
+def changes_since(timestamp: float) -> [(str, int, float, float)]:
+    """
+    List the files that were downloaded or updated since a given time, without touching the network.
+
+    Args:
+        timestamp (float): The time (epoch) from which to list changes.
+
+    Returns:
+        [(str, int, float, float)]: The local path, size, server mtime and download time of each file, newest first.
+    """
+    db = connect()
+    with db_lock:
+        return db.execute("SELECT path, size, server_mtime, downloaded_at FROM files WHERE downloaded_at >= ? ORDER BY downloaded_at DESC",
+                          (timestamp,)).fetchall()
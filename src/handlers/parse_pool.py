@@ -0,0 +1,75 @@
+import logging as log
+import threading
+
+#Config
+import clippy.config as cfg
+
+"""
+Process pool for the extraction of CLIP's pages: fetching stays on the scraping threads, but the HTML
+is parsed in other processes, so parsing many pages uses every core instead of queuing for the GIL.
+Only the page's HTML goes to the worker process and only the extracted strings come back, never a
+parsed tree. The first PARSE_POOL_THRESHOLD pages that have to be parsed (unchanged pages aren't) are
+parsed in the threads, so a sync with few changed pages doesn't pay for starting the processes.
+"""
+
+pool = None
+pool_lock = threading.Lock()
+workers = cfg.PARSE_WORKERS
+pages = 0 # pages parsed so far
+
+def set_workers(parse_workers: int):
+    """
+    Sets the number of parser processes (0 or 1 to parse in the scraping threads).
+
+    Args:
+        parse_workers (int): The number of processes.
+    """
+    global workers
+    workers = parse_workers
+
+def init_worker(backend: str):
+    """
+    Runs in each new parser process, so it uses the same parser backend as the main process.
+    """
+    cfg.PARSER_BACKEND = backend
+
+def get_pool():
+    """
+    Get the process pool, starting it on the first call.
+    Processes are spawned rather than forked, since the scraping threads may be holding locks.
+    """
+    global pool
+    with pool_lock:
+        if pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            from .html_backend import get_backend
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=init_worker, initargs=(get_backend(),))
+            log.debug(f"A analisar páginas em {workers} processos.")
+        return pool
+
+def extract(extractor, html: str):
+    """
+    Run an extractor of html_backend on a page, in a parser process if there are any.
+
+    Args:
+        extractor (callable): A module-level extractor, e.g. html_backend.extract_files.
+        html (str): The HTML content of the page.
+
+    Returns:
+        The extracted records (lists and tuples of strings).
+    """
+    global workers, pages
+    with pool_lock:
+        pages += 1
+        threaded = workers <= 1 or pages <= cfg.PARSE_POOL_THRESHOLD
+    if threaded:
+        return extractor(html)
+    from concurrent.futures.process import BrokenProcessPool
+    try:
+        return get_pool().submit(extractor, html).result()
+    except BrokenProcessPool: # e.g. a worker was killed, keep parsing in the threads
+        log.warning("Os processos de análise de páginas terminaram inesperadamente, a continuar sem eles.")
+        workers = 0
+        return extractor(html)
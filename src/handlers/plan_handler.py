@@ -0,0 +1,101 @@
+import contextvars
+import json
+import logging as log
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from handlers import manifest
+
+#Config
+import clippy.config as cfg # noqa: F401
+
+"""
+Sync plans: `clippy plan` scrapes CLIP and compares it with the local folder like a sync, but writes
+the files it would download (path, URL, size, modification time and user) to a JSON file instead.
+`clippy apply` downloads the files of a plan without loading any CLIP page, so it can run later or on
+another machine. The course counts found while planning are only stored once their files are applied.
+"""
+
+PLAN_VERSION = 1
+
+current_user = contextvars.ContextVar("plan_user", default=None) # username whose session found the files
+plan_lock = threading.Lock()
+planned = [] # (path, url, size, mtime, user)
+
+def add(filepath: Path, url: str, file_size=0, file_mtime=None):
+    """
+    Adds a file to the plan instead of downloading it (same arguments as download_file()).
+    """
+    with plan_lock:
+        planned.append((filepath, url, file_size, file_mtime, current_user.get()))
+
+def write(output: Path, root: Path) -> (int, int):
+    """
+    Writes the planned files to a JSON file, with the course counts stored during the scrape
+    (which are taken out of the manifest, so the next plan or sync still sees those courses as changed).
+
+    Args:
+        output (Path): The plan file.
+        root (Path): The folder where the CLIP files are saved; the plan's paths are relative to it.
+
+    Returns:
+        (int, int): The number of files and bytes in the plan.
+    """
+    files = [{"path": Path(os.path.relpath(path, root)).as_posix(), "url": url, "size": size, "mtime": mtime, "user": user}
+             for path, url, size, mtime, user in sorted(planned, key=lambda file: str(file[0]))]
+    counts = [{"folder": Path(os.path.relpath(folder, root)).as_posix(), "counts": course_counts}
+              for folder, course_counts in manifest.take_counts()]
+    total = sum(file["size"] or 0 for file in files)
+    plan = {"version": PLAN_VERSION, "created": datetime.now().isoformat(timespec="seconds"), "root": str(root),
+            "bytes": total, "files": files, "counts": counts}
+    Path.mkdir(output.parent, parents=True, exist_ok=True)
+    with open(output, 'w', encoding="utf-8") as plan_file:
+        json.dump(plan, plan_file, ensure_ascii=False, indent=1)
+    log.debug(f"Plano guardado em {output}: {len(files)} ficheiros, {len(counts)} cadeiras.")
+    return len(files), total
+
+def read(plan_path: Path, root: Path = None) -> (Path, dict, [(Path, dict)]):
+    """
+    Reads a plan file.
+
+    Args:
+        plan_path (Path): The plan file.
+        root (Path, optional): The folder to apply it to, instead of the one it was planned for.
+
+    Returns (root, files, counts)
+        root: The folder the plan's paths are relative to.
+        files: The arguments for download_file() of each file, grouped by username (None for the saved user).
+        counts: The course folders and their category counts, to be stored once their files are downloaded.
+
+    Raises:
+        ValueError: If the file isn't a plan (or is from an unsupported version).
+    """
+    with open(plan_path, 'r', encoding="utf-8") as plan_file:
+        try:
+            plan = json.load(plan_file)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"{plan_path} não é um plano válido: {e}")
+    if not isinstance(plan, dict) or plan.get("version") != PLAN_VERSION:
+        raise ValueError(f"{plan_path} não é um plano válido (versão {PLAN_VERSION}).")
+    root = Path(root if root is not None else plan["root"])
+    files = {}
+    for file in plan["files"]:
+        files.setdefault(file["user"], []).append((root / file["path"], file["url"], file["size"], file["mtime"]))
+    counts = [(root / course["folder"], course["counts"]) for course in plan["counts"]]
+    return root, files, counts
+
+def is_applied(filepath: Path, file_mtime: float = None) -> bool:
+    """
+    Check if a planned file is already in its folder (e.g. applied by an interrupted run).
+
+    Args:
+        filepath (Path): The path of the file.
+        file_mtime (float, optional): The modification time of the file in the server (epoch).
+    """
+    try:
+        mtime = os.stat(filepath).st_mtime
+    except FileNotFoundError:
+        return False
+    return file_mtime is None or mtime >= file_mtime
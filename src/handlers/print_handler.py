@@ -10,6 +10,9 @@ def print_progress(progress: int, msg: str, max: int = 6):
     Usage:
         print_progress(1,"This is 20% or 1/5",5)
     """
+    from handlers import progress_handler # imports this module
+    if progress_handler.step(progress, msg, max): # shown by the live display, or not at all
+        return
     bar = progress*"▰"+(max-progress)*"▱"
     print(f"\033[K\r{bar} {msg}", flush=True) #force line clear before print
 
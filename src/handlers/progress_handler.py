@@ -0,0 +1,253 @@
+import itertools
+import json
+import logging as log
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+#Config
+import clippy.config as cfg
+
+"""
+Progress of a sync, drawn by a single renderer instead of by each worker: the download and scraping
+workers only add to counters of their own thread (no lock, no terminal I/O in the hot loop), and the
+renderer reads them at a fixed rate to show the files and bytes done, the throughput, the ETA and the
+active transfers. Modes (--progress):
+    bar    a live display in the terminal, redrawn PROGRESS_FPS times per second
+    quiet  no progress output, only the final summary, warnings and errors
+    json   one JSON object per line on stderr every PROGRESS_JSON_INTERVAL seconds, and one per step
+    auto   bar in a terminal, quiet otherwise
+"""
+
+MODES = ("auto", "bar", "quiet", "json")
+
+# Indexes of each thread's counters
+FILES, BYTES, EXPECTED_FILES, EXPECTED_BYTES, COURSES, CATEGORIES = range(6)
+PHASES = {"index": COURSES, "category": CATEGORIES}
+
+mode = "bar"
+generation = 0 # counters of previous syncs are left behind
+counters = [] # one list of counters per thread, only written by its thread
+local = threading.local()
+active = {} # transfer number -> [file name, expected size, bytes done], bytes only written by its thread
+transfer_numbers = itertools.count()
+current_step = None # (step, max, message)
+renderer = None
+
+def set_mode(progress_mode: str = "auto"):
+    """
+    Sets how progress is shown.
+
+    Args:
+        progress_mode (str): One of MODES.
+    """
+    global mode
+    if progress_mode == "auto":
+        progress_mode = "bar" if sys.stdout.isatty() else "quiet"
+    mode = progress_mode
+
+def thread_counters() -> list:
+    """
+    Get the counters of the current thread for this sync, creating them on first use.
+    """
+    if getattr(local, "generation", None) != generation:
+        local.counters = [0] * 6
+        local.generation = generation
+        counters.append(local.counters) # list.append is atomic
+    return local.counters
+
+def totals() -> list:
+    """
+    Get the sum of every thread's counters, with the bytes of the active transfers.
+    """
+    result = [sum(column) for column in zip(*counters)] if counters else [0] * 6
+    result[BYTES] += sum(transfer[2] for transfer in list(active.values()))
+    return result
+
+def expect(size: int, files: int = 1):
+    """
+    Adds files to the ones that will be downloaded in this sync (negative to take them out, e.g. if skipped).
+
+    Args:
+        size (int): Their expected size in bytes.
+        files (int): The number of files.
+    """
+    own = thread_counters()
+    own[EXPECTED_FILES] += files
+    own[EXPECTED_BYTES] += size
+
+def scanned(phase: str):
+    """
+    Counts a course index ("index") or category table ("category") scanned.
+    """
+    if phase in PHASES:
+        thread_counters()[PHASES[phase]] += 1
+
+@contextmanager
+def transfer(name: str, size: int = 0):
+    """
+    Shows a file as an active transfer while inside the block.
+
+    Args:
+        name (str): The file name.
+        size (int): Its expected size in bytes.
+
+    Usage:
+        with progress_handler.transfer(filepath.name, file_size) as update:
+            write_download(filepath, url, progress=update)
+    """
+    state = [name, size or 0, 0]
+    number = next(transfer_numbers)
+
+    def update(count: int):
+        state[2] += count
+
+    active[number] = state
+    try:
+        yield update
+    finally:
+        del active[number]
+        done(state[2], state[1])
+
+def done(transferred: int, size: int = 0):
+    """
+    Counts a file as done.
+
+    Args:
+        transferred (int): The bytes transferred (e.g. 0 if it was linked from the deduplication store).
+        size (int): Its expected size in bytes.
+    """
+    own = thread_counters()
+    own[FILES] += 1
+    own[BYTES] += transferred
+    own[EXPECTED_BYTES] += transferred - (size or 0) # the real size, for the ETA
+
+def step(progress: int, msg: str, max: int = 6) -> bool:
+    """
+    Shows the step of the sync the program is in.
+
+    Args:
+        progress (int): The step (X out of max).
+        msg (str): The associated message.
+        max (int): The number of total steps.
+
+    Returns:
+        bool: False if the step should be printed as usual (no live display nor JSON output).
+    """
+    global current_step
+    current_step = (progress, max, msg)
+    if mode == "json":
+        emit({"event": "step", "step": progress, "of": max, "message": msg})
+        return True
+    return mode == "quiet" or renderer is not None
+
+def emit(event: dict):
+    sys.stderr.write(json.dumps(event, ensure_ascii=False) + "\n")
+    sys.stderr.flush()
+
+class Speed:
+    """
+    Throughput over the last PROGRESS_WINDOW seconds, sampled by the renderer.
+    """
+    def __init__(self):
+        self.samples = deque([(time.perf_counter(), 0)])
+
+    def sample(self, done: int) -> float:
+        now = time.perf_counter()
+        self.samples.append((now, done))
+        while now - self.samples[0][0] > cfg.PROGRESS_WINDOW:
+            self.samples.popleft()
+        start, start_done = self.samples[0]
+        return (done - start_done) / (now - start) if now > start else 0.0
+
+def snapshot(speed: Speed) -> dict:
+    """
+    Get the progress of the sync so far.
+    """
+    counts = totals()
+    rate = speed.sample(counts[BYTES])
+    remaining = max(counts[EXPECTED_BYTES] - counts[BYTES], 0)
+    return {"files": counts[FILES], "files_total": counts[EXPECTED_FILES], "bytes": counts[BYTES], "bytes_total": counts[EXPECTED_BYTES],
+            "speed": round(rate), "eta": round(remaining / rate) if rate > 0 and remaining else None,
+            "courses": counts[COURSES], "categories": counts[CATEGORIES],
+            "active": [{"file": name, "bytes": done, "size": size} for name, size, done in list(active.values())]}
+
+def render(state: dict):
+    """
+    Build the live display from a snapshot of the progress.
+    """
+    from rich.console import Group
+    from rich.text import Text
+    from handlers.print_handler import human_readable_size, fixed_string_length
+    lines = []
+    if current_step is not None:
+        progress, steps, msg = current_step
+        lines.append(Text(f"{progress*'▰'}{(steps-progress)*'▱'} {msg}"))
+    summary = (f"{state['files']}/{state['files_total']} ficheiros · {human_readable_size(state['bytes'])} de {human_readable_size(state['bytes_total'])}"
+               f" · {human_readable_size(state['speed'])}/s")
+    if state["eta"] is not None:
+        summary += f" · faltam {state['eta'] // 60}:{state['eta'] % 60:02d}"
+    summary += f" · {state['courses']} cadeiras, {state['categories']} categorias"
+    lines.append(Text(summary, style="dim"))
+    for file in state["active"][:cfg.PROGRESS_ACTIVE_LINES]:
+        percent = f"{min(100 * file['bytes'] // file['size'], 100):>3}%" if file["size"] else "   "
+        lines.append(Text(f"  {fixed_string_length(file['file'], 40)} {percent} {human_readable_size(file['bytes'])}"))
+    if len(state["active"]) > cfg.PROGRESS_ACTIVE_LINES:
+        lines.append(Text(f"  (+{len(state['active']) - cfg.PROGRESS_ACTIVE_LINES} ficheiros)", style="dim"))
+    return Group(*lines)
+
+class LiveProgress:
+    """
+    Renderable of the live display, rebuilt each time rich redraws it.
+    """
+    def __init__(self):
+        self.speed = Speed()
+
+    def __rich__(self):
+        return render(snapshot(self.speed))
+
+@contextmanager
+def monitor():
+    """
+    Shows the progress of a sync while inside the block, in the current mode.
+    """
+    global generation, renderer
+    generation += 1
+    counters.clear()
+    if mode == "bar":
+        from rich.live import Live
+        live = Live(LiveProgress(), refresh_per_second=cfg.PROGRESS_FPS, transient=True,
+                    redirect_stdout=True, redirect_stderr=True)
+        with live:
+            # Log records go through the live display's stderr, above it, instead of over it
+            handlers = [handler for handler in log.getLogger().handlers if type(handler) is log.StreamHandler]
+            streams = [handler.stream for handler in handlers]
+            for handler in handlers:
+                handler.setStream(sys.stderr)
+            renderer = live
+            try:
+                yield
+            finally:
+                renderer = None
+                for handler, stream in zip(handlers, streams):
+                    handler.setStream(stream)
+    elif mode == "json":
+        speed = Speed()
+        done = threading.Event()
+
+        def report():
+            while not done.wait(cfg.PROGRESS_JSON_INTERVAL):
+                emit(dict(event="progress", **snapshot(speed)))
+
+        reporter = threading.Thread(target=report, name="progress", daemon=True)
+        reporter.start()
+        try:
+            yield
+        finally:
+            done.set()
+            reporter.join()
+            emit(dict(event="progress", **snapshot(speed)))
+    else:
+        yield
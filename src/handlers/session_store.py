@@ -0,0 +1,168 @@
+import json
+import logging as log
+import os
+import threading
+import time
+from pathlib import Path
+
+#Config
+import clippy.config as cfg
+
+"""
+Persistence of the authenticated session between runs: the cookies of each user's session and their
+user ID are kept so the next run can skip the login requests. On Windows, where file permissions can't
+keep the file private, each session is stored in the system's keyring (Windows Credential Manager) instead
+of a file; elsewhere they're kept in a file only readable by the user.
+A stored session is reused until CLIP answers with its login page, and then replaced by a new login.
+"""
+
+SERVICE_NAME = "clippy-session" # keyring service, apart from the credentials' one
+
+store_lock = threading.Lock()
+
+def in_keyring() -> bool:
+    """
+    Check if sessions are stored in the keyring instead of a file.
+    """
+    return os.name == "nt"
+
+def key(username: str) -> str:
+    """
+    Get the key of a user's session in the store (sessions of other servers are kept apart).
+
+    Args:
+        username (str): The user's username.
+    """
+    return f"{username}@{cfg.domain}"
+
+def load_store() -> dict:
+    """
+    Loads every stored session.
+
+    Returns:
+        dict: Each session's user ID, cookies and login time, keyed by key().
+    """
+    try:
+        with open(cfg.SESSION_PATH, 'r') as json_file:
+            return json.load(json_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def write_store(store: dict):
+    """
+    Writes every stored session to a file only readable by the user.
+
+    Args:
+        store (dict): The sessions, as returned by load_store().
+    """
+    Path.mkdir(cfg.SESSION_PATH.parent, parents=True, exist_ok=True)
+    temp_path = cfg.SESSION_PATH.with_suffix(".tmp")
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as json_file:
+        json.dump(store, json_file)
+    os.replace(temp_path, cfg.SESSION_PATH)
+
+def read_entry(username: str) -> dict:
+    """
+    Get a user's stored session.
+
+    Args:
+        username (str): The user's username.
+
+    Returns:
+        dict: The session's user ID, cookies and login time, or None if there is none.
+    """
+    if not in_keyring():
+        with store_lock:
+            return load_store().get(key(username))
+    import keyring
+    try:
+        stored = keyring.get_password(SERVICE_NAME, key(username))
+        return json.loads(stored) if stored is not None else None
+    except (keyring.errors.KeyringError, json.JSONDecodeError) as e:
+        log.debug(f"Não foi possível ler a sessão guardada: {e}")
+        return None
+
+def write_entry(username: str, entry: dict):
+    """
+    Stores a user's session, or forgets it.
+
+    Args:
+        username (str): The user's username.
+        entry (dict): The session's user ID, cookies and login time (None to forget it).
+    """
+    if not in_keyring():
+        with store_lock:
+            store = load_store()
+            if entry is not None:
+                store[key(username)] = entry
+            elif store.pop(key(username), None) is None:
+                return
+            write_store(store)
+        return
+    import keyring
+    if entry is not None:
+        keyring.set_password(SERVICE_NAME, key(username), json.dumps(entry))
+    else:
+        try:
+            keyring.delete_password(SERVICE_NAME, key(username))
+        except keyring.errors.PasswordDeleteError: # nothing stored
+            pass
+
+def restore_session(username: str, session) -> int:
+    """
+    Loads a user's stored cookies into a session, if they weren't stored too long ago.
+    The session isn't validated with the server here: it's trusted for up to SESSION_MAX_AGE (or until a
+    cookie expires), and a request that gets CLIP's login page back logs in again (see get_html.fetch_html).
+
+    Args:
+        username (str): The user's username.
+        session (ThrottledSession): The session that will use the cookies.
+
+    Returns:
+        int: The user's internal ID, or None if there is no usable stored session.
+    """
+    stored = read_entry(username)
+    if stored is None:
+        return None
+    if time.time() - stored["time"] > cfg.SESSION_MAX_AGE:
+        log.info(f"A sessão guardada de {username} é demasiado antiga, a fazer login.")
+        return None
+
+    for cookie in stored["cookies"]:
+        if cookie["expires"] is not None and cookie["expires"] < time.time():
+            log.info(f"A sessão guardada de {username} expirou, a fazer login.")
+            return None
+    for cookie in stored["cookies"]:
+        session.cookies.set(cookie["name"], cookie["value"], domain=cookie["domain"], path=cookie["path"],
+                            expires=cookie["expires"], secure=cookie["secure"])
+    log.info(f"A reutilizar a sessão guardada de {username}.")
+    return stored["user_id"]
+
+def save_session(username: str, user_id: int, session):
+    """
+    Stores the cookies of a user's session after a successful login.
+
+    Args:
+        username (str): The user's username.
+        user_id (int): The user's internal ID.
+        session (ThrottledSession): The logged in session.
+    """
+    cookies = [{"name": cookie.name, "value": cookie.value, "domain": cookie.domain, "path": cookie.path,
+                "expires": cookie.expires, "secure": cookie.secure} for cookie in session.cookies]
+    try:
+        write_entry(username, {"user_id": user_id, "cookies": cookies, "time": time.time()})
+    except Exception as e: # e.g. no keyring, or the session is too large for it
+        log.warning(f"Não foi possível guardar a sessão: {e}")
+
+def delete_session(username: str):
+    """
+    Forgets a user's stored session.
+
+    Args:
+        username (str): The user's username.
+    """
+    try:
+        write_entry(username, None)
+    except Exception as e:
+        log.debug(f"Não foi possível apagar a sessão guardada: {e}")
@@ -0,0 +1,167 @@
+import contextvars
+import logging as log
+
+from handlers.print_handler import print_progress, human_readable_size
+from handlers import progress_handler
+
+#Config
+import clippy.config as cfg
+
+def run_pipeline(scan_course, scan_category, download, courses=(), subcats=(), jobs=(), files=(),
+                 index_workers: int = cfg.MAX_INDEX_WORKERS,
+                 category_workers: int = cfg.MAX_CATEGORY_WORKERS,
+                 download_workers: int = cfg.MAX_DOWNLOAD_WORKERS,
+                 queue_size: int = cfg.DOWNLOAD_QUEUE_SIZE,
+                 size_of=None, byte_budget: int = None,
+                 download_message: str = "A transferir ficheiros em falta...") -> dict:
+    """
+    Runs the scrape-and-download pipeline until every course, category and file has been processed.
+
+    Each course's categories are fetched as soon as its index is parsed, and each file starts
+    downloading as soon as its category table is parsed, so no phase waits for the slowest
+    request of the previous one. Every phase has its own concurrency limit.
+
+    Files are handed to a fixed number of download workers through a bounded queue: while it's full,
+    category tables wait to be scanned, so a large archive is never held in memory all at once.
+    Given each file's expected size, the queue is kept sorted: most workers take the smallest file
+    waiting, so small files (e.g. a new exam) arrive first, while LARGE_FILE_WORKERS of them take the
+    largest, so big files are downloaded alongside instead of all at the end.
+
+    Args:
+        scan_course (callable): Worker called with each item of courses, returns a list of subcategories
+                                and a list of files to download without scanning their categories.
+        scan_category (callable): Worker called with each subcategory, returns a list of files to download.
+        download (callable): Worker called with each file to download.
+        courses (list): Argument tuples for scan_course.
+        subcats (list): Argument tuples for scan_category, for when the index was already parsed.
+        jobs (list): (context, courses, subcats, files) tuples whose workers run in the given contextvars.Context
+                     instead of the caller's (e.g. with another user's session).
+        files (list): Argument tuples for download, for files found without scanning their categories.
+        index_workers (int): Maximum number of course indexes fetched simultaneously.
+        category_workers (int): Maximum number of category tables fetched simultaneously.
+        download_workers (int): Maximum number of files downloaded simultaneously.
+        queue_size (int): Maximum number of files waiting to be downloaded.
+        size_of (callable): Gets the expected size in bytes of a file to download, from its argument tuple
+                            (None to download files in the order they are found).
+        byte_budget (int): Maximum number of bytes to download in this run; files that don't fit are left
+                           for the next run (None for unlimited).
+        download_message (str): Step shown when the first file is sent to the download worker
+                                (e.g. when it only plans the files instead of downloading them).
+
+    Returns:
+        A dict with the number of files sent to download to each folder.
+    """
+    import asyncio # only needed once there is something to sync
+    jobs = [(contextvars.copy_context(), courses, subcats, files), *jobs]
+    return asyncio.run(_pipeline(scan_course, scan_category, download, jobs,
+                                 index_workers, category_workers, download_workers, queue_size, size_of, byte_budget,
+                                 download_message))
+
+async def _pipeline(scan_course, scan_category, download, jobs,
+                    index_workers, category_workers, download_workers, queue_size, size_of, byte_budget,
+                    download_message):
+    import asyncio
+    import concurrent.futures as cf
+    from modules.DownloadQueue import DownloadQueue
+    loop = asyncio.get_running_loop()
+    pool = cf.ThreadPoolExecutor(max_workers=index_workers + category_workers + download_workers)
+    limits = {
+        "index": asyncio.Semaphore(index_workers),
+        "category": asyncio.Semaphore(category_workers),
+        "download": asyncio.Semaphore(download_workers),
+    }
+    queue = DownloadQueue(queue_size)
+    tasks = set()
+    folders = {}
+    queued = set()
+    started = set()
+    budget_left = byte_budget
+    skipped_files = skipped_bytes = 0 # left for the next run by the byte budget
+
+    async def execute(phase, worker_function, args, context=None):
+        async with limits[phase]:
+            try:
+                # Workers run in a copy of the task's context (or of the given one),
+                # so they use the session of the task's user
+                context = contextvars.copy_context() if context is None else context.copy()
+                return await loop.run_in_executor(pool, context.run, worker_function, *args)
+            except Exception as e:
+                log.error(f"Erro a processar {args}: {e}")
+                return None
+            finally:
+                progress_handler.scanned(phase)
+
+    def spawn(coro):
+        task = asyncio.ensure_future(coro)
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    def announce(phase, step, msg):
+        if phase not in started:
+            started.add(phase)
+            print_progress(step, msg)
+
+    async def run_course(args):
+        subcats, files = await execute("index", scan_course, args) or ((), ())
+        for subcat in subcats:
+            spawn(run_category(subcat))
+        await enqueue(files)
+
+    async def run_category(args):
+        announce("category", 3, "A obter URLs dos ficheiros a transferir...")
+        await enqueue(await execute("category", scan_category, args) or [])
+
+    async def enqueue(files):
+        context = contextvars.copy_context() # downloads are made with the session of the task's user
+        for file in files:
+            destination = str(file[0])
+            if destination in queued: # same destination found twice (e.g. repeated categories)
+                continue
+            queued.add(destination)
+            size = size_of(file) if size_of else 0
+            progress_handler.expect(size)
+            await queue.put((context, file), size) # waits while the download workers are behind
+
+    async def download_worker(largest):
+        nonlocal budget_left, skipped_files, skipped_bytes
+        while True:
+            entry = await queue.get(largest)
+            if entry is None:
+                return
+            context, args = entry
+            if budget_left is not None:
+                size = size_of(args) if size_of else 0
+                if size > budget_left:
+                    skipped_files += 1
+                    skipped_bytes += size
+                    progress_handler.expect(-size, -1)
+                    continue
+                budget_left -= size
+            folder = str(args[0].parent)
+            folders[folder] = folders.get(folder, 0) + 1
+            announce("download", 4, download_message)
+            await execute("download", download, args, context)
+
+    with pool:
+        # With a single worker, it takes the smallest files
+        large_workers = min(cfg.LARGE_FILE_WORKERS, download_workers - 1) if size_of else 0
+        workers = [asyncio.ensure_future(download_worker(i < large_workers)) for i in range(download_workers)]
+        for context, courses, subcats, files in jobs:
+            # Tasks copy the context they are created in, and their subtasks inherit it
+            for args in courses:
+                context.run(spawn, run_course(args))
+            for args in subcats:
+                context.run(spawn, run_category(args))
+            if files:
+                context.run(spawn, enqueue(files))
+
+        # Tasks keep spawning new tasks, so wait until no task is left
+        while tasks:
+            await asyncio.gather(*list(tasks))
+        await queue.close()
+        await asyncio.gather(*workers)
+
+    if skipped_files:
+        log.warning(f"Atingido o limite de {human_readable_size(byte_budget)} por execução: {skipped_files} ficheiros "
+                    f"({human_readable_size(skipped_bytes)}) ficam para a próxima execução.")
+    return folders
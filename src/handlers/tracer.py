@@ -0,0 +1,254 @@
+import atexit
+import functools
+import heapq
+import json
+import logging as log
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+#Config
+import clippy.config as cfg
+
+"""
+Tracing of a sync (--trace): each HTTP request (URL class, status, bytes, latency, retries) and each
+phase of the sync (login, years, courses, course indexes, categories, parses, downloads, commit) is
+written as it ends to a JSON-lines file, or to a Chrome trace (chrome://tracing, Perfetto) if the
+file ends in .json. A summary of the requests, the phases and the slowest courses is shown at exit.
+While tracing is off, span() and the request hook cost next to nothing.
+"""
+
+# URL classes, by the first matching fragment of the URL
+URL_CLASSES = (
+    ("/objecto", "file"),
+    ("tipo_de_documento_de_unidade=", "documents"),
+    ("edi%E7%E3o_de_unidade_curricular=", "index"),
+    ("/ano_lectivo/unidades", "courses"),
+    ("/utente/eu/aluno", "years"),
+    ("/utente/eu", "user"),
+)
+SLOWEST = 10 # spans and courses listed in the summary
+
+lock = threading.Lock()
+trace_file = None
+chrome = False
+first_event = True
+origin = time.perf_counter()
+threads = {} # thread ident -> small thread number
+current = threading.local() # innermost open span of each thread
+requests = {} # URL class -> {count, errors, retries, bytes, time, max}
+phases = {} # phase -> {count, time, max, bytes}
+courses = {} # course -> {time, requests, bytes}
+slowest = [] # heap of the slowest (duration, phase, label) spans
+
+def start(path: Path):
+    """
+    Starts tracing to a file, and shows the summary when the program exits.
+
+    Args:
+        path (Path): The trace file; JSON lines, or a Chrome trace if it ends in .json.
+    """
+    global trace_file, chrome
+    Path.mkdir(path.parent, parents=True, exist_ok=True)
+    trace_file = open(path, "w", encoding="utf-8")
+    chrome = path.suffix == ".json"
+    if chrome:
+        trace_file.write("[")
+    cfg.get_session().hooks["response"].append(record_response)
+    atexit.register(finish)
+    log.info(f"A registar pedidos e fases em {path}")
+
+def enabled() -> bool:
+    return trace_file is not None
+
+def url_class(url: str) -> str:
+    """
+    Get the class of a CLIP URL (e.g. "index", "documents" or "file").
+
+    Args:
+        url (str): The URL.
+    """
+    for fragment, name in URL_CLASSES:
+        if fragment in url:
+            return name
+    return "login" if url.rstrip("/") == cfg.domain else "other"
+
+def thread_number() -> int:
+    ident = threading.get_ident()
+    if ident not in threads:
+        threads[ident] = len(threads) + 1
+    return threads[ident]
+
+def write(event: dict):
+    """
+    Writes an event to the trace file (call it while holding lock).
+
+    Args:
+        event (dict): The name, category, start and duration (seconds) and arguments of the event.
+    """
+    global first_event
+    if chrome:
+        line = json.dumps({"name": event["name"], "cat": event["cat"], "ph": "X", "pid": 1, "tid": thread_number(),
+                           "ts": round(event["start"] * 1e6), "dur": round(event["duration"] * 1e6), "args": event["args"]},
+                          ensure_ascii=False)
+        trace_file.write(("\n" if first_event else ",\n") + line)
+        first_event = False
+    else:
+        trace_file.write(json.dumps(dict(event, thread=thread_number()), ensure_ascii=False) + "\n")
+
+def record_response(response, *args, **kwargs):
+    """
+    Response hook of the session: records a finished HTTP request.
+    Streamed responses (downloads) are counted by their Content-Length.
+    """
+    if trace_file is None:
+        return
+    end = time.perf_counter() - origin
+    latency = response.elapsed.total_seconds()
+    kind = url_class(response.url)
+    size = int(response.headers.get("Content-Length", 0)) if kwargs.get("stream") else len(response.content)
+    retries = getattr(response.raw, "retries", None)
+    retries = len(retries.history) if retries is not None else 0
+    span = getattr(current, "span", None)
+    with lock:
+        if trace_file is None:
+            return
+        stats = requests.setdefault(kind, {"count": 0, "errors": 0, "retries": 0, "bytes": 0, "time": 0.0, "max": 0.0})
+        stats["count"] += 1
+        stats["errors"] += response.status_code >= 400
+        stats["retries"] += retries
+        stats["bytes"] += size
+        stats["time"] += latency
+        stats["max"] = max(stats["max"], latency)
+        if span is not None: # counted in the span that made the request
+            span["requests"] = span.get("requests", 0) + 1
+            span["bytes"] = span.get("bytes", 0) + size
+        write({"name": kind, "cat": "http", "start": end - latency, "duration": latency,
+               "args": {"method": response.request.method, "url": response.url, "status": response.status_code,
+                        "bytes": size, "retries": retries}})
+
+@contextmanager
+def span(phase: str, **args):
+    """
+    Records a phase of the sync, from entering to leaving the block.
+    The requests made inside it (in the same thread) are added to its arguments.
+
+    Args:
+        phase (str): The phase, e.g. "index" or "download".
+        **args: What the phase works on, e.g. course="...", category="..." (more can be added to the yielded dict).
+
+    Usage:
+        with tracer.span("category", course=course.name, category=category) as info:
+            info["files"] = len(files)
+    """
+    if trace_file is None:
+        yield args
+        return
+    parent = getattr(current, "span", None)
+    current.span = args
+    start = time.perf_counter()
+    try:
+        yield args
+    finally:
+        duration = time.perf_counter() - start
+        current.span = parent
+        record_span(phase, args, start, duration, parent is None)
+
+def traced(phase: str, describe=None):
+    """
+    Decorator that records each call of a function as a span.
+
+    Args:
+        phase (str): The phase.
+        describe (callable): Called with the function's arguments once it returns, gets the span's arguments (e.g. the course).
+
+    Usage:
+        @traced("index", lambda path, course: {"course": course.name})
+        def search_cats_in_course(path, course): ...
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if trace_file is None:
+                return function(*args, **kwargs)
+            with span(phase) as info:
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    if describe is not None:
+                        info.update(describe(*args, **kwargs))
+        return wrapper
+    return decorator
+
+def record_span(phase: str, args: dict, start: float, duration: float, outermost: bool):
+    """
+    Adds a finished span to the totals and writes it to the trace file.
+
+    Args:
+        phase (str): The phase.
+        args (dict): The arguments of the span.
+        start (float): When it started (time.perf_counter()).
+        duration (float): How long it took, in seconds.
+        outermost (bool): Whether it wasn't inside another span of the same thread (only those add to the course's time).
+    """
+    with lock:
+        if trace_file is None:
+            return
+        stats = phases.setdefault(phase, {"count": 0, "time": 0.0, "max": 0.0, "bytes": 0})
+        stats["count"] += 1
+        stats["time"] += duration
+        stats["max"] = max(stats["max"], duration)
+        stats["bytes"] += args.get("bytes", 0)
+        if "course" in args and outermost:
+            course = courses.setdefault(args["course"], {"time": 0.0, "requests": 0, "bytes": 0})
+            course["time"] += duration
+            course["requests"] += args.get("requests", 0)
+            course["bytes"] += args.get("bytes", 0)
+        label = " > ".join(str(args[key]) for key in ("course", "category", "file") if key in args)
+        if label:
+            heapq.heappush(slowest, (duration, phase, label))
+            if len(slowest) > SLOWEST:
+                heapq.heappop(slowest)
+        write({"name": phase, "cat": "phase", "start": start - origin, "duration": duration, "args": args})
+
+def summary() -> str:
+    """
+    Get a table with the totals of each URL class and phase, and the slowest courses and spans.
+    """
+    from handlers.print_handler import human_readable_size
+    lines = [f"{'pedidos':<12}{'n.º':>7}{'erros':>7}{'repet.':>7}{'dados':>12}{'média':>9}{'máx.':>9}"]
+    for kind, stats in sorted(requests.items(), key=lambda item: -item[1]["time"]):
+        lines.append(f"{kind:<12}{stats['count']:>7}{stats['errors']:>7}{stats['retries']:>7}{human_readable_size(stats['bytes']):>12}"
+                     f"{stats['time'] / stats['count']:>8.3f}s{stats['max']:>8.3f}s")
+    lines.append("")
+    lines.append(f"{'fases':<12}{'n.º':>7}{'total':>10}{'máx.':>9}")
+    for phase, stats in sorted(phases.items(), key=lambda item: -item[1]["time"]):
+        lines.append(f"{phase:<12}{stats['count']:>7}{stats['time']:>9.3f}s{stats['max']:>8.3f}s")
+    if courses:
+        lines.append("")
+        lines.append(f"{'cadeiras mais lentas':<50}{'tempo':>10}{'pedidos':>9}{'dados':>12}")
+        for name, stats in sorted(courses.items(), key=lambda item: -item[1]["time"])[:SLOWEST]:
+            lines.append(f"{name[:49]:<50}{stats['time']:>9.3f}s{stats['requests']:>9}{human_readable_size(stats['bytes']):>12}")
+    if slowest:
+        lines.append("")
+        lines.append("passos mais lentos")
+        for duration, phase, label in sorted(slowest, reverse=True):
+            lines.append(f"{duration:>9.3f}s  {phase:<10}{label}")
+    return "\n".join(lines)
+
+def finish():
+    """
+    Closes the trace file and shows the summary.
+    """
+    global trace_file
+    with lock:
+        if trace_file is None:
+            return
+        if chrome:
+            trace_file.write("\n]\n")
+        name = trace_file.name
+        trace_file.close()
+        trace_file = None
+    print(summary())
+    print(f"Registo guardado em {name}")
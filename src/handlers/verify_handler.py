@@ -0,0 +1,97 @@
+import logging as log
+import os
+from pathlib import Path
+
+from modules.IgnoreRules import IgnoreRules
+from handlers import manifest, progress_handler
+from handlers.blob_store import file_hash
+
+#Config
+import clippy.config as cfg
+
+"""
+Integrity check of a CLIP folder (clippy verify): every file in the sync manifest is checked against the
+size it had when it was downloaded and, if its hash was recorded, against the SHA-256 of its content.
+Files are checked by a bounded number of threads, so a large folder on a slow disk isn't flooded with reads.
+Files in the synced folders that the manifest doesn't know are reported too, but never touched.
+"""
+
+# Problems found, by their label in the report
+MISSING = "em falta"
+TRUNCATED = "truncado"
+CORRUPT = "corrompido"
+UNKNOWN = "desconhecido"
+
+def check(path: str, local_size: int, hash: str, quick: bool = False) -> str:
+    """
+    Check a file against its manifest record.
+
+    Args:
+        path (str): The local path of the file.
+        local_size (int): The size it had when it was synced.
+        hash (str): The SHA-256 it had when it was downloaded (None if unknown).
+        quick (bool): Only check the size.
+
+    Returns:
+        str: The problem found (MISSING, TRUNCATED or CORRUPT), or None if the file is intact.
+    """
+    try:
+        size = os.stat(path).st_size
+    except FileNotFoundError:
+        return MISSING
+    if size < local_size:
+        return TRUNCATED
+    if size != local_size:
+        return CORRUPT
+    if hash is not None and not quick and file_hash(path) != hash:
+        return CORRUPT
+    return None
+
+def verify(root: Path, workers: int = cfg.VERIFY_WORKERS, quick: bool = False) -> (int, int, [(str, str, tuple, str)], [str]):
+    """
+    Check every file the manifest has inside a folder, and look for unknown files in the same folders.
+
+    Args:
+        root (Path): The folder where the CLIP files are saved.
+        workers (int): Maximum number of files read simultaneously.
+        quick (bool): Only check the sizes, without reading the files.
+
+    Returns (checked, unhashed, problems, unknown)
+        checked: The number of files checked.
+        unhashed: How many of them had no hash recorded (synced before this check existed), so only their size was checked.
+        problems: The problem, path, arguments for download_file() and user (as in the manifest) of each broken file.
+        unknown: The path of each file in the synced folders that isn't in the manifest.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    rules = IgnoreRules.load(root)
+    recorded = manifest.files_under(root)
+    records = [record for record in recorded
+               if record[4] is not None and not rules.ignored(Path(record[0]))] # never downloaded (e.g. ignored) files have no local copy
+    for record in records:
+        progress_handler.expect(record[4])
+
+    def check_record(record):
+        path, url, size, server_mtime, local_size, local_mtime, hash, user = record
+        problem = check(path, local_size, hash, quick)
+        progress_handler.done(local_size, local_size)
+        return problem
+
+    problems = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for record, problem in zip(records, pool.map(check_record, records)):
+            if problem is not None:
+                path, url, size, server_mtime = record[:4]
+                log.debug(f"{path}: {problem}")
+                problems.append((problem, path, (Path(path), url, size, server_mtime), record[7]))
+
+    known = {record[0] for record in recorded}
+    unknown = []
+    for folder in sorted({os.path.dirname(path) for path in known}):
+        try:
+            with os.scandir(folder) as entries:
+                unknown += [entry.path for entry in entries if entry.is_file() and not entry.name.startswith('.')
+                            and entry.path not in known and not rules.ignored(Path(entry.path))]
+        except FileNotFoundError:
+            pass
+    unhashed = sum(1 for record in records if record[6] is None)
+    return len(records), unhashed, problems, sorted(unknown)
@@ -0,0 +1,82 @@
+import threading
+import time
+
+class AdaptiveLimiter:
+    """
+    A concurrency limiter that adapts to the server's load, AIMD-style (additive increase, multiplicative decrease).
+
+    The limit grows by about one request per round-trip while requests succeed with a latency close to the
+    best one observed, and is halved (at most once per round-trip) on 5xx answers, timeouts or latency spikes.
+
+    Args:
+        max_limit (int): The maximum number of simultaneous requests.
+        min_limit (int): The minimum number of simultaneous requests.
+        tolerance (float): How many times slower than the baseline latency a request can be before it counts as congestion.
+
+    Methods:
+        acquire():
+            Wait for a free slot.
+        release(latency: float, ok: bool):
+            Free a slot and adapt the limit to the outcome of the request.
+
+    Usage:
+        limiter = AdaptiveLimiter(16)
+        limiter.acquire()
+        ...  # Make the request
+        limiter.release(latency, response.status_code < 500)
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1, tolerance: float = 2.0):
+        """
+        Initialize an AdaptiveLimiter instance, starting halfway between the minimum and maximum limits.
+        """
+        self.max_limit = max(max_limit, 1)
+        self.min_limit = max(min(min_limit, self.max_limit), 1)
+        self.tolerance = tolerance
+        self.limit = float(max(self.min_limit, self.max_limit // 2))
+        self.in_flight = 0
+        self.latency = None # smoothed latency
+        self.baseline = None # best smoothed latency, slowly drifting towards the current one
+        self.last_decrease = 0.0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """
+        Wait until the number of requests in flight is below the current limit, then take a slot.
+        """
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, latency: float, ok: bool):
+        """
+        Free a slot and adapt the limit to the outcome of the request.
+
+        Args:
+            latency (float): How long the request took, in seconds.
+            ok (bool): False if the request failed with a 5xx status or a timeout.
+        """
+        with self.condition:
+            self.in_flight -= 1
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+            self.baseline = self.latency if self.baseline is None else min(self.latency, self.baseline + 0.01 * (self.latency - self.baseline))
+
+            now = time.monotonic()
+            if not ok or self.latency > self.baseline * self.tolerance:
+                if now - self.last_decrease > self.latency: # react once per round-trip
+                    self.limit = max(self.min_limit, self.limit / 2)
+                    self.last_decrease = now
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+    def __str__(self):
+        """
+        Get a string representation of the AdaptiveLimiter instance.
+
+        Returns:
+            str: A string representation of the AdaptiveLimiter instance.
+        """
+        latency = f"{self.latency:.3f}s" if self.latency is not None else "-"
+        return f"limite {self.limit:.1f} ({self.min_limit}-{self.max_limit}), latência {latency}"
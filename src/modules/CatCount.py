@@ -1,5 +1,4 @@
 import re
-from bs4 import BeautifulSoup as bs
 
 #Config
 import clippy.config as cfg # noqa: F401
@@ -12,46 +11,44 @@ class CatCount(dict):
     This class inherits from the built-in dictionary class.
 
     Args:
-        html (bs): Beautiful Soup object containing the HTML content of the course's subcategories.
+        links ([str]): The text of each subcategory link in the course's index, e.g. "Exames (3)".
 
     Methods:
-        get_links(html: bs) -> List[bs.Tag]:
-            Internal method that extracts links from the HTML content.
+        from_dict(counts: dict) -> CatCount:
+            Initialize a CatCount instance from a previously parsed file count.
         get_catID(key: str) -> str:
             Get the ID for a given category (key).
 
     Usage:
-        html_content = ...
-        index_count = CatCount(html_content)
+        links, title = extract_index(html_content)
+        index_count = CatCount(links)
     """
 
-    def __init__(self, html: bs):
+    def __init__(self, links: [str]):
         """
-        Initialize an CatCount instance based on HTML content.
+        Initialize an CatCount instance based on the subcategory links of a course's index.
 
         Args:
-            html (bs): Beautiful Soup object containing the HTML content of the course's subcategories.
+            links ([str]): The text of each subcategory link in the course's index, e.g. "Exames (3)".
         """
         super().__init__()
-        links = self.get_links(html)
-        counter = [re.search(r"^(\D+) \((\d+)\)", match.text.strip()).group(1, 2) for match in links]
+        counter = [re.search(r"^(\D+) \((\d+)\)", link.strip()).group(1, 2) for link in links]
         for key, value in counter:
             if int(value) != 0: #ignore links with zero files
                 self[key] = int(value)
-    
-    def get_links(self, html: bs):
+
+    @classmethod
+    def from_dict(cls, counts: dict):
         """
-        Internal method that extracts all links from the HTML content.
+        Initialize a CatCount instance from a previously parsed file count.
 
         Args:
-            html (bs): Beautiful Soup object containing the HTML content of the course's subcategories.
-
-        Returns:
-            An array of links, one per subcategory.
+            counts (dict): A dictionary with each category (key) and its file count (value).
         """
-        links = html.find_all("td", attrs={"width": "100%"})[1].find_all("a")
-        return links
-
+        obj = cls.__new__(cls)
+        super(CatCount, obj).__init__(counts)
+        return obj
+    
     def get_catID(self, category: str) -> str:
         """
         Get the URL code / ID for a given category.
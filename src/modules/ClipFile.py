@@ -1,4 +1,3 @@
-from datetime import datetime
 from pathlib import Path
 import os
 
@@ -12,12 +11,12 @@ class ClipFile:
     Args:
         name (str): The name of the file.
         link (str): The download link for the file.
-        mtime (datetime.datetime): The modification time of the file.
+        mtime (float): The modification time of the file (epoch).
         size (int): The size of the file in bytes.
         teacher (str): The name of the teacher who uploaded the file.
 
     Methods:
-        is_synced(path: Path) -> bool, None:
+        is_synced(path: Path, snapshot: DirSnapshot = None) -> bool, None:
             Check if the file is synchronized with the corresponding local folder.
 
     Usage:
@@ -27,14 +26,15 @@ class ClipFile:
         synced = file.is_synced(folder)  # Check if clip file is synchronized with the local folder
 
     """
+    __slots__ = ("name", "link", "mtime", "size", "teacher") # no __dict__, archives can have thousands of files
 
-    def __init__(self, name : str, link : str, mtime, size, teacher : str):
+    def __init__(self, name : str, link : str, mtime : float, size, teacher : str):
         """
         Initialize a ClipFile instance.
         """
         self.name = name
         self.link = link
-        self.mtime = datetime.strptime(mtime, "%Y-%m-%d %H:%M")
+        self.mtime = mtime
         self.size = size
         self.teacher = teacher
   
@@ -47,19 +47,23 @@ class ClipFile:
         """
         return f"{self.name} {self.link} {self.mtime} {self.size} {self.teacher}"
     
-    def is_synced(self, path: Path):
+    def is_synced(self, path: Path, snapshot = None):
         """
         Check if the file is synchronized with a local path.
 
         Args:
             path (Path): local path where the file is expected to exist.
+            snapshot (DirSnapshot, optional): A listing of the course's folder to look the file up in, instead of the disk.
 
         Returns:
             True if the file is synchronized (up to date).
             False if the file exists but is outdated.
             None if the file does not exist at the specified path.
         """
+        if snapshot is not None:
+            stat = snapshot.stat(path / self.name)
+            return None if stat is None else stat[1] >= self.mtime
         try:
-            return (datetime.fromtimestamp(os.path.getmtime(path / self.name)) >= self.mtime)
+            return os.path.getmtime(path / self.name) >= self.mtime
         except FileNotFoundError:
             return None
@@ -4,6 +4,12 @@ import logging as log
 #Config
 import clippy.config as cfg
 
+# Parameters of a course's page link
+YEAR = re.compile(r"ano_lectivo=(\d+)")
+ID = re.compile(r"unidade=(\d+)")
+SEMESTER_TYPE = re.compile(r"tipo_de_per%EDodo_lectivo=(\w)")
+SEMESTER = re.compile(r"per%EDodo_lectivo=(\d)")
+
 class Course:
     """
     Represents an academic course with associated information.
@@ -20,6 +26,7 @@ class Course:
         course = Course(name, year, ID, semester_type, semester)
         course = Course.from_link(name, link)
     """
+    __slots__ = ("name", "id", "year", "semester", "semester_type")
 
     def __init__(self, name: str, id: int, year: int, semester: int, semester_type: str = "s"):
         self.name = name
@@ -42,10 +49,10 @@ class Course:
         obj = cls.__new__(cls)
         super(Course, obj).__init__()
         obj.name = name
-        obj.year = int(re.search(r"ano_lectivo=(\d+)", link).group(1))
-        obj.id = int(re.search(r"unidade=(\d+)", link).group(1))
-        obj.semester_type = re.search(r"tipo_de_per%EDodo_lectivo=(\w)", link).group(1)
-        obj.semester = re.search(r"per%EDodo_lectivo=(\d)", link).group(1)
+        obj.year = int(YEAR.search(link).group(1))
+        obj.id = int(ID.search(link).group(1))
+        obj.semester_type = SEMESTER_TYPE.search(link).group(1)
+        obj.semester = SEMESTER.search(link).group(1)
         return obj
     
     def __str__(self):
@@ -1,7 +1,3 @@
-import re
-import logging as log
-from bs4 import BeautifulSoup as bs
-
 from .Course import Course
 
 #Config
@@ -12,20 +8,31 @@ class CourseList(list):
     Represents a list of academic courses with associated links.
 
     Args:
-        html (bs): Beautiful Soup object containing the HTML of a Courses page in CLIP.
+        links ([(str, str)]): The name and page link of each course in a Courses page in CLIP.
     """
 
-    def __init__(self, html: bs):
+    def __init__(self, links: [(str, str)]):
         """
-        Initialize a CourseList instance based on HTML content.
+        Initialize a CourseList instance based on the course links of a Courses page.
 
         Args:
-            html (bs): Beautiful Soup object containing the HTML of a Courses page in CLIP.
+            links ([(str, str)]): The name and page link of each course in a Courses page in CLIP.
         """
         super().__init__()
-        links = self.get_links(html)
-        courses = [Course.from_link(link.text, link['href']) for link in links]
+        courses = [Course.from_link(name, link) for name, link in links]
         self.extend(courses)
+
+    @classmethod
+    def from_courses(cls, courses: [Course]):
+        """
+        Initialize a CourseList instance from previously parsed courses.
+
+        Args:
+            courses ([Course]): The list of courses.
+        """
+        obj = cls.__new__(cls)
+        super(CourseList, obj).__init__(courses)
+        return obj
     
     def __str__(self):
         """
@@ -35,22 +42,3 @@ class CourseList(list):
             str: A string representation of the CourseList instance.
         """
         return '\n'.join(str(course) for course in self)
-    
-    def get_links(self, html: bs) -> [str]:
-        """
-        Extract links from the HTML content.
-
-        Args:
-            html (bs): Beautiful Soup object containing the HTML of a Courses page in CLIP.
-
-        Returns:
-            An array of links.
-        """
-        try:
-            log.debug(str(html))
-            table = html.find_all("td", attrs={"width": "100%"})[1].find_all("a", {"href": re.compile(r"&unidade=(\d+)")}) # TODO possivel IndexError out of range
-            return table
-        except IndexError:
-            log.error(f"Falha crítica: o servidor devolveu conteúdo HTML inválido. Espere uns segundos e tente novamente.\n"
-                      f"O servidor devolveu o seguinte conteúdo HTML:\n {html}")
-            exit()
\ No newline at end of file
@@ -0,0 +1,91 @@
+import os
+from pathlib import Path
+
+from .IgnoreRules import IgnoreRules
+
+#Config
+import clippy.config as cfg # noqa: F401
+
+class DirSnapshot:
+    """
+    A listing of a course's local folder and of each of its subfolders, read once with os.scandir,
+    so the sync decisions for the course don't need a stat call per file (a network round-trip on NFS).
+
+    Each file's size and mtime are read from its directory entry the first time they're needed, and kept.
+
+    Args:
+        path (Path): The course's folder.
+        rules (IgnoreRules, optional): The files to leave out of the counts.
+
+    Methods:
+        count_files() -> dict:
+            Count the files in each subfolder.
+        stat(path: Path) -> (int, float), None:
+            Get the size and mtime of a file in one of the subfolders.
+        ignored(path: Path) -> bool:
+            Check if a file is ignored by the rules.
+
+    Usage:
+        snapshot = DirSnapshot(course_path)
+        counts = snapshot.count_files()
+        size, mtime = snapshot.stat(course_path / category / name)
+    """
+    __slots__ = ("path", "rules", "folders")
+
+    def __init__(self, path: Path, rules: IgnoreRules = None):
+        """
+        Initialize a DirSnapshot instance by listing a folder and its subfolders.
+        """
+        self.path = path
+        self.rules = rules
+        self.folders = {} # subfolder name -> {file name -> os.DirEntry}
+        try:
+            with os.scandir(path) as folders:
+                for folder in folders:
+                    if folder.is_dir():
+                        with os.scandir(folder.path) as entries:
+                            self.folders[folder.name] = {entry.name: entry for entry in entries if entry.is_file()}
+        except FileNotFoundError:
+            pass
+
+    def count_files(self) -> dict:
+        """
+        Count the files in each subfolder, ignoring hidden files and the files ignored by the rules.
+
+        Returns:
+            dict: Each subfolder's name (key) and their respective files count (value).
+        """
+        return {folder: sum(1 for name in entries if not name.startswith('.') and not self.ignored(self.path / folder / name))
+                for folder, entries in self.folders.items()}
+
+    def ignored(self, path: Path) -> bool:
+        """
+        Check if a file is ignored by the rules.
+
+        Args:
+            path (Path): The path of the file.
+        """
+        return bool(self.rules) and self.rules.ignored(path)
+
+    def stat(self, path: Path):
+        """
+        Get the size and modification time of a file.
+        Files outside the snapshot's subfolders are looked up on disk.
+
+        Args:
+            path (Path): The path of the file.
+
+        Returns:
+            (int, float): The size in bytes and the mtime (epoch), or None if the file does not exist.
+        """
+        try:
+            if path.parent.parent == self.path:
+                entry = self.folders.get(path.parent.name, {}).get(path.name)
+                if entry is None:
+                    return None
+                stat = entry.stat() # cached by the entry
+            else:
+                stat = os.stat(path)
+        except FileNotFoundError: # deleted since the snapshot was taken
+            return None
+        return stat.st_size, stat.st_mtime
@@ -0,0 +1,79 @@
+import asyncio
+import bisect
+import itertools
+
+class DownloadQueue:
+    """
+    A bounded asyncio queue of files to download, kept sorted by their expected size, so each worker
+    can take either the smallest file waiting (fast visible progress) or the largest one (so big files
+    don't all start at the end of the run). Files of the same size come out in the order they were added.
+
+    Args:
+        maxsize (int): The maximum number of files waiting; put() waits while the queue is full (0 for unbounded).
+
+    Methods:
+        put(item, size: int = 0):
+            Add a file, waiting while the queue is full.
+        get(largest: bool = False):
+            Take the smallest (or largest) file, waiting until there is one. Returns None once the queue is closed and empty.
+        close():
+            Mark that no more files will be added.
+
+    Usage:
+        queue = DownloadQueue(256)
+        await queue.put(file, file.size)  # Called by the scrapers
+        file = await queue.get()          # Called by each download worker, until it returns None
+        await queue.close()               # Once every file was added
+    """
+
+    def __init__(self, maxsize: int = 0):
+        """
+        Initialize an empty DownloadQueue instance (inside the running event loop).
+        """
+        self.maxsize = maxsize
+        self.items = [] # (size, order, item), sorted
+        self.order = itertools.count()
+        self.closed = False
+        self.changed = asyncio.Condition()
+
+    def __len__(self):
+        return len(self.items)
+
+    async def put(self, item, size: int = 0):
+        """
+        Add a file to the queue, waiting while it is full.
+
+        Args:
+            item: The file.
+            size (int): Its expected size in bytes.
+        """
+        async with self.changed:
+            await self.changed.wait_for(lambda: self.maxsize <= 0 or len(self.items) < self.maxsize)
+            bisect.insort(self.items, (size, next(self.order), item))
+            self.changed.notify_all()
+
+    async def get(self, largest: bool = False):
+        """
+        Take a file from the queue, waiting until there is one.
+
+        Args:
+            largest (bool): Take the largest file waiting instead of the smallest.
+
+        Returns:
+            The file, or None if the queue was closed and every file was taken.
+        """
+        async with self.changed:
+            await self.changed.wait_for(lambda: self.items or self.closed)
+            if not self.items:
+                return None
+            _, _, item = self.items.pop(-1 if largest else 0)
+            self.changed.notify_all()
+            return item
+
+    async def close(self):
+        """
+        Mark that no more files will be added, so get() returns None once the queue is empty.
+        """
+        async with self.changed:
+            self.closed = True
+            self.changed.notify_all()
@@ -1,65 +1,113 @@
-from bs4 import BeautifulSoup as bs
+import re
+import time
+from datetime import datetime
+from functools import lru_cache
+
 from .ClipFile import ClipFile
 
 #Config
 import clippy.config as cfg
 
+SIZE = re.compile(r"(\d+)\s*(B|Kb|Mb|Gb|Tb)$")
+SIZE_FACTORS = {"B": 1, "Kb": 1024, "Mb": 1024**2, "Gb": 1024**3, "Tb": 1024**4}
+
+@lru_cache(maxsize=4096)
+def decode_date(date: str) -> float:
+    """
+    Convert a date from CLIP's tables, e.g. "2023-10-05 14:32" in local time, to an epoch timestamp.
+    The fixed format is sliced directly instead of going through datetime.strptime, and the result is
+    cached since many files share the same date.
+
+    Args:
+        date (str): The date string.
+
+    Returns:
+        float: The timestamp.
+    """
+    if len(date) != 16 or date[4] != "-" or date[7] != "-" or date[10] != " " or date[13] != ":":
+        return datetime.strptime(date, "%Y-%m-%d %H:%M").timestamp() # raises ValueError if it isn't a date
+    return time.mktime((int(date[0:4]), int(date[5:7]), int(date[8:10]), int(date[11:13]), int(date[14:16]), 0, 0, 0, -1))
+
 class FilesList:
     """
     Represents a subcategory of documents, that are displayed in CLIP as a table of downloadable files.
-    Returns an array of ClipFile objects, one for each file in the table.
+    The table is stored in columns (names, links, epoch mtimes, sizes and teachers) and yields a
+    ClipFile object for each file when iterated.
 
     Args:
-        html (bs): Beautiful Soup object containing the HTML content of the table.
+        rows ([[str]]): The name, link, date, size and teacher of each row of the table.
 
     Methods:
+        from_columns(columns: dict) -> FilesList:
+            Initialize a FilesList instance from previously parsed columns.
+        columns() -> dict:
+            Get the table's columns, e.g. to store them.
         convert_str_to_byte(size: str) -> int:
             Convert a human-readable size string to bytes.
 
+    Usage:
+        table = FilesList(extract_files(html_content))
+        for file in table:
+            print(file.name, file.size)
     """
 
-    def __new__(cls, html: bs) -> [ClipFile]:
+    def __init__(self, rows: [[str]]):
         """
-        Create an array of ClipFile instances based on a subcategory's table.
+        Initialize a FilesList instance based on the rows of a subcategory's table, in a single pass.
 
         Args:
-            html (bs): Beautiful Soup object containing the HTML content of the table.
+            rows ([[str]]): The name, link, date, size and teacher of each row of the table.
+        """
+        self.names, self.links, self.mtimes, self.sizes, self.teachers = [], [], [], [], []
+        for name, href, date, size, teacher in rows:
+            self.names.append(name)
+            self.links.append(href) # relative to cfg.domain
+            self.mtimes.append(decode_date(date))
+            self.sizes.append(self.convert_str_to_byte(size))
+            self.teachers.append(teacher)
+
+    @classmethod
+    def from_columns(cls, columns: dict):
+        """
+        Initialize a FilesList instance from previously parsed columns.
+
+        Args:
+            columns (dict): The names, links, mtimes, sizes and teachers lists, as returned by columns().
+        """
+        obj = cls.__new__(cls)
+        obj.names, obj.links, obj.mtimes, obj.sizes, obj.teachers = (
+            columns["names"], columns["links"], columns["mtimes"], columns["sizes"], columns["teachers"])
+        return obj
+
+    def columns(self) -> dict:
+        """
+        Get the table's columns.
 
         Returns:
-            [ClipFile]: An array of ClipFile instances.
+            dict: The names, links (relative to the domain), epoch mtimes, sizes and teachers lists.
         """
-        flist = []
-        table = html.find('th', string='Documentos').find_parent('table')
-        for row in table.find_all("tr", {'bgcolor': True}):
-            columns = row.find_all("td")
-
-            if columns != []:
-                name = columns[0].text.strip()
-                link = cfg.domain + columns[1].find("a").get("href")
-                date = columns[2].text.strip()
-                size = cls.convert_str_to_byte(columns[3].text.strip())
-                teacher = columns[4].text.strip()
-
-                file = ClipFile(name,link,date,size,teacher)
-
-                flist.append(file)
-        
-        return flist
-    
+        return {"names": self.names, "links": self.links, "mtimes": self.mtimes, "sizes": self.sizes, "teachers": self.teachers}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        domain = cfg.domain
+        for name, href, mtime, size, teacher in zip(self.names, self.links, self.mtimes, self.sizes, self.teachers):
+            yield ClipFile(name, domain + href, mtime, size, teacher)
+
+    @staticmethod
     def convert_str_to_byte(size: str) -> int:
         """
         Convert a human-readable size string to bytes.
 
         Args:
-            size (str): The size string, e.g., "1.2 MB".
+            size (str): The size string, e.g., "120 Kb".
 
         Returns:
             int: The size in bytes.
         """
-        size_name = ("B", "Kb", "Mb", "Gb", "Tb")
-        # divide '1 GB' into ['1', 'GB']
-        num, unit = int(size[:-2]), size[-2:]
-        idx = size_name.index(unit)        # index in list of sizes determines power to raise it to
-        factor = 1024 ** idx
-        num += 1 # Hack to get the right size since the size in the html table actually rounds it wrong
-        return num * factor
\ No newline at end of file
+        num, unit = SIZE.match(size).groups()
+        if unit == "B":
+            return int(num)
+        return (int(num) + 1) * SIZE_FACTORS[unit] # Hack to get the right size since the size in the html table actually rounds it wrong
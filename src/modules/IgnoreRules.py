@@ -0,0 +1,83 @@
+import fnmatch
+import os
+from functools import lru_cache
+from pathlib import Path
+
+#Config
+import clippy.config as cfg
+
+class IgnoreRules:
+    """
+    The files Clippy leaves alone in a CLIP folder, from the glob patterns in its .clippyignore file
+    (one per line, "#" starts a comment). A pattern with a "/" is matched against the path relative to the
+    CLIP folder, e.g. "2024/*/Vídeos/*"; any other against the file name, e.g. "*.mp4". Ignored files are
+    never downloaded nor counted, so files the user added or deleted on purpose don't trigger a sync.
+
+    Args:
+        root (Path): The CLIP folder.
+        patterns ([str]): The glob patterns.
+
+    Methods:
+        load(root: Path) -> IgnoreRules:
+            Read the rules of a CLIP folder (cached until the file changes).
+        ignored(path: Path) -> bool:
+            Check if a file is ignored.
+
+    Usage:
+        rules = IgnoreRules.load(path)
+        if not rules.ignored(path / "2024" / "1S" / course / category / name):
+            ...
+    """
+    __slots__ = ("root", "names", "paths")
+
+    def __init__(self, root: Path, patterns: [str] = ()):
+        """
+        Initialize an IgnoreRules instance.
+        """
+        self.root = root
+        self.names = [pattern for pattern in patterns if "/" not in pattern]
+        self.paths = [pattern.strip("/") for pattern in patterns if "/" in pattern]
+
+    @classmethod
+    def load(cls, root: Path):
+        """
+        Read the rules of a CLIP folder from its .clippyignore file, if there is one.
+
+        Args:
+            root (Path): The CLIP folder.
+        """
+        try:
+            mtime = os.stat(root / cfg.IGNORE_FILE).st_mtime
+        except FileNotFoundError:
+            return cls(root)
+        return cls.parse(root, mtime)
+
+    @classmethod
+    @lru_cache(maxsize=8)
+    def parse(cls, root: Path, mtime: float):
+        """
+        Read a .clippyignore file (cached by its modification time).
+        """
+        with open(root / cfg.IGNORE_FILE, 'r', encoding="utf-8") as ignore_file:
+            lines = (line.strip() for line in ignore_file)
+            return cls(root, [line for line in lines if line and not line.startswith("#")])
+
+    def __bool__(self):
+        return bool(self.names or self.paths)
+
+    def ignored(self, path: Path) -> bool:
+        """
+        Check if a file is ignored.
+
+        Args:
+            path (Path): The path of the file.
+        """
+        if any(fnmatch.fnmatchcase(path.name, pattern) for pattern in self.names):
+            return True
+        if self.paths:
+            try:
+                relative = path.relative_to(self.root).as_posix()
+            except ValueError: # outside the CLIP folder
+                return False
+            return any(fnmatch.fnmatchcase(relative, pattern) for pattern in self.paths)
+        return False
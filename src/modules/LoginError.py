@@ -1,6 +1,3 @@
-import logging as log
-from handlers.creds_handler import reset_login
-
 class LoginError(Exception):
     """
     Raised when the login fails.
@@ -9,5 +6,4 @@ class LoginError(Exception):
         message (str): A custom error message (optional).
     """
     def __init__(self, message="Erro de login"):
-        reset_login()
-        log.error(message)
\ No newline at end of file
+        super().__init__(message)
@@ -0,0 +1,9 @@
+class SessionExpiredError(Exception):
+    """
+    Raised when CLIP answers with its login page because the session expired.
+
+    Args:
+        message (str): A custom error message (optional).
+    """
+    def __init__(self, message="A sessão no CLIP expirou."):
+        super().__init__(message)
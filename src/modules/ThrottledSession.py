@@ -0,0 +1,45 @@
+import time
+from requests import Session
+
+from .AdaptiveLimiter import AdaptiveLimiter
+from .TokenBucket import TokenBucket
+
+class ThrottledSession(Session):
+    """
+    A requests Session shared by every worker, which adapts its concurrency to the server's load
+    and optionally caps the request rate and the download speed.
+
+    Args:
+        limiter (AdaptiveLimiter): The concurrency limiter.
+        bucket (TokenBucket): The request rate limiter (optional).
+        timeout (float): The default timeout of each request, in seconds.
+        bandwidth (TokenBucket): The download speed limiter, in bytes per second (optional), taken by whoever reads the response bodies.
+    """
+
+    def __init__(self, limiter: AdaptiveLimiter, bucket: TokenBucket = None, timeout: float = None, bandwidth: TokenBucket = None):
+        """
+        Initialize a ThrottledSession instance.
+        """
+        super().__init__()
+        self.limiter = limiter
+        self.bucket = bucket
+        self.timeout = timeout
+        self.bandwidth = bandwidth
+
+    def request(self, method, url, *args, **kwargs):
+        """
+        Send a request once the rate and concurrency limits allow it, and feed its outcome back to the limiter.
+        Streamed responses free their slot as soon as the headers arrive.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        if self.bucket is not None:
+            self.bucket.acquire()
+        self.limiter.acquire()
+        start = time.perf_counter()
+        ok = False
+        try:
+            response = super().request(method, url, *args, **kwargs)
+            ok = response.status_code < 500
+            return response
+        finally: # exceptions (timeouts, connection errors) count as failures
+            self.limiter.release(time.perf_counter() - start, ok)
@@ -0,0 +1,46 @@
+import threading
+import time
+
+class TokenBucket:
+    """
+    A thread-safe token bucket, used to cap the rate of an operation (e.g. requests or bytes per second).
+
+    Args:
+        rate (float): The number of tokens added per second.
+        capacity (float): The maximum number of tokens the bucket holds, i.e. the largest burst (defaults to one second's worth).
+
+    Methods:
+        acquire(tokens: float = 1):
+            Take tokens from the bucket, waiting until they are available.
+
+    Usage:
+        bucket = TokenBucket(5)  # 5 requests per second
+        bucket.acquire()         # Blocks if the rate was exceeded
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        """
+        Initialize a full TokenBucket instance.
+        """
+        self.rate = rate
+        self.capacity = max(capacity if capacity is not None else rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1):
+        """
+        Take tokens from the bucket, waiting until they are available.
+        Requests larger than the capacity are allowed; they leave the bucket in debt instead.
+
+        Args:
+            tokens (float): The number of tokens to take.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= tokens # reserve the tokens now, so waiting threads queue up in order
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
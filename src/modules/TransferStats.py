@@ -0,0 +1,83 @@
+import threading
+from pathlib import Path
+
+#Config
+import clippy.config as cfg # noqa: F401
+
+class TransferStats:
+    """
+    Statistics of the downloads made in a run, built from the bytes the download workers actually write.
+
+    Methods:
+        add(path: Path, size: int, start: float, end: float):
+            Record a finished download.
+        elapsed() -> float:
+            Get the time spent downloading, from the first download's start to the last one's end.
+        throughput() -> float:
+            Get the average download speed in bytes per second.
+
+    Args:
+        durations (bool): Keep the size and duration of each download, and not only the totals.
+
+    Usage:
+        stats = TransferStats()
+        stats.add(path, size, start, end)  # Called by each download worker
+        print(stats.bytes, stats.files, stats.throughput())
+    """
+
+    def __init__(self, durations: bool = True):
+        """
+        Initialize an empty TransferStats instance.
+        """
+        self.lock = threading.Lock()
+        self.bytes = 0
+        self.files = 0
+        self.durations = {} if durations else None # path -> (bytes, seconds)
+        self.start = None
+        self.end = None
+
+    def add(self, path: Path, size: int, start: float, end: float):
+        """
+        Record a finished download. Safe to call from several threads.
+
+        Args:
+            path (Path): The path of the downloaded file.
+            size (int): The number of bytes transferred.
+            start (float): The time the download started (time.perf_counter()).
+            end (float): The time the download ended (time.perf_counter()).
+        """
+        with self.lock:
+            self.bytes += size
+            self.files += 1
+            if self.durations is not None:
+                self.durations[path] = (size, end - start)
+            self.start = start if self.start is None else min(self.start, start)
+            self.end = end if self.end is None else max(self.end, end)
+
+    def elapsed(self) -> float:
+        """
+        Get the time spent downloading, from the first download's start to the last one's end.
+
+        Returns:
+            float: The time in seconds.
+        """
+        return 0.0 if self.start is None else self.end - self.start
+
+    def throughput(self) -> float:
+        """
+        Get the average download speed of the run.
+
+        Returns:
+            float: The speed in bytes per second.
+        """
+        elapsed = self.elapsed()
+        return self.bytes / elapsed if elapsed > 0 else 0.0
+
+    def __str__(self):
+        """
+        Get a string representation of the TransferStats instance.
+
+        Returns:
+            str: A string representation of the TransferStats instance.
+        """
+        return f"{self.files} ficheiros, {self.bytes} bytes em {self.elapsed():.3f}s"
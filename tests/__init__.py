@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# The tests import Clippy's modules from the source tree, as the CLI does
+SRC = Path(__file__).resolve().parent.parent / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
@@ -0,0 +1,61 @@
+import contextvars
+
+import clippy.config as cfg
+
+"""
+Stand-ins for the HTTP session and its responses, shared by the tests of the modules that make requests.
+"""
+
+class FakeResponse:
+    def __init__(self, status_code: int, text: str = "", headers: dict = None, body: bytes = b"", url: str = None):
+        self.status_code = status_code
+        self.text = text
+        self.body = body
+        self.headers = headers or {}
+        self.url = url
+        self.closed = False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.body), chunk_size):
+            yield self.body[start:start + chunk_size]
+
+    def close(self):
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class FakeSession:
+    """
+    Records every request and answers it with respond(), implemented by each test's session.
+    """
+    bandwidth = None
+
+    def __init__(self):
+        self.requests = [] # headers of each request
+        self.responses = []
+
+    def respond(self, url: str, headers: dict) -> FakeResponse:
+        raise NotImplementedError
+
+    def get(self, url, stream=False, headers=None):
+        headers = headers or {}
+        self.requests.append(headers)
+        response = self.respond(url, headers)
+        self.responses.append(response)
+        return response
+
+def in_session(session, function, *args, **kwargs):
+    """
+    Call a function with a session as the one of the current context, like a worker of that session's user.
+    """
+    def run():
+        cfg.use_session(session)
+        return function(*args, **kwargs)
+    return contextvars.copy_context().run(run)
@@ -0,0 +1,76 @@
+import hashlib
+import os
+import unittest
+from unittest import mock
+
+from handlers import blob_store, manifest
+from tests.test_manifest import ManifestTestCase
+
+CONTENT = b"%PDF exame de 2023"
+HASH = hashlib.sha256(CONTENT).hexdigest()
+URL = "https://clip.example/objecto?oid=42&oin=exame.pdf"
+MTIME = 1700000000.0
+
+class TestBlobStore(ManifestTestCase):
+
+    def setUp(self):
+        super().setUp()
+        blob_store.enable(self.root)
+        self.addCleanup(setattr, blob_store, "store_path", None)
+        self.first = self.path()
+        self.second = self.root / "2025" / "1S" / "Álgebra Linear" / "Testes e exames" / "exame.pdf"
+
+    def download(self):
+        self.first.parent.mkdir(parents=True, exist_ok=True)
+        self.first.write_bytes(CONTENT)
+        blob_store.add(self.first, URL, len(CONTENT), MTIME)
+
+    def test_hint_is_the_object_id(self):
+        self.assertEqual(blob_store.hint(URL), "42")
+        self.assertEqual(blob_store.hint("https://clip.example/ficheiro?x=1"), "/ficheiro?x=1")
+
+    def test_downloaded_file_is_stored(self):
+        self.download()
+        self.assertEqual(blob_store.blob_path(HASH).read_bytes(), CONTENT)
+        self.assertEqual(self.first.read_bytes(), CONTENT)
+        self.assertEqual(manifest.lookup_blob("exame.pdf", len(CONTENT), "42"), HASH)
+
+    def test_known_file_is_linked_instead_of_downloaded(self):
+        self.download()
+        self.assertEqual(blob_store.link_known(self.second, URL, len(CONTENT), MTIME), HASH)
+        self.assertEqual(self.second.read_bytes(), CONTENT)
+        self.assertGreaterEqual(os.stat(self.second).st_mtime, MTIME)
+
+    def test_unknown_file_has_to_be_downloaded(self):
+        self.download()
+        self.assertIsNone(blob_store.link_known(self.second, URL, len(CONTENT) + 1, MTIME))
+        self.assertFalse(self.second.exists())
+
+    def test_changed_blob_is_dropped(self):
+        self.download()
+        blob = blob_store.blob_path(HASH)
+        blob.unlink() # the folder's copy is a hardlink, edit the store's copy alone
+        blob.write_bytes(b"editado")
+        self.assertIsNone(blob_store.link_known(self.second, URL, len(CONTENT), MTIME))
+        self.assertFalse(blob.exists())
+        self.assertIsNone(manifest.lookup_blob("exame.pdf", len(CONTENT), "42"))
+
+    def test_falls_back_to_a_copy(self):
+        self.download()
+        with mock.patch.object(blob_store, "reflink", side_effect=OSError), \
+             mock.patch.object(blob_store.os, "link", side_effect=OSError):
+            self.assertEqual(blob_store.link_known(self.second, URL, len(CONTENT), MTIME), HASH)
+        self.assertEqual(self.second.read_bytes(), CONTENT)
+        self.assertNotEqual(os.stat(self.second).st_ino, os.stat(blob_store.blob_path(HASH)).st_ino)
+        self.assertEqual(os.stat(self.second).st_mtime, MTIME)
+
+    def test_same_content_elsewhere_becomes_a_link(self):
+        self.download()
+        self.second.parent.mkdir(parents=True)
+        self.second.write_bytes(CONTENT)
+        with mock.patch.object(blob_store, "reflink", side_effect=OSError):
+            blob_store.add(self.second, "https://clip.example/objecto?oid=43", len(CONTENT), MTIME)
+        self.assertEqual(os.stat(self.second).st_ino, os.stat(blob_store.blob_path(HASH)).st_ino)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from modules.DirSnapshot import DirSnapshot
+from modules.IgnoreRules import IgnoreRules
+
+class TestDirSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.course = Path(self.temp_dir.name) / "Álgebra Linear"
+        self.folder = self.course / "Testes e exames"
+        self.folder.mkdir(parents=True)
+        for name in ("exame.pdf", "teste.pdf", ".exame.pdf.1.part"):
+            (self.folder / name).write_bytes(b"abc")
+
+    def test_listing(self):
+        snapshot = DirSnapshot(self.course)
+        self.assertEqual(snapshot.count_files(), {"Testes e exames": 2}) # without hidden files
+        self.assertEqual(snapshot.stat(self.folder / "exame.pdf"), (3, (self.folder / "exame.pdf").stat().st_mtime))
+        self.assertIsNone(snapshot.stat(self.folder / "outro.pdf"))
+        self.assertEqual(DirSnapshot(self.course / "nenhuma").count_files(), {})
+
+    def test_ignored_files_arent_counted(self):
+        snapshot = DirSnapshot(self.course, IgnoreRules(Path(self.temp_dir.name), ["teste.pdf"]))
+        self.assertEqual(snapshot.count_files(), {"Testes e exames": 1})
+        self.assertTrue(snapshot.ignored(self.folder / "teste.pdf"))
+
+    def test_deleted_file_is_missing(self):
+        snapshot = DirSnapshot(self.course)
+        (self.folder / "exame.pdf").unlink()
+        self.assertIsNone(snapshot.stat(self.folder / "exame.pdf"))
+
+    def test_next_snapshot_sees_the_changes(self):
+        # Each scan of a course (e.g. each check of watch mode) lists the folder again
+        self.assertEqual(DirSnapshot(self.course).count_files(), {"Testes e exames": 2})
+        (self.folder / "exame.pdf").unlink()
+        (self.folder / "novo.pdf").write_bytes(b"abcd")
+        (self.course / "Material").mkdir()
+        snapshot = DirSnapshot(self.course)
+        self.assertEqual(snapshot.count_files(), {"Testes e exames": 2, "Material": 0})
+        self.assertIsNone(snapshot.stat(self.folder / "exame.pdf"))
+        self.assertEqual(snapshot.stat(self.folder / "novo.pdf")[0], 4)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import asyncio
+import unittest
+
+from modules.DownloadQueue import DownloadQueue
+
+class TestDownloadQueue(unittest.IsolatedAsyncioTestCase):
+
+    async def fill(self, queue, sizes):
+        for n, size in enumerate(sizes):
+            await queue.put(f"f{n}", size)
+
+    async def test_smallest_and_largest_first(self):
+        queue = DownloadQueue()
+        await self.fill(queue, [30, 10, 50, 20])
+        self.assertEqual(await queue.get(), "f1")
+        self.assertEqual(await queue.get(largest=True), "f2")
+        self.assertEqual(await queue.get(), "f3")
+        self.assertEqual(len(queue), 1)
+
+    async def test_same_size_keeps_the_order_added(self):
+        queue = DownloadQueue()
+        await self.fill(queue, [5, 5, 5])
+        self.assertEqual([await queue.get() for _ in range(3)], ["f0", "f1", "f2"])
+
+    async def test_put_waits_while_full(self):
+        queue = DownloadQueue(2)
+        await self.fill(queue, [1, 2])
+        put = asyncio.ensure_future(queue.put("f2", 3))
+        await asyncio.sleep(0.01)
+        self.assertFalse(put.done())
+        self.assertEqual(await queue.get(), "f0")
+        await asyncio.wait_for(put, 1)
+        self.assertEqual(len(queue), 2)
+
+    async def test_get_returns_none_once_closed_and_empty(self):
+        queue = DownloadQueue()
+        await self.fill(queue, [1])
+        waiting = asyncio.ensure_future(queue.get())
+        self.assertEqual(await waiting, "f0")
+        waiting = asyncio.ensure_future(queue.get())
+        await asyncio.sleep(0.01)
+        self.assertFalse(waiting.done())
+        await queue.close()
+        self.assertIsNone(await asyncio.wait_for(waiting, 1))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import hashlib
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from handlers.download_writer import part_path, write_download
+from tests.fakes import FakeResponse, FakeSession, in_session
+
+CONTENT = bytes(range(256)) * 40 # 10 KB
+MTIME = 1700000000.0
+
+class FileSession(FakeSession):
+    """
+    Serves CONTENT, honouring Range requests unless told otherwise.
+
+    Args:
+        ranges (bool): Answer Range requests with 206 (False to answer them with 416).
+        truncate (int): Send only this many bytes of the body, with the full Content-Length.
+        content_range (str): A wrong Content-Range to answer Range requests with.
+    """
+    def __init__(self, ranges: bool = True, truncate: int = None, content_range: str = None):
+        super().__init__()
+        self.ranges = ranges
+        self.truncate = truncate
+        self.content_range = content_range
+
+    def respond(self, url, headers):
+        if "Range" in headers:
+            offset = int(headers["Range"][len("bytes="):-1])
+            if not self.ranges:
+                return FakeResponse(416)
+            body = CONTENT[offset:]
+            return FakeResponse(206, headers={"Content-Length": str(len(body)),
+                                              "Content-Range": self.content_range or f"bytes {offset}-{len(CONTENT) - 1}/{len(CONTENT)}"}, body=body)
+        return FakeResponse(200, headers={"Content-Length": str(len(CONTENT))}, body=CONTENT[:self.truncate])
+
+class TestWriteDownload(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = Path(self.folder.name) / "Cadeira" / "Categoria" / "exame.pdf"
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def download(self, session, **kwargs):
+        return in_session(session, write_download, self.path, "https://clip.example/objecto?oid=1", MTIME, chunk_size=1000, **kwargs)
+
+    def leave_part(self, size: int, content: bytes = CONTENT):
+        part = part_path(self.path, MTIME)
+        part.parent.mkdir(parents=True, exist_ok=True)
+        part.write_bytes(content[:size])
+        return part
+
+    def test_downloads_to_the_final_path(self):
+        digest = hashlib.sha256()
+        self.assertEqual(self.download(FileSession(), digest=digest), len(CONTENT))
+        self.assertEqual(self.path.read_bytes(), CONTENT)
+        self.assertEqual(os.stat(self.path).st_mtime, MTIME)
+        self.assertEqual(digest.hexdigest(), hashlib.sha256(CONTENT).hexdigest())
+        self.assertFalse(part_path(self.path, MTIME).exists())
+
+    def test_resumes_a_partial_download(self):
+        self.leave_part(4000)
+        digest = hashlib.sha256()
+        progress = []
+        self.assertEqual(self.download(FileSession(), digest=digest, progress=progress.append), len(CONTENT) - 4000)
+        self.assertEqual(self.path.read_bytes(), CONTENT)
+        self.assertEqual(sum(progress), len(CONTENT))
+        self.assertEqual(digest.hexdigest(), hashlib.sha256(CONTENT).hexdigest()) # the resumed part is hashed too
+
+    def test_starts_over_if_the_server_rejects_the_range(self):
+        self.leave_part(4000, b"x" * 4000)
+        session = FileSession(ranges=False)
+        self.assertEqual(self.download(session), len(CONTENT))
+        self.assertEqual(self.path.read_bytes(), CONTENT)
+        self.assertTrue(all(response.closed for response in session.responses))
+
+    def test_short_download_is_kept_to_resume(self):
+        session = FileSession(truncate=3000)
+        with self.assertRaises(IOError):
+            self.download(session)
+        self.assertFalse(self.path.exists())
+        self.assertEqual(part_path(self.path, MTIME).read_bytes(), CONTENT[:3000])
+        self.assertTrue(session.responses[0].closed)
+
+        self.download(FileSession())
+        self.assertEqual(self.path.read_bytes(), CONTENT)
+
+    def test_mismatched_range_is_closed_and_fails(self):
+        from requests import HTTPError
+        self.leave_part(4000)
+        session = FileSession(content_range="bytes 0-10239/10240")
+        with self.assertRaises(HTTPError):
+            self.download(session)
+        self.assertTrue(session.responses[0].closed)
+
+    def test_partial_download_of_another_version_is_removed(self):
+        stale = part_path(self.path, MTIME - 100)
+        stale.parent.mkdir(parents=True, exist_ok=True)
+        stale.write_bytes(b"old")
+        self.download(FileSession())
+        self.assertFalse(stale.exists())
+
+    def test_partial_downloads_are_matched_by_the_literal_name(self):
+        self.path = self.path.with_name("exame [v2].pdf")
+        stale = part_path(self.path, MTIME - 100)
+        other = part_path(self.path.with_name("exame v.pdf"), MTIME) # matched by [v2] as a pattern
+        stale.parent.mkdir(parents=True, exist_ok=True)
+        for part in (stale, other):
+            part.write_bytes(b"old")
+        self.download(FileSession())
+        self.assertFalse(stale.exists())
+        self.assertTrue(other.exists())
+        self.assertEqual(self.path.read_bytes(), CONTENT)
+
+if __name__ == "__main__":
+    unittest.main()
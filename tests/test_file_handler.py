@@ -0,0 +1,87 @@
+import os
+import unittest
+
+from modules.ClipFile import ClipFile
+from modules.DirSnapshot import DirSnapshot
+from handlers import manifest
+from modules.IgnoreRules import IgnoreRules
+from handlers.file_handler import get_file, reconcile
+import clippy.config as cfg
+from tests.test_manifest import ManifestTestCase
+
+MTIME = 1700000000.0
+
+class TestGetFile(ManifestTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.course = self.path().parent.parent
+        self.folder = self.path().parent
+        self.folder.mkdir(parents=True)
+        self.file = ClipFile("exame.pdf", "https://clip.example/1", MTIME, 3, "Docente")
+
+    def write(self, mtime: float = MTIME):
+        self.path().write_bytes(b"pdf")
+        os.utime(self.path(), (mtime, mtime))
+
+    def test_missing_file_is_downloaded(self):
+        self.assertEqual(get_file(self.file, self.folder, snapshot=DirSnapshot(self.course)),
+                         (self.path(), "https://clip.example/1", 3, MTIME))
+
+    def test_file_in_place_is_recorded(self):
+        self.write()
+        self.assertIsNone(get_file(self.file, self.folder, snapshot=DirSnapshot(self.course)))
+        manifest.commit()
+        self.assertEqual(manifest.lookup(self.path())[:3], ("https://clip.example/1", 3, MTIME))
+
+    def test_outdated_file_is_downloaded(self):
+        self.write(MTIME - 100)
+        self.assertIsNotNone(get_file(self.file, self.folder, snapshot=DirSnapshot(self.course)))
+
+    def test_recorded_file_isnt_looked_up(self):
+        manifest.record(self.path(), "https://clip.example/1", 3, MTIME, 3, MTIME)
+        manifest.commit()
+        self.write(MTIME - 100) # only the manifest is trusted
+        self.assertIsNone(get_file(self.file, self.folder, snapshot=DirSnapshot(self.course)))
+
+    def test_recorded_file_deleted_since_is_downloaded(self):
+        manifest.record(self.path(), "https://clip.example/1", 3, MTIME, 3, MTIME)
+        manifest.commit()
+        self.assertEqual(get_file(self.file, self.folder, snapshot=DirSnapshot(self.course)),
+                         (self.path(), "https://clip.example/1", 3, MTIME))
+
+class TestReconcile(ManifestTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.course = self.path().parent.parent
+        self.folder = self.path().parent
+        self.folder.mkdir(parents=True)
+        for name in ("exame.pdf", "teste.pdf", "aula.mp4"):
+            manifest.record(self.path(name), "https://clip.example/" + name, 3, MTIME, 3, MTIME)
+        manifest.commit()
+
+    def write(self, name: str, mtime: float = MTIME):
+        self.path(name).write_bytes(b"pdf")
+        os.utime(self.path(name), (mtime, mtime))
+
+    def test_files_in_place_arent_downloaded(self):
+        for name in ("exame.pdf", "teste.pdf", "aula.mp4"):
+            self.write(name)
+        self.assertEqual(reconcile(self.folder, DirSnapshot(self.course)), (3, []))
+
+    def test_missing_and_outdated_files_are_downloaded(self):
+        self.write("exame.pdf", MTIME - 100)
+        self.write("aula.mp4")
+        self.assertEqual(reconcile(self.folder, DirSnapshot(self.course)),
+                         (3, [(self.path("exame.pdf"), "https://clip.example/exame.pdf", 3, MTIME),
+                              (self.path("teste.pdf"), "https://clip.example/teste.pdf", 3, MTIME)]))
+
+    def test_ignored_files_arent_downloaded(self):
+        (self.root / cfg.IGNORE_FILE).write_text("*.mp4\n", encoding="utf-8")
+        self.write("exame.pdf")
+        self.write("teste.pdf")
+        self.assertEqual(reconcile(self.folder, DirSnapshot(self.course, IgnoreRules.load(self.root))), (3, []))
+
+if __name__ == "__main__":
+    unittest.main()
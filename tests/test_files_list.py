@@ -0,0 +1,67 @@
+import os
+import time
+import unittest
+from datetime import datetime, timedelta
+
+import clippy.config as cfg
+from modules.FilesList import FilesList, decode_date
+
+ROWS = [
+    ["exame.pdf", "/objecto?oid=1", "2023-10-05 14:32", "120 Kb", "Docente A"],
+    ["notas.txt", "/objecto?oid=2", "2024-03-31 01:30", "512 B", "Docente B"],
+]
+
+@unittest.skipUnless(hasattr(time, "tzset"), "time zones can only be changed on Unix")
+class TestDecodeDate(unittest.TestCase):
+
+    def setUp(self):
+        # Portugal's time zone, so dates around its daylight saving changes are covered
+        self.saved_tz = os.environ.get("TZ")
+        os.environ["TZ"] = "Europe/Lisbon"
+        time.tzset()
+        decode_date.cache_clear()
+
+    def tearDown(self):
+        if self.saved_tz is None:
+            os.environ.pop("TZ", None)
+        else:
+            os.environ["TZ"] = self.saved_tz
+        time.tzset()
+        decode_date.cache_clear()
+
+    def test_matches_strptime(self):
+        start = datetime(2023, 3, 24)
+        for hours in range(0, 24 * 240, 7): # around both daylight saving changes of 2023
+            date = (start + timedelta(hours=hours, minutes=hours % 60)).strftime("%Y-%m-%d %H:%M")
+            self.assertEqual(decode_date(date), datetime.strptime(date, "%Y-%m-%d %H:%M").timestamp(), date)
+
+    def test_other_formats_fall_back_to_strptime(self):
+        self.assertEqual(decode_date("2023-1-05 14:32"), datetime(2023, 1, 5, 14, 32).timestamp())
+        with self.assertRaises(ValueError):
+            decode_date("ontem")
+
+class TestFilesList(unittest.TestCase):
+
+    def test_convert_str_to_byte(self):
+        self.assertEqual(FilesList.convert_str_to_byte("512 B"), 512)
+        self.assertEqual(FilesList.convert_str_to_byte("0 B"), 0)
+        self.assertEqual(FilesList.convert_str_to_byte("120 Kb"), 121 * 1024) # CLIP rounds down
+        self.assertEqual(FilesList.convert_str_to_byte("3Mb"), 4 * 1024**2)
+        self.assertEqual(FilesList.convert_str_to_byte("1 Gb"), 2 * 1024**3)
+
+    def test_rows_become_files(self):
+        files = list(FilesList(ROWS))
+        self.assertEqual([file.name for file in files], ["exame.pdf", "notas.txt"])
+        self.assertEqual(files[0].link, cfg.domain + "/objecto?oid=1")
+        self.assertEqual(files[0].mtime, decode_date("2023-10-05 14:32"))
+        self.assertEqual([file.size for file in files], [121 * 1024, 512])
+        self.assertEqual(files[1].teacher, "Docente B")
+
+    def test_columns_round_trip(self):
+        table = FilesList(ROWS)
+        copy = FilesList.from_columns(table.columns())
+        self.assertEqual([str(file) for file in copy], [str(file) for file in table])
+        self.assertEqual(len(copy), 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,172 @@
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import clippy.config as cfg
+from modules.SessionExpiredError import SessionExpiredError
+from handlers import get_login, http_cache
+from handlers.get_html import fetch_html
+from tests.fakes import FakeResponse, FakeSession, in_session
+
+LOGIN_PAGE = '<form><input name="identificador"><input type="password" name="senha"></form>'
+HOME_PAGE = '<a href="/utente/eu/aluno?aluno=1234">Aluno</a>'
+PAGE = "<html>documentos</html>"
+
+class ExpiredSession(FakeSession):
+    """
+    Answers with CLIP's login form until it logs in again.
+
+    Args:
+        callers (int): Number of requests that get the login form before any of them logs in.
+        expired (bool): Keep answering with the login form after logging in.
+    """
+    def __init__(self, callers: int = 1, expired: bool = False):
+        super().__init__()
+        self.cookies = {}
+        self.logins = []
+        self.expired = expired
+        self.barrier = threading.Barrier(callers)
+
+    def respond(self, url, headers):
+        if not self.logins or self.expired:
+            if not self.logins:
+                self.barrier.wait(5)
+            return FakeResponse(200, LOGIN_PAGE)
+        return FakeResponse(200, PAGE)
+
+    def post(self, url, data, timeout):
+        self.logins.append(data)
+        return FakeResponse(200, HOME_PAGE, url=f"{cfg.domain}/")
+
+class TestRelogin(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.saved = cfg.HTTP_CACHE_PATH
+        cfg.HTTP_CACHE_PATH = Path(self.folder.name)
+        http_cache.cache_index = None
+        # The saved credentials are the ones used, so none are offered to be saved
+        patcher = mock.patch.object(get_login, "load_password", return_value="segredo")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for name in ("save_session", "delete_session"):
+            patcher = mock.patch.object(get_login, name)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        cfg.HTTP_CACHE_PATH = self.saved
+        http_cache.cache_index = None
+        self.folder.cleanup()
+
+    def logged_in(self, session):
+        in_session(session, get_login.logged_in, "aluno", "segredo")
+
+    def test_expired_session_logs_in_again(self):
+        session = ExpiredSession()
+        self.logged_in(session)
+        self.assertEqual(in_session(session, fetch_html, "https://clip.example/page"), (PAGE, False))
+        self.assertEqual(session.logins, [{"identificador": "aluno", "senha": "segredo"}])
+        self.assertEqual(in_session(session, get_login.login_count), 2)
+        self.assertEqual(http_cache.load_body("https://clip.example/page"), PAGE) # not the login form
+
+    def test_concurrent_requests_log_in_once(self):
+        callers = 4
+        session = ExpiredSession(callers)
+        self.logged_in(session)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(in_session(session, fetch_html, f"https://clip.example/{n}")))
+                   for n in range(callers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        self.assertEqual([html for html, _ in results], [PAGE] * callers)
+        self.assertEqual(len(session.logins), 1)
+
+    def test_session_that_never_logged_in_cant_log_in_again(self):
+        session = ExpiredSession()
+        with self.assertRaises(SessionExpiredError):
+            in_session(session, fetch_html, "https://clip.example/page")
+        self.assertEqual(session.logins, [])
+
+    def test_login_is_only_retried_once(self):
+        session = ExpiredSession(expired=True)
+        self.logged_in(session)
+        with self.assertRaises(SessionExpiredError):
+            in_session(session, fetch_html, "https://clip.example/page")
+        self.assertEqual(len(session.logins), 1)
+
+class TestStoredSession(unittest.TestCase):
+
+    def setUp(self):
+        self.load_password = mock.Mock(return_value="segredo")
+        self.restore_session = mock.Mock(return_value=1234)
+        patches = {"load_password": self.load_password,
+                   "restore_session": self.restore_session, "save_session": mock.Mock(), "delete_session": mock.Mock()}
+        for name, value in patches.items():
+            patcher = mock.patch.object(get_login, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_stored_session_is_reused_without_the_password(self):
+        session = ExpiredSession()
+        self.assertEqual(in_session(session, get_login.get_login, "aluno"), 1234)
+        self.load_password.assert_not_called()
+        self.assertEqual(session.logins, [])
+
+    def test_password_is_loaded_to_log_in(self):
+        self.restore_session.return_value = None
+        session = ExpiredSession()
+        self.assertEqual(in_session(session, get_login.get_login, "aluno"), 1234)
+        self.assertEqual(self.load_password.call_args_list[0], mock.call("aluno"))
+        self.assertEqual(session.logins, [{"identificador": "aluno", "senha": "segredo"}])
+
+    def test_reused_session_loads_the_password_to_log_in_again(self):
+        session = ExpiredSession()
+        in_session(session, get_login.get_login, "aluno")
+        with tempfile.TemporaryDirectory() as folder, mock.patch.object(cfg, "HTTP_CACHE_PATH", Path(folder)), \
+             mock.patch.object(http_cache, "cache_index", None):
+            self.assertEqual(in_session(session, fetch_html, "https://clip.example/page")[0], PAGE)
+        self.assertEqual(session.logins, [{"identificador": "aluno", "senha": "segredo"}])
+
+class TestSaveCredentials(unittest.TestCase):
+
+    def setUp(self):
+        self.save_credentials = mock.Mock()
+        patches = {"load_password": mock.Mock(side_effect=lambda username: {"ana": "guardada"}.get(username)),
+                   "save_credentials": self.save_credentials, "pending_creds": {}, "asked_creds": set()}
+        for name, value in patches.items():
+            patcher = mock.patch.object(get_login, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch("sys.stdin")
+        patcher.start().isatty.return_value = True
+        self.addCleanup(patcher.stop)
+
+    def log_in(self, username: str, password: str):
+        in_session(FakeSession(), get_login.logged_in, username, password)
+
+    def test_each_user_is_asked(self):
+        self.log_in("ana", "nova")
+        self.log_in("rui", "outra")
+        self.log_in("ana", "guardada") # a later login of the same user with the saved password doesn't undo it
+        get_login.check_for_save_credentials()
+        self.assertCountEqual(self.save_credentials.call_args_list, [mock.call("ana", "nova"), mock.call("rui", "outra")])
+
+    def test_saved_credentials_arent_asked(self):
+        self.log_in("ana", "guardada")
+        self.log_in("rui", None) # stored session reused without the password
+        get_login.check_for_save_credentials()
+        self.save_credentials.assert_not_called()
+
+    def test_user_is_asked_once(self):
+        for _ in range(2):
+            self.log_in("rui", "outra")
+            get_login.check_for_save_credentials()
+        self.save_credentials.assert_called_once_with("rui", "outra")
+
+if __name__ == "__main__":
+    unittest.main()
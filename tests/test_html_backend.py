@@ -0,0 +1,52 @@
+import importlib.util
+import unittest
+
+from benchmarks.mock_clip import MockCLIP, CATEGORIES
+from handlers import html_backend
+
+MODULES = {"selectolax": "selectolax", "lxml": "lxml", "html.parser": "bs4"}
+INSTALLED = [name for name in html_backend.BACKENDS if importlib.util.find_spec(MODULES[name]) is not None]
+
+class TestBackends(unittest.TestCase):
+    """
+    Every parser backend extracts the same rows from the same page.
+    """
+    @classmethod
+    def setUpClass(cls):
+        server = MockCLIP(courses=3, files=5, categories=2, years=2)
+        cls.pages = {
+            "links": server.page_user(),
+            "courses": server.page_courses(2024),
+            "index": server.page_index(1000, 2024, "s", 1),
+            "files": server.page_documents(1000, 2024, CATEGORIES[0][1]),
+        }
+
+    def extract(self, backend: str, kind: str):
+        return html_backend.EXTRACTORS[backend][kind](self.pages[kind])
+
+    def test_backends_agree(self):
+        if len(INSTALLED) < 2:
+            self.skipTest("só há um parser instalado")
+        for kind in self.pages:
+            expected = self.extract(INSTALLED[-1], kind)
+            self.assertTrue(expected)
+            for backend in INSTALLED[:-1]:
+                with self.subTest(backend=backend, kind=kind):
+                    self.assertEqual(self.extract(backend, kind), expected)
+
+    def test_pages_are_extracted(self):
+        for backend in INSTALLED:
+            with self.subTest(backend=backend):
+                links = self.extract(backend, "links")
+                self.assertEqual(len([href for _, href in links if html_backend.YEAR_LINK.search(href)]), 2)
+                self.assertEqual(len([href for _, href in self.extract(backend, "courses") if html_backend.COURSE_LINK.search(href)]), 3)
+                categories, title = self.extract(backend, "index")
+                self.assertEqual(title, "Unidade Curricular 1000")
+                self.assertEqual(len(categories), 2)
+                rows = self.extract(backend, "files")
+                self.assertEqual(len(rows), 5)
+                self.assertEqual(rows[0][0], f"{CATEGORIES[0][1]}_0000.pdf")
+                self.assertEqual(rows[0][4], "Docente 0")
+
+if __name__ == "__main__":
+    unittest.main()
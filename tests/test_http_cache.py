@@ -0,0 +1,86 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import clippy.config as cfg
+from handlers import http_cache
+from handlers.get_html import fetch_html
+from tests.fakes import FakeResponse, FakeSession, in_session
+
+class PageSession(FakeSession):
+    """
+    Serves one page with an ETag, answering 304 to a request that has it.
+    """
+    def __init__(self, html: str, etag: str = '"v1"'):
+        super().__init__()
+        self.html = html
+        self.etag = etag
+
+    def respond(self, url, headers):
+        if headers.get("If-None-Match") == self.etag:
+            return FakeResponse(304)
+        return FakeResponse(200, self.html, {"ETag": self.etag})
+
+class TestHTTPCache(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.saved = (cfg.HTTP_CACHE_PATH, cfg.HTTP_CACHE_MAX_ENTRIES, cfg.HTTP_CACHE_MAX_SIZE)
+        cfg.HTTP_CACHE_PATH = Path(self.folder.name)
+        http_cache.cache_index = None
+
+    def tearDown(self):
+        cfg.HTTP_CACHE_PATH, cfg.HTTP_CACHE_MAX_ENTRIES, cfg.HTTP_CACHE_MAX_SIZE = self.saved
+        http_cache.cache_index = None
+        self.folder.cleanup()
+
+    def fetch(self, session, url):
+        return in_session(session, fetch_html, url)
+
+    def test_not_modified_page_is_reused(self):
+        session = PageSession("<html>página</html>")
+        url = "https://clip.example/page"
+        self.assertEqual(self.fetch(session, url), ("<html>página</html>", False))
+        http_cache.set_parsed(url, ["analisada"])
+
+        self.assertEqual(self.fetch(session, url), ("<html>página</html>", True))
+        self.assertEqual(session.requests[-1].get("If-None-Match"), '"v1"')
+        self.assertEqual(http_cache.get_parsed(url), ["analisada"])
+
+    def test_changed_page_drops_the_parse(self):
+        session = PageSession("<html>v1</html>")
+        url = "https://clip.example/page"
+        self.fetch(session, url)
+        http_cache.set_parsed(url, ["v1"])
+        session.html, session.etag = "<html>v2</html>", '"v2"'
+        self.assertEqual(self.fetch(session, url), ("<html>v2</html>", False))
+        self.assertIsNone(http_cache.get_parsed(url))
+
+    def test_least_recently_used_pages_are_evicted(self):
+        cfg.HTTP_CACHE_MAX_ENTRIES = 2
+        urls = [f"https://clip.example/{n}" for n in range(3)]
+        for url in urls:
+            http_cache.store(url, f"<html>{url}</html>")
+        # The first page was used last and the third one is the oldest
+        with http_cache.cache_lock:
+            for age, url in enumerate(urls):
+                http_cache.cache_index[url]["atime"] = 1000 - age * 10
+            http_cache.cache_index[urls[0]]["atime"] = 2000
+        http_cache.commit_http_cache()
+
+        http_cache.cache_index = None
+        self.assertEqual(sorted(http_cache.load_http_cache()), [urls[0], urls[1]])
+        self.assertFalse(http_cache.body_path(urls[2]).exists())
+        self.assertTrue(http_cache.body_path(urls[0]).exists())
+
+    def test_fresh_parse_is_only_used_within_its_age(self):
+        url = "https://clip.example/years"
+        http_cache.store(url, "<html></html>")
+        http_cache.set_parsed(url, {"2024/25": 2024})
+        self.assertEqual(http_cache.get_fresh(url, 60), {"2024/25": 2024})
+        with http_cache.cache_lock:
+            http_cache.cache_index[url]["fetched"] -= 120
+        self.assertIsNone(http_cache.get_fresh(url, 60))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import clippy.config as cfg
+from modules.DirSnapshot import DirSnapshot
+from modules.IgnoreRules import IgnoreRules
+
+class TestIgnoreRules(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.course = self.root / "2024" / "1S" / "Física"
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_rules(self, text: str):
+        (self.root / cfg.IGNORE_FILE).write_text(text, encoding="utf-8")
+
+    def test_no_file_ignores_nothing(self):
+        rules = IgnoreRules.load(self.root)
+        self.assertFalse(rules)
+        self.assertFalse(rules.ignored(self.course / "Vídeos" / "aula.mp4"))
+
+    def test_name_and_path_patterns(self):
+        self.write_rules("# vídeos pesados\n*.mp4\n\n2024/*/Física/Protocolos/*\n")
+        rules = IgnoreRules.load(self.root)
+        self.assertTrue(rules.ignored(self.course / "Vídeos" / "aula.mp4"))
+        self.assertTrue(rules.ignored(self.course / "Protocolos" / "lab1.pdf"))
+        self.assertFalse(rules.ignored(self.course / "Testes" / "lab1.pdf"))
+        self.assertFalse(rules.ignored(self.root / "2025" / "1S" / "Física" / "Protocolos" / "lab1.pdf"))
+        self.assertFalse(rules.ignored(self.course / "Vídeos" / "# vídeos pesados"))
+
+    def test_paths_outside_the_folder_only_match_names(self):
+        self.write_rules("*.mp4\n2024/*\n")
+        rules = IgnoreRules.load(self.root)
+        self.assertTrue(rules.ignored(Path("/outro") / "aula.mp4"))
+        self.assertFalse(rules.ignored(Path("/outro") / "2024" / "notas.pdf"))
+
+    def test_snapshot_doesnt_count_ignored_files(self):
+        self.write_rules("*.mp4\n")
+        for name in ("aula1.mp4", "aula2.mp4", "slides.pdf", ".oculto"):
+            (self.course / "Aulas").mkdir(parents=True, exist_ok=True)
+            (self.course / "Aulas" / name).write_bytes(b"x")
+        snapshot = DirSnapshot(self.course, IgnoreRules.load(self.root))
+        self.assertEqual(snapshot.count_files(), {"Aulas": 1})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import threading
+import unittest
+from unittest import mock
+
+from modules.AdaptiveLimiter import AdaptiveLimiter
+from modules.TokenBucket import TokenBucket
+
+class FakeClock:
+    """
+    Replaces time.monotonic and time.sleep: sleeping moves the clock forward.
+    """
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+class TestAdaptiveLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch("modules.AdaptiveLimiter.time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def request(self, limiter, latency=0.1, ok=True):
+        limiter.acquire()
+        self.clock.now += latency
+        limiter.release(latency, ok)
+
+    def test_starts_halfway_and_grows_to_the_maximum(self):
+        limiter = AdaptiveLimiter(16)
+        self.assertEqual(limiter.limit, 8)
+        for _ in range(200):
+            self.request(limiter)
+        self.assertEqual(limiter.limit, 16)
+
+    def test_failure_halves_the_limit_once_per_round_trip(self):
+        limiter = AdaptiveLimiter(16)
+        self.request(limiter)
+        limit = limiter.limit
+        limiter.acquire()
+        limiter.acquire()
+        limiter.release(0.1, False)
+        limiter.release(0.1, False) # same round-trip
+        self.assertAlmostEqual(limiter.limit, limit / 2)
+        self.clock.now += 1
+        self.request(limiter, ok=False)
+        self.assertAlmostEqual(limiter.limit, limit / 4)
+
+    def test_latency_spike_counts_as_congestion(self):
+        limiter = AdaptiveLimiter(16, tolerance=2.0)
+        for _ in range(10):
+            self.request(limiter, 0.1)
+        limit = limiter.limit
+        self.request(limiter, 5.0)
+        self.assertLess(limiter.limit, limit)
+
+    def test_limit_never_goes_below_the_minimum(self):
+        limiter = AdaptiveLimiter(16, min_limit=2)
+        for _ in range(20):
+            self.clock.now += 10
+            self.request(limiter, ok=False)
+        self.assertEqual(limiter.limit, 2)
+
+    def test_acquire_waits_for_a_free_slot(self):
+        limiter = AdaptiveLimiter(2) # starts at 1
+        limiter.acquire()
+        acquired = threading.Event()
+        thread = threading.Thread(target=lambda: (limiter.acquire(), acquired.set()))
+        thread.start()
+        self.assertFalse(acquired.wait(0.1))
+        limiter.release(0.1, True)
+        self.assertTrue(acquired.wait(1))
+        thread.join()
+
+class TestTokenBucket(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch("modules.TokenBucket.time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_burst_up_to_the_capacity_doesnt_wait(self):
+        bucket = TokenBucket(5)
+        for _ in range(5):
+            bucket.acquire()
+        self.assertEqual(self.clock.slept, [])
+
+    def test_rate_is_kept_after_the_burst(self):
+        bucket = TokenBucket(5)
+        for _ in range(15):
+            bucket.acquire()
+        self.assertAlmostEqual(self.clock.now - 1000.0, 2.0) # 10 tokens over the capacity, at 5 per second
+
+    def test_tokens_refill_over_time(self):
+        bucket = TokenBucket(5)
+        for _ in range(5):
+            bucket.acquire()
+        self.clock.now += 1
+        bucket.acquire(5)
+        self.assertEqual(self.clock.slept, [])
+
+    def test_request_larger_than_the_capacity_leaves_a_debt(self):
+        bucket = TokenBucket(1000, capacity=100)
+        bucket.acquire(600)
+        self.assertAlmostEqual(sum(self.clock.slept), 0.5)
+        bucket.acquire(100)
+        self.assertAlmostEqual(sum(self.clock.slept), 0.6)
+
+if __name__ == "__main__":
+    unittest.main()
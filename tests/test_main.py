@@ -0,0 +1,103 @@
+import contextvars
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from typer.testing import CliRunner
+
+from modules.Course import Course
+from modules.EmptyHTMLException import EmptyHTMLException
+from modules.TransferStats import TransferStats
+from handlers import plan_handler
+import clippy.main as main
+
+class TestWatch(unittest.TestCase):
+
+    def setUp(self):
+        self.synced = []
+        patches = {
+            "start_routine": mock.Mock(),
+            "open_path": mock.Mock(return_value=Path("CLIP")),
+            "start_login": mock.Mock(return_value=1234),
+            "parse_courses": mock.Mock(return_value=[Course("Álgebra Linear", 1000, 2024, 1, "s")]),
+            "sync_files": mock.Mock(side_effect=lambda courses, **kwargs: self.synced.append(courses) or ({}, TransferStats())),
+            "commit_cache": mock.Mock(),
+            "commit_http_cache": mock.Mock(),
+            "check_for_save_credentials": mock.Mock(),
+        }
+        for name, value in patches.items():
+            patcher = mock.patch.object(main, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for module, name in ((main.cfg, "session_mount"), (main.manifest, "start_run")):
+            patcher = mock.patch.object(module, name)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def watch(self, checks: int) -> str:
+        # Each check ends by sleeping until the next one, Ctrl+C is pressed during the last
+        with mock.patch.object(main.time, "sleep", side_effect=[None] * (checks - 1) + [KeyboardInterrupt]):
+            result = CliRunner().invoke(main.app, ["watch", "-i", "1", "--progress", "quiet"])
+        self.assertEqual(result.exit_code, 0, result.output)
+        return result.output
+
+    def test_failed_check_is_retried(self):
+        with mock.patch.object(main, "parse_years", side_effect=[EmptyHTMLException(), {"2024/25": 2024}]), \
+             self.assertLogs(level="ERROR") as logs:
+            output = self.watch(checks=2)
+        self.assertIn("próxima verificação", logs.output[0])
+        self.assertEqual(len(self.synced), 1)
+        self.assertEqual(self.synced[0][0][1].id, 1000)
+        self.assertIn("A terminar o Clippy.", output)
+        main.check_for_save_credentials.assert_called_once()
+
+class TestSelectYears(unittest.TestCase):
+    YEARS = {"2022/23": 2022, "2023/24": 2023, "2024/25": 2024}
+
+    def test_requested_years(self):
+        with self.assertLogs(level="ERROR") as logs:
+            self.assertEqual(main.select_years(self.YEARS, [2023, 2020, 2022]), [2023, 2022])
+        self.assertIn("[2020]", logs.output[0])
+
+    def test_all_years(self):
+        self.assertEqual(main.select_years(self.YEARS, [2023], all_years=True), [2022, 2023, 2024])
+
+    def test_only_year(self):
+        self.assertEqual(main.select_years({"2023/24": 2023}, auto=False), [2023])
+
+    def test_latest_year(self):
+        self.assertEqual(main.select_years(self.YEARS), [2024])
+
+    def test_no_years(self):
+        with self.assertLogs(level="ERROR"):
+            self.assertEqual(main.select_years({}), [])
+
+class TestFindCourses(unittest.TestCase):
+
+    def setUp(self):
+        courses = {
+            "ana": [Course("Álgebra Linear", 1000, 2024, 1, "s"), Course("Física", 1001, 2024, 1, "s")],
+            "rui": [Course("Álgebra Linear", 1000, 2024, 1, "s"), Course("Química", 1002, 2024, 2, "s")],
+        }
+        patches = {
+            "start_login": mock.Mock(return_value=1234),
+            "parse_years": mock.Mock(return_value={"2023/24": 2023, "2024/25": 2024}),
+            "parse_courses": mock.Mock(side_effect=lambda year, userID, max_age: courses[plan_handler.current_user.get()]),
+        }
+        for name, value in patches.items():
+            patcher = mock.patch.object(main, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(main.cfg, "new_session", side_effect=object)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_each_user_lists_new_courses(self):
+        jobs = contextvars.copy_context().run(main.find_courses, Path("CLIP"), ["ana", "rui"])
+        self.assertEqual([[course.id for _, course in job[1]] for job in jobs], [[1000, 1001], [1002]])
+        self.assertEqual([job[0].run(plan_handler.current_user.get) for job in jobs], ["ana", "rui"])
+        self.assertEqual([call.args for call in main.start_login.call_args_list], [("ana", False), ("rui", False)])
+        main.parse_courses.assert_has_calls([mock.call(2024, 1234, main.cfg.LISTING_MAX_AGE)] * 2) # only the latest year
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+import clippy.config as cfg
+from handlers import manifest
+
+class ManifestTestCase(unittest.TestCase):
+    """
+    Runs each test with a new, empty manifest.
+    """
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.saved_path = cfg.MANIFEST_PATH
+        cfg.MANIFEST_PATH = Path(self.temp_dir.name) / "manifest.db"
+        self.reset()
+        self.root = Path(self.temp_dir.name) / "CLIP"
+
+    def tearDown(self):
+        self.reset()
+        cfg.MANIFEST_PATH = self.saved_path
+        self.temp_dir.cleanup()
+
+    def reset(self):
+        if manifest.connection is not None:
+            manifest.connection.close()
+        manifest.connection = None
+        manifest.pending_files.clear()
+        manifest.run_downloads = 0
+        manifest.pending_counts.clear()
+        manifest.pending_blobs.clear()
+        manifest.pending_catalogue.clear()
+        manifest.pending_rows = 0
+
+    def path(self, name: str = "exame.pdf") -> Path:
+        return self.root / "2024" / "1S" / "Álgebra Linear" / "Testes e exames" / name
+
+class TestRecords(ManifestTestCase):
+
+    def test_records_are_written_on_commit(self):
+        manifest.record(self.path(), "https://clip.example/1", 100, 10.0, 100, 20.0)
+        self.assertIsNone(manifest.lookup(self.path()))
+        manifest.commit()
+        self.assertEqual(manifest.lookup(self.path()), ("https://clip.example/1", 100, 10.0, 100, 20.0, None))
+        self.assertIsNotNone(manifest.last_run())
+
+    def test_newer_record_replaces_the_old_one(self):
+        manifest.record(self.path(), "https://clip.example/1", 100, 10.0, 100, 20.0)
+        manifest.commit()
+        manifest.record(self.path(), "https://clip.example/2", 200, 30.0, 200, 40.0)
+        manifest.commit()
+        self.assertEqual(manifest.lookup(self.path())[:5], ("https://clip.example/2", 200, 30.0, 200, 40.0))
+        self.assertEqual(len(manifest.files_in(self.path().parent)), 1)
+
+    def test_file_found_in_place_keeps_its_download_time(self):
+        start = time.time()
+        manifest.record(self.path(), "https://clip.example/1", 100, 10.0, 100, 20.0)
+        manifest.commit()
+        manifest.record(self.path(), "https://clip.example/1", 100, 10.0, 100, 20.0, downloaded=False)
+        manifest.commit()
+        self.assertEqual([path for path, *_ in manifest.changes_since(start)], [manifest.key(self.path())])
+
+    def test_file_found_in_place_isnt_a_change(self):
+        start = time.time()
+        manifest.record(self.path(), "https://clip.example/1", 100, 10.0, 100, 20.0, downloaded=False)
+        manifest.commit()
+        self.assertEqual(manifest.changes_since(start), [])
+        self.assertIsNotNone(manifest.lookup(self.path()))
+
+    def test_user_is_recorded(self):
+        manifest.record(self.path(), "https://clip.example/1", 100, 10.0, 100, 20.0, user="outro")
+        manifest.commit()
+        self.assertEqual(manifest.files_under(self.root)[0][7], "outro")
+        manifest.record(self.path(), "https://clip.example/1", 100, 10.0, 100, 20.0, downloaded=False)
+        manifest.commit()
+        self.assertIsNone(manifest.files_under(self.root)[0][7]) # found by the saved user
+
+    def test_run_without_downloads_isnt_listed(self):
+        manifest.start_run()
+        manifest.record(self.path(), "https://clip.example/1", 100, 10.0, 100, 20.0)
+        manifest.commit()
+        last_run = manifest.last_run()
+        for downloaded in (False, None): # a file found in place, then nothing (e.g. a check of watch mode or a plan)
+            manifest.start_run()
+            if downloaded is not None:
+                manifest.record(self.path("outro.pdf"), "https://clip.example/2", 100, 10.0, 100, 20.0, downloaded=downloaded)
+            manifest.commit()
+            self.assertEqual(manifest.last_run(), last_run)
+        manifest.start_run()
+        manifest.record(self.path("novo.pdf"), "https://clip.example/3", 100, 10.0, 100, 20.0)
+        manifest.commit()
+        self.assertNotEqual(manifest.last_run(), last_run)
+
+    def test_counts_are_replaced(self):
+        course = self.path().parent.parent
+        manifest.set_counts(course, {"Testes e exames": 2, "Material": 1})
+        manifest.commit()
+        manifest.set_counts(course, {"Testes e exames": 3})
+        manifest.commit()
+        self.assertEqual(manifest.get_counts(course), {"Testes e exames": 3})
+
+    def test_records_are_written_in_batches(self):
+        saved = cfg.MANIFEST_BATCH
+        cfg.MANIFEST_BATCH = 5
+        try:
+            for n in range(12):
+                manifest.record(self.path(f"{n}.pdf"), f"https://clip.example/{n}", 1, 10.0, 1, 20.0)
+            self.assertEqual(len(manifest.files_in(self.path().parent)), 10)
+            self.assertEqual(len(manifest.pending_files), 2)
+            self.assertIsNone(manifest.last_run()) # the run is only marked as finished by commit()
+        finally:
+            cfg.MANIFEST_BATCH = saved
+        manifest.commit()
+        self.assertEqual(len(manifest.files_in(self.path().parent)), 12)
+
+class TestHashes(ManifestTestCase):
+
+    def test_hash_is_kept_while_the_file_is_unchanged(self):
+        manifest.record(self.path(), "https://clip.example/1", 100, 10.0, 100, 20.0, hash="abc")
+        manifest.commit()
+        manifest.record(self.path(), "https://clip.example/1", 100, 10.0, 100, 20.0, downloaded=False)
+        manifest.commit()
+        self.assertEqual(manifest.lookup(self.path())[5], "abc")
+
+    def test_hash_is_dropped_when_the_file_changes(self):
+        manifest.record(self.path(), "https://clip.example/1", 100, 10.0, 100, 20.0, hash="abc")
+        manifest.commit()
+        manifest.record(self.path(), "https://clip.example/1", 100, 10.0, 100, 25.0, downloaded=False)
+        manifest.commit()
+        self.assertIsNone(manifest.lookup(self.path())[5])
+
+    def test_new_hash_replaces_the_old_one(self):
+        manifest.record(self.path(), "https://clip.example/1", 100, 10.0, 100, 20.0, hash="abc")
+        manifest.commit()
+        manifest.record(self.path(), "https://clip.example/2", 120, 30.0, 120, 40.0, hash="def")
+        manifest.commit()
+        self.assertEqual(manifest.lookup(self.path())[5], "def")
+
+    def test_files_under_a_folder(self):
+        manifest.record(self.path(), "https://clip.example/1", 100, 10.0, 100, 20.0, hash="abc")
+        manifest.record(self.root / "2023" / "2S" / "Física" / "Material" / "a_b%.pdf", "https://clip.example/2", 1, 10.0, 1, 20.0)
+        manifest.record(self.root.with_name("CLIP2") / "outro.pdf", "https://clip.example/3", 1, 10.0, 1, 20.0)
+        manifest.commit()
+        self.assertEqual(sorted(url for _, url, *_ in manifest.files_under(self.root)),
+                         ["https://clip.example/1", "https://clip.example/2"])
+        self.assertEqual([row[6] for row in manifest.files_under(self.path().parent)], ["abc"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+from unittest import mock
+
+import clippy.config as cfg
+from benchmarks.mock_clip import MockCLIP, CATEGORIES
+from handlers import html_backend, parse_pool
+
+class TestParsePool(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.page = MockCLIP(courses=1, files=20, categories=1, years=1).page_documents(1000, 2024, CATEGORIES[0][1])
+        cls.expected = html_backend.extract_files(cls.page)
+
+    def setUp(self):
+        patcher = mock.patch.multiple(parse_pool, pool=None, pages=0, workers=cfg.PARSE_WORKERS)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def extract(self, workers: int, threshold: int) -> list:
+        parse_pool.set_workers(workers)
+        with mock.patch.object(cfg, "PARSE_POOL_THRESHOLD", threshold):
+            return parse_pool.extract(html_backend.extract_files, self.page)
+
+    def test_without_workers_pages_are_parsed_in_the_thread(self):
+        with mock.patch.object(parse_pool, "get_pool") as get_pool:
+            for workers in (0, 1):
+                self.assertEqual(self.extract(workers, threshold=0), self.expected)
+        get_pool.assert_not_called()
+
+    def test_first_pages_are_parsed_in_the_thread(self):
+        with mock.patch.object(parse_pool, "get_pool") as get_pool:
+            for _ in range(3):
+                self.assertEqual(self.extract(2, threshold=3), self.expected)
+            get_pool.assert_not_called()
+            self.extract(2, threshold=3)
+        get_pool.assert_called_once()
+
+    def test_pool_extracts_the_same_rows(self):
+        self.assertEqual(self.extract(2, threshold=0), self.expected)
+        self.assertIsNotNone(parse_pool.pool)
+        parse_pool.pool.shutdown()
+
+if __name__ == "__main__":
+    unittest.main()
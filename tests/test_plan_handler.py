@@ -0,0 +1,66 @@
+import json
+import os
+import unittest
+
+from handlers import manifest, plan_handler
+from tests.test_manifest import ManifestTestCase
+
+MTIME = 1700000000.0
+
+class TestPlan(ManifestTestCase):
+
+    def setUp(self):
+        super().setUp()
+        plan_handler.planned.clear()
+        self.plan = self.root.parent / "plano.json"
+
+    def tearDown(self):
+        plan_handler.planned.clear()
+        super().tearDown()
+
+    def test_round_trip(self):
+        plan_handler.add(self.path("teste.pdf"), "https://clip.example/2", 5, MTIME)
+        token = plan_handler.current_user.set("outro")
+        try:
+            plan_handler.add(self.path(), "https://clip.example/1", 3, None)
+        finally:
+            plan_handler.current_user.reset(token)
+        manifest.set_counts(self.path().parent.parent, {"Testes e exames": 2})
+        self.assertEqual(plan_handler.write(self.plan, self.root), (2, 8))
+
+        other = self.root.parent / "Outra"
+        root, files, counts = plan_handler.read(self.plan, other)
+        folder = other / "2024" / "1S" / "Álgebra Linear"
+        self.assertEqual(root, other)
+        self.assertEqual(files, {None: [(folder / "Testes e exames" / "teste.pdf", "https://clip.example/2", 5, MTIME)],
+                                 "outro": [(folder / "Testes e exames" / "exame.pdf", "https://clip.example/1", 3, None)]})
+        self.assertEqual(counts, [(folder, {"Testes e exames": 2})])
+        self.assertEqual(plan_handler.read(self.plan)[0], self.root)
+
+    def test_counts_are_taken_out_of_the_manifest(self):
+        manifest.set_counts(self.path().parent.parent, {"Testes e exames": 2})
+        plan_handler.write(self.plan, self.root)
+        manifest.commit()
+        self.assertIsNone(manifest.get_counts(self.path().parent.parent))
+
+    def test_invalid_plans_are_rejected(self):
+        self.plan.write_text("{", encoding="utf-8")
+        with self.assertRaises(ValueError):
+            plan_handler.read(self.plan)
+        self.plan.write_text(json.dumps({"version": plan_handler.PLAN_VERSION + 1, "files": []}), encoding="utf-8")
+        with self.assertRaises(ValueError):
+            plan_handler.read(self.plan)
+
+    def test_is_applied(self):
+        path = self.path()
+        self.assertFalse(plan_handler.is_applied(path, MTIME))
+        path.parent.mkdir(parents=True)
+        path.write_bytes(b"pdf")
+        os.utime(path, (MTIME - 100, MTIME - 100))
+        self.assertFalse(plan_handler.is_applied(path, MTIME))
+        self.assertTrue(plan_handler.is_applied(path))
+        os.utime(path, (MTIME, MTIME))
+        self.assertTrue(plan_handler.is_applied(path, MTIME))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import io
+import json
+import threading
+import unittest
+from unittest import mock
+
+from handlers import progress_handler
+
+class ProgressTestCase(unittest.TestCase):
+    def setUp(self):
+        self.mode = progress_handler.mode
+        self.addCleanup(setattr, progress_handler, "mode", self.mode)
+        self.addCleanup(setattr, progress_handler, "current_step", None)
+        progress_handler.set_mode("quiet")
+
+class TestCounters(ProgressTestCase):
+    def test_counters(self):
+        with progress_handler.monitor():
+            progress_handler.expect(300, 3)
+            progress_handler.expect(-100, -1) # skipped
+            progress_handler.scanned("index")
+            progress_handler.scanned("category")
+            progress_handler.scanned("category")
+            with progress_handler.transfer("a.pdf", 100) as update:
+                update(60)
+                self.assertEqual(progress_handler.totals()[progress_handler.BYTES], 60) # counted while active
+                update(60)
+            progress_handler.done(0, 100) # linked from the deduplication store
+            counts = progress_handler.totals()
+        self.assertEqual(counts[progress_handler.FILES], 2)
+        self.assertEqual(counts[progress_handler.BYTES], 120)
+        self.assertEqual(counts[progress_handler.EXPECTED_FILES], 2)
+        self.assertEqual(counts[progress_handler.EXPECTED_BYTES], 120) # real sizes
+        self.assertEqual(counts[progress_handler.COURSES], 1)
+        self.assertEqual(counts[progress_handler.CATEGORIES], 2)
+        self.assertEqual(progress_handler.active, {})
+
+    def test_threads_are_summed(self):
+        def work():
+            for _ in range(100):
+                with progress_handler.transfer("a.pdf", 10) as update:
+                    update(10)
+
+        with progress_handler.monitor():
+            threads = [threading.Thread(target=work) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            counts = progress_handler.totals()
+        self.assertEqual(counts[progress_handler.FILES], 400)
+        self.assertEqual(counts[progress_handler.BYTES], 4000)
+
+    def test_new_sync_starts_from_zero(self):
+        with progress_handler.monitor():
+            progress_handler.done(10)
+        with progress_handler.monitor():
+            self.assertEqual(progress_handler.totals()[progress_handler.FILES], 0)
+            progress_handler.done(10)
+            self.assertEqual(progress_handler.totals()[progress_handler.FILES], 1)
+
+class TestModes(ProgressTestCase):
+    def test_auto(self):
+        for tty, expected in ((True, "bar"), (False, "quiet")):
+            with self.subTest(tty=tty), mock.patch("sys.stdout") as stdout:
+                stdout.isatty.return_value = tty
+                progress_handler.set_mode("auto")
+                self.assertEqual(progress_handler.mode, expected)
+
+    def test_quiet(self):
+        progress_handler.set_mode("quiet")
+        with mock.patch("sys.stderr", new_callable=io.StringIO) as stderr:
+            with progress_handler.monitor():
+                self.assertTrue(progress_handler.step(1, "A procurar cadeiras..."))
+                progress_handler.done(10)
+        self.assertEqual(stderr.getvalue(), "")
+
+    def test_json(self):
+        progress_handler.set_mode("json")
+        with mock.patch("sys.stderr", new_callable=io.StringIO) as stderr:
+            with progress_handler.monitor():
+                self.assertTrue(progress_handler.step(1, "A procurar cadeiras..."))
+                progress_handler.expect(10)
+                progress_handler.done(10, 10)
+        events = [json.loads(line) for line in stderr.getvalue().splitlines()]
+        self.assertEqual(events[0], {"event": "step", "step": 1, "of": 6, "message": "A procurar cadeiras..."})
+        self.assertEqual(events[-1]["event"], "progress")
+        self.assertEqual((events[-1]["files"], events[-1]["files_total"], events[-1]["bytes"]), (1, 1, 10))
+
+if __name__ == "__main__":
+    unittest.main()
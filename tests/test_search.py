@@ -0,0 +1,71 @@
+import unittest
+
+from modules.FilesList import FilesList
+from handlers import manifest
+from tests.test_manifest import ManifestTestCase
+
+class TestSearch(ManifestTestCase):
+    """
+    Searches with FTS5 (when SQLite has it).
+    """
+    def setUp(self):
+        super().setUp()
+        manifest.connect()
+        self.record("2023", "Álgebra Linear", "Provas",
+                    [("Exame 2023.pdf", 1.0, "Ana Silva"), ("Teste 1.pdf", 2.0, "Ana Silva")])
+        self.record("2024", "Álgebra Linear", "Provas",
+                    [("Exame 2024.pdf", 3.0, "Rui Costa"), ("Resolução exame.pdf", 4.0, "Rui Costa")])
+        self.record("2024", "Física", "Material",
+                    [("Formulário.pdf", 5.0, "Ana Silva")])
+        manifest.commit()
+
+    def record(self, year: str, course: str, category: str, files: [(str, float, str)]):
+        folder = self.root / year / "1S" / course / category
+        table = FilesList.from_columns({"names": [name for name, _, _ in files],
+                                        "links": [f"/objecto?nome={name}" for name, _, _ in files],
+                                        "mtimes": [mtime for _, mtime, _ in files],
+                                        "sizes": [100] * len(files),
+                                        "teachers": [teacher for _, _, teacher in files]})
+        manifest.record_catalogue(folder, int(year), course, category, table)
+
+    def names(self, query: str, **kwargs) -> [str]:
+        return sorted(row[4] for row in manifest.search(query, **kwargs))
+
+    def test_words_and_prefixes(self):
+        self.assertEqual(self.names("exam"), ["Exame 2023.pdf", "Exame 2024.pdf", "Resolução exame.pdf"])
+        self.assertEqual(self.names("exame 2024"), ["Exame 2024.pdf"])
+        self.assertEqual(self.names("ana"), ["Exame 2023.pdf", "Formulário.pdf", "Teste 1.pdf"])
+        self.assertEqual(self.names("física"), ["Formulário.pdf"])
+        self.assertEqual(self.names("FISICA"), ["Formulário.pdf"])
+        self.assertEqual(self.names("resolucao"), ["Resolução exame.pdf"])
+        self.assertEqual(self.names("?!"), [])
+
+    def test_filters(self):
+        self.assertEqual(self.names("exame", year=2023), ["Exame 2023.pdf"])
+        self.assertEqual(len(manifest.search("álgebra", limit=2)), 2)
+        path, year, course, category, name, teacher, size, mtime = manifest.search("formulário")[0]
+        self.assertEqual((year, course, category, teacher, size, mtime), (2024, "Física", "Material", "Ana Silva", 100, 5.0))
+        self.assertEqual(path, manifest.key(self.root / "2024" / "1S" / "Física" / "Material" / "Formulário.pdf"))
+
+    def test_scraped_table_replaces_the_old_one(self):
+        self.record("2024", "Física", "Material", [("Formulário v2.pdf", 6.0, "Ana Silva")])
+        manifest.commit()
+        self.assertEqual(self.names("formulário"), ["Formulário v2.pdf"])
+
+    def test_recorded_files_are_searched_before_their_category_is_scraped(self):
+        manifest.record(self.path("Exame 2022.pdf"), "https://clip.example/1", 100, 7.0, 100, 7.0)
+        manifest.commit()
+        rows = manifest.search("2022")
+        self.assertEqual([row[:6] for row in rows],
+                         [(manifest.key(self.path("Exame 2022.pdf")), 2024, "Álgebra Linear", "Testes e exames", "Exame 2022.pdf", None)])
+
+class TestLikeSearch(TestSearch):
+    """
+    Searches without FTS5.
+    """
+    def setUp(self):
+        super().setUp()
+        manifest.full_text = False
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import stat
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import keyring
+import keyring.backend
+import keyring.errors
+import requests
+
+from handlers import session_store
+
+#Config
+import clippy.config as cfg
+
+class MemoryKeyring(keyring.backend.KeyringBackend):
+    priority = 1
+
+    def __init__(self):
+        super().__init__()
+        self.passwords = {}
+
+    def get_password(self, service, username):
+        return self.passwords.get((service, username))
+
+    def set_password(self, service, username, password):
+        self.passwords[(service, username)] = password
+
+    def delete_password(self, service, username):
+        if self.passwords.pop((service, username), None) is None:
+            raise keyring.errors.PasswordDeleteError(username)
+
+class TestSessionStore(unittest.TestCase):
+    keyring = False
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.session_path = cfg.SESSION_PATH
+        cfg.SESSION_PATH = Path(self.temp_dir.name) / "sessions.json"
+        patcher = mock.patch.object(session_store, "in_keyring", return_value=self.keyring)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        cfg.SESSION_PATH = self.session_path
+        self.temp_dir.cleanup()
+
+    def login(self, expires: float = None) -> requests.Session:
+        session = requests.Session()
+        session.cookies.set("JSESSIONID", "abc", domain="clip.example", path="/", expires=expires)
+        return session
+
+    def test_session_is_restored(self):
+        session_store.save_session("aluno", 1234, self.login(time.time() + 3600))
+        session = requests.Session()
+        self.assertEqual(session_store.restore_session("aluno", session), 1234)
+        self.assertEqual(session.cookies.get("JSESSIONID", domain="clip.example"), "abc")
+        self.assertIsNone(session_store.restore_session("outro", requests.Session()))
+
+    def test_old_session_isnt_restored(self):
+        session_store.save_session("aluno", 1234, self.login())
+        with mock.patch.object(session_store.time, "time", return_value=time.time() + cfg.SESSION_MAX_AGE + 1):
+            self.assertIsNone(session_store.restore_session("aluno", requests.Session()))
+
+    def test_expired_cookie_isnt_restored(self):
+        session_store.save_session("aluno", 1234, self.login(time.time() + 60))
+        session = requests.Session()
+        with mock.patch.object(session_store.time, "time", return_value=time.time() + 120):
+            self.assertIsNone(session_store.restore_session("aluno", session))
+        self.assertEqual(len(session.cookies), 0)
+
+    def test_deleted_session_isnt_restored(self):
+        session_store.save_session("aluno", 1234, self.login())
+        session_store.delete_session("aluno")
+        session_store.delete_session("aluno") # nothing stored
+        self.assertIsNone(session_store.restore_session("aluno", requests.Session()))
+
+    @unittest.skipIf(os.name == "nt", "sem permissões POSIX")
+    def test_file_is_private(self):
+        session_store.save_session("aluno", 1234, self.login())
+        self.assertEqual(stat.S_IMODE(os.stat(cfg.SESSION_PATH).st_mode), 0o600)
+
+class TestKeyringSessionStore(TestSessionStore):
+    keyring = True
+
+    def setUp(self):
+        super().setUp()
+        self.previous = keyring.get_keyring()
+        self.backend = MemoryKeyring()
+        keyring.set_keyring(self.backend)
+
+    def tearDown(self):
+        keyring.set_keyring(self.previous)
+        super().tearDown()
+
+    def test_file_is_private(self): # no file at all
+        session_store.save_session("aluno", 1234, self.login())
+        self.assertFalse(cfg.SESSION_PATH.exists())
+        self.assertIn((session_store.SERVICE_NAME, session_store.key("aluno")), self.backend.passwords)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+# Time allowed to import the CLI entry point (best of several runs, to absorb noise)
+IMPORT_BUDGET = 0.3 # seconds
+RUNS = 3
+
+# Dependencies that must only be loaded by the code paths that use them
+LAZY_MODULES = ("keyring", "InquirerPy", "prompt_toolkit", "bs4", "selectolax", "lxml", "requests", "urllib3", "asyncio")
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import clippy.main
+print(json.dumps({"time": time.perf_counter() - start, "modules": sorted(sys.modules)}))
+"""
+
+def import_entry_point() -> dict:
+    """
+    Import clippy.main in a fresh interpreter.
+
+    Returns:
+        dict: The import time and the names of every module loaded.
+    """
+    env = dict(os.environ, PYTHONPATH=str(SRC))
+    env.pop("CLIP_USERNAME", None)
+    result = subprocess.run([sys.executable, "-c", PROBE], env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout)
+
+class TestStartup(unittest.TestCase):
+
+    def test_import_time_budget(self):
+        best = min(import_entry_point()["time"] for _ in range(RUNS))
+        self.assertLess(best, IMPORT_BUDGET, f"Importing clippy.main took {best:.3f}s")
+
+    def test_heavy_dependencies_are_lazy(self):
+        modules = import_entry_point()["modules"]
+        loaded = [name for name in LAZY_MODULES if name in modules]
+        self.assertEqual(loaded, [], f"Loaded at import time: {loaded}")
+
+    def test_version_doesnt_load_heavy_dependencies(self):
+        env = dict(os.environ, PYTHONPATH=str(SRC))
+        probe = ("import sys\n"
+                 "from typer.testing import CliRunner\n"
+                 "import clippy.main\n"
+                 "result = CliRunner().invoke(clippy.main.app, ['--version'])\n"
+                 f"print(result.output.strip(), [name for name in {LAZY_MODULES!r} if name in sys.modules])\n")
+        result = subprocess.run([sys.executable, "-c", probe], env=env, capture_output=True, text=True, check=True)
+        self.assertIn("Clippy version", result.stdout)
+        self.assertTrue(result.stdout.strip().endswith("[]"), result.stdout)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import contextvars
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from handlers import progress_handler
+from handlers import sync_engine
+from handlers.sync_engine import run_pipeline
+
+user = contextvars.ContextVar("user", default="default")
+
+class StubSite:
+    """
+    Stub workers for the pipeline: each course has two categories with two files each.
+    """
+    def __init__(self, fail_category=None):
+        self.fail_category = fail_category
+        self.lock = threading.Lock()
+        self.downloaded = []
+
+    def scan_course(self, course):
+        return [(course, category) for category in ("a", "b")], []
+
+    def scan_category(self, course, category):
+        if category == self.fail_category:
+            raise RuntimeError("página inválida")
+        return [(Path(course) / category / f"{n}.pdf", 10 * (n + 1)) for n in range(2)]
+
+    def download(self, path, size):
+        with self.lock:
+            self.downloaded.append((path, size, user.get()))
+
+class TestRunPipeline(unittest.TestCase):
+
+    def setUp(self):
+        progress_handler.set_mode("quiet")
+
+    def test_every_file_is_downloaded_once(self):
+        site = StubSite()
+        folders = run_pipeline(site.scan_course, site.scan_category, site.download,
+                               courses=[("c1",), ("c2",)], subcats=[("c1", "a")], files=[(Path("c1/a/0.pdf"), 10)])
+        paths = sorted(str(path) for path, _, _ in site.downloaded)
+        self.assertEqual(len(paths), 8)
+        self.assertEqual(len(set(paths)), 8) # the same destination found twice is only downloaded once
+        self.assertEqual(folders, {str(Path(course) / category): 2 for course in ("c1", "c2") for category in ("a", "b")})
+
+    def test_failing_worker_doesnt_stop_the_rest(self):
+        site = StubSite(fail_category="b")
+        run_pipeline(site.scan_course, site.scan_category, site.download, courses=[("c1",), ("c2",)])
+        self.assertEqual(sorted(str(path.parent) for path, _, _ in site.downloaded),
+                         [str(Path("c1/a"))] * 2 + [str(Path("c2/a"))] * 2)
+
+    def test_jobs_run_in_their_context(self):
+        site = StubSite()
+        context = contextvars.copy_context()
+        context.run(user.set, "other")
+        run_pipeline(site.scan_course, site.scan_category, site.download,
+                     courses=[("c1",)], jobs=[(context, [("c2",)], [], [])])
+        users = {str(path.parts[0]): name for path, _, name in site.downloaded}
+        self.assertEqual(users, {"c1": "default", "c2": "other"})
+
+    def test_byte_budget_leaves_files_for_the_next_run(self):
+        site = StubSite()
+        run_pipeline(site.scan_course, site.scan_category, site.download, courses=[("c1",)],
+                     download_workers=1, size_of=lambda file: file[1], byte_budget=45)
+        # Smallest first: 10 + 10 + 20 fit, the other 20 doesn't
+        self.assertEqual(sorted(size for _, size, _ in site.downloaded), [10, 10, 20])
+
+    def test_byte_budget_skips_files_that_dont_fit_but_not_smaller_ones(self):
+        site = StubSite()
+        files = [(Path("c1/a") / f"{size}.pdf", size) for size in (50, 30, 5)]
+        run_pipeline(site.scan_course, site.scan_category, site.download, files=files,
+                     download_workers=2, size_of=lambda file: file[1], byte_budget=40)
+        # The smallest (5) fits, the largest (50) doesn't, and 30 still fits after it
+        self.assertEqual(sorted(size for _, size, _ in site.downloaded), [5, 30])
+
+    def test_without_budget_every_file_is_downloaded(self):
+        site = StubSite()
+        run_pipeline(site.scan_course, site.scan_category, site.download, courses=[("c1",)],
+                     size_of=lambda file: file[1])
+        self.assertEqual(len(site.downloaded), 4)
+
+    def test_download_step_is_shown_once(self):
+        site = StubSite()
+        with mock.patch.object(sync_engine, "print_progress") as print_progress:
+            run_pipeline(site.scan_course, site.scan_category, site.download, courses=[("c1",)],
+                         download_message="A registar ficheiros em falta no plano...")
+        self.assertEqual([call.args for call in print_progress.call_args_list],
+                         [(3, "A obter URLs dos ficheiros a transferir..."), (4, "A registar ficheiros em falta no plano...")])
+
+if __name__ == "__main__":
+    unittest.main()
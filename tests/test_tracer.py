@@ -0,0 +1,85 @@
+import io
+import json
+import tempfile
+import unittest
+from datetime import timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+from handlers import tracer
+from tests.fakes import FakeResponse, FakeSession, in_session
+
+class TracedSession(FakeSession):
+    def __init__(self):
+        super().__init__()
+        self.hooks = {"response": []}
+
+def response(url: str, text: str) -> FakeResponse:
+    """
+    A finished request, as given to the session's response hooks.
+    """
+    result = FakeResponse(200, text, url=url)
+    result.content = text.encode()
+    result.elapsed = timedelta(milliseconds=50)
+    result.request = SimpleNamespace(method="GET")
+    result.raw = None
+    return result
+
+class TestTracer(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        patcher = mock.patch.multiple(tracer, requests={}, phases={}, courses={}, slowest=[], threads={}, first_event=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(tracer.atexit, "register") # finished by each test
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def trace(self, name: str) -> Path:
+        """
+        Traces a course index with a request and a category inside it, and returns the trace file.
+        """
+        path = Path(self.folder.name) / "registo" / name
+        session = TracedSession()
+        in_session(session, tracer.start, path)
+        self.assertEqual(session.hooks["response"], [tracer.record_response])
+        with tracer.span("index", course="Álgebra Linear"):
+            tracer.record_response(response("https://clip.example/utente/eu/aluno/ano_lectivo/unidades", "x" * 100))
+            with tracer.span("category", course="Álgebra Linear", category="Testes") as info:
+                info["files"] = 3
+        with mock.patch("sys.stdout", new_callable=io.StringIO) as stdout:
+            tracer.finish()
+        self.assertIn("Álgebra Linear", stdout.getvalue()) # slowest courses in the summary
+        self.assertFalse(tracer.enabled())
+        return path
+
+    def test_json_lines(self):
+        events = [json.loads(line) for line in self.trace("sync.jsonl").read_text(encoding="utf-8").splitlines()]
+        self.assertEqual([(event["cat"], event["name"]) for event in events],
+                         [("http", "courses"), ("phase", "category"), ("phase", "index")])
+        self.assertEqual(events[0]["args"]["bytes"], 100)
+        self.assertEqual(events[1]["args"], {"course": "Álgebra Linear", "category": "Testes", "files": 3})
+        self.assertEqual(events[2]["args"]["requests"], 1) # made inside the span
+        self.assertEqual(events[2]["thread"], 1)
+        self.assertGreaterEqual(events[2]["duration"], events[1]["duration"])
+        self.assertEqual(tracer.phases["index"]["count"], 1)
+        self.assertEqual(tracer.courses["Álgebra Linear"]["requests"], 1)
+
+    def test_chrome_trace(self):
+        events = json.loads(self.trace("sync.json").read_text(encoding="utf-8"))
+        self.assertEqual([event["name"] for event in events], ["courses", "category", "index"])
+        for event in events:
+            self.assertEqual((event["ph"], event["pid"], event["tid"]), ("X", 1, 1))
+            self.assertIsInstance(event["ts"], int)
+            self.assertIsInstance(event["dur"], int)
+
+    def test_disabled_span_records_nothing(self):
+        with tracer.span("index", course="Álgebra Linear") as info:
+            info["files"] = 1
+        self.assertEqual(tracer.phases, {})
+
+if __name__ == "__main__":
+    unittest.main()
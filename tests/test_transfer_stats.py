@@ -0,0 +1,45 @@
+import sys
+import threading
+import unittest
+from pathlib import Path
+
+from modules.TransferStats import TransferStats
+
+class TestTransferStats(unittest.TestCase):
+
+    def test_concurrent_downloads_are_all_counted(self):
+        stats = TransferStats()
+        threads, files = 8, 500
+        barrier = threading.Barrier(threads)
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6) # switch threads as often as possible, so unlocked updates would be lost
+        self.addCleanup(sys.setswitchinterval, interval)
+
+        def work(number):
+            barrier.wait()
+            for n in range(files):
+                start = number + n / files
+                stats.add(Path(f"{number}/{n}.pdf"), n + 1, start, start + 0.5)
+
+        workers = [threading.Thread(target=work, args=(number,)) for number in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(stats.files, threads * files)
+        self.assertEqual(stats.bytes, threads * files * (files + 1) // 2)
+        self.assertEqual(len(stats.durations), threads * files)
+        self.assertEqual((stats.start, stats.end), (0.0, threads - 1 + (files - 1) / files + 0.5))
+        self.assertEqual(stats.throughput(), stats.bytes / stats.elapsed())
+
+    def test_without_durations(self):
+        stats = TransferStats(durations=False)
+        stats.add(Path("exame.pdf"), 100, 1.0, 3.0)
+        self.assertIsNone(stats.durations)
+        self.assertEqual((stats.files, stats.bytes, stats.elapsed(), stats.throughput()), (1, 100, 2.0, 50.0))
+
+    def test_empty(self):
+        self.assertEqual((TransferStats().elapsed(), TransferStats().throughput()), (0.0, 0.0))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import hashlib
+import os
+import unittest
+
+from unittest import mock
+
+from typer.testing import CliRunner
+
+from modules.TransferStats import TransferStats
+from handlers import manifest, plan_handler, verify_handler
+import clippy.main as main
+from tests.test_manifest import ManifestTestCase
+
+#Config
+import clippy.config as cfg
+
+class TestVerify(ManifestTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.path().parent.mkdir(parents=True)
+
+    def write(self, name: str, content: bytes, hash: bool = True, user: str = None):
+        self.path(name).write_bytes(content)
+        manifest.record(self.path(name), "https://clip.example/" + name, len(content), 10.0, len(content), 20.0,
+                        hash=hashlib.sha256(content).hexdigest() if hash else None, user=user)
+
+    def test_check(self):
+        self.write("exame.pdf", b"pdf")
+        digest = hashlib.sha256(b"pdf").hexdigest()
+        self.assertIsNone(verify_handler.check(self.path(), 3, digest))
+        self.assertIsNone(verify_handler.check(self.path(), 3, None))
+        self.assertEqual(verify_handler.check(self.path(), 4, digest), verify_handler.TRUNCATED)
+        self.assertEqual(verify_handler.check(self.path(), 2, digest), verify_handler.CORRUPT)
+        self.assertEqual(verify_handler.check(self.path(), 3, "0" * 64), verify_handler.CORRUPT)
+        self.assertIsNone(verify_handler.check(self.path(), 3, "0" * 64, quick=True))
+        self.assertEqual(verify_handler.check(self.path("teste.pdf"), 3, digest), verify_handler.MISSING)
+
+    def test_verify(self):
+        self.write("intacto.pdf", b"pdf")
+        self.write("antigo.pdf", b"pdf", hash=False)
+        self.write("corrompido.pdf", b"pdf")
+        self.path("corrompido.pdf").write_bytes(b"PDF")
+        self.write("apagado.pdf", b"pdf")
+        os.remove(self.path("apagado.pdf"))
+        self.write("video.mp4", b"mp4")
+        os.remove(self.path("video.mp4"))
+        self.path("novo.pdf").write_bytes(b"pdf")
+        (self.root / cfg.IGNORE_FILE).write_text("*.mp4\n", encoding="utf-8")
+        manifest.commit()
+
+        checked, unhashed, problems, unknown = verify_handler.verify(self.root, workers=2)
+        self.assertEqual((checked, unhashed), (4, 1))
+        self.assertEqual(sorted((problem, os.path.basename(path)) for problem, path, _, _ in problems),
+                         [(verify_handler.CORRUPT, "corrompido.pdf"), (verify_handler.MISSING, "apagado.pdf")])
+        self.assertEqual(unknown, [str(self.path("novo.pdf"))])
+        self.assertEqual(len(verify_handler.verify(self.root, quick=True)[2]), 1)
+
+@unittest.skipUnless(hasattr(os, "symlink"), "sem links simbólicos")
+class TestVerifyCommand(ManifestTestCase):
+    """
+    clippy verify on a CLIP folder reached through a link.
+    """
+    def setUp(self):
+        super().setUp()
+        self.target = self.root.with_name("disco")
+        self.target.mkdir()
+        try:
+            os.symlink(self.target, self.root, target_is_directory=True)
+        except OSError as e: # e.g. Windows without privileges
+            self.skipTest(str(e))
+        self.path().parent.mkdir(parents=True)
+        self.path().write_bytes(b"PDF")
+        manifest.record(self.path(), "https://clip.example/1", 3, 10.0, 3, 20.0, hash=hashlib.sha256(b"pdf").hexdigest())
+        manifest.commit()
+
+    def test_linked_folder_is_verified(self):
+        result = CliRunner().invoke(main.app, ["verify", "-p", str(self.root), "--progress", "quiet"])
+        self.assertEqual(result.exit_code, 1, result.output)
+        self.assertIn("Verificados 1 ficheiros: 1 com problemas", result.output)
+
+class TestRepair(ManifestTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.path().parent.mkdir(parents=True)
+        self.jobs = []
+        patches = {"start_login": mock.Mock(), "commit_cache": mock.Mock(),
+                   "sync_files": mock.Mock(side_effect=lambda jobs, **kwargs: self.jobs.extend(jobs) or ({}, TransferStats()))}
+        for name, value in patches.items():
+            patcher = mock.patch.object(main, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for name, value in (("session_mount", None), ("show_disclaimer", None), ("new_session", object)):
+            patcher = mock.patch.object(cfg, name, side_effect=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_files_are_repaired_by_the_user_that_synced_them(self):
+        for name, user in (("exame.pdf", None), ("teste.pdf", "outro"), ("resumo.pdf", "outro")):
+            manifest.record(self.path(name), "https://clip.example/" + name, 3, 10.0, 3, 20.0, user=user)
+        manifest.commit()
+
+        result = CliRunner().invoke(main.app, ["verify", "-p", str(self.root), "--repair", "-u", "aluno", "--progress", "quiet"])
+        self.assertEqual(result.exit_code, 1, result.output) # the (mocked) downloads didn't repair them
+        self.assertEqual(sorted(call.args for call in main.start_login.call_args_list), [("aluno", False), ("outro", False)])
+        repaired = {context.run(plan_handler.current_user.get): sorted(file[0].name for file in files)
+                    for context, _, _, files in self.jobs}
+        self.assertEqual(repaired, {None: ["exame.pdf"], "outro": ["resumo.pdf", "teste.pdf"]})
+
+if __name__ == "__main__":
+    unittest.main()